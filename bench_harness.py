@@ -0,0 +1,474 @@
+"""
+Performance benchmarks for the harness itself (not for target repos).
+
+Covers the docker round trip, clone (cold vs warm), install (cold vs cached),
+pytest invocation overhead, the tail/status helpers on large outputs,
+eval_summary.read_results on a 1M-row file and a full one-agent episode driven
+by a scripted model. Everything runs offline: the target repo is a local git
+fixture, the model is a replay client, and when no docker daemon is reachable a
+`docker` shim that executes the command on the host stands in for it. With
+SWE_BACKEND=local the local venv backend is measured instead (results record
+which one was used).
+
+Warm clones and cached installs are workspace-snapshot restores: the snapshot
+is seeded in an untimed setup step and every timed sample must restore it.
+The local backend does not use snapshots, so it has no warm/cached metrics.
+
+Usage:
+  python bench_harness.py run [bench ...]       # store results for the current git commit
+  python bench_harness.py compare [base] [head] # flag regressions beyond BENCH_THRESHOLD
+  python bench_harness.py list
+
+Results are written to sandbox/bench/<commit>.json (suffix -dirty for an
+uncommitted tree). BENCH_REPEAT (default 5), BENCH_ROWS (default 1000000) and
+BENCH_THRESHOLD (default 0.10, i.e. +10% median) tune the runs.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import platform
+import statistics
+import subprocess
+import tempfile
+import contextlib
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import cache_manager
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BENCH_DIR = os.path.join(ROOT, "sandbox", "bench")
+REPEAT = int(os.environ.get("BENCH_REPEAT", "5"))
+ROWS = int(os.environ.get("BENCH_ROWS", "1000000"))
+THRESHOLD = float(os.environ.get("BENCH_THRESHOLD", "0.10"))
+
+# Executes `docker run ... -v HOST:/workspace ... bash -lc CMD` as `bash -c CMD` in HOST.
+DOCKER_SHIM = """#!/usr/bin/env python3
+import sys, subprocess
+args = sys.argv[1:]
+host = "."
+for i, a in enumerate(args):
+    if a == "-v":
+        host = args[i + 1].split(":")[0]
+sys.exit(subprocess.call(["bash", "-c", args[-1]], cwd=host))
+"""
+
+SAMPLE_RECORD = {
+    "instance_id": "pytest_example_collection",
+    "repo_url": "https://github.com/pytest-dev/pytest",
+    "ref": "",
+    "pytest_k": "collection",
+    "model": "moonshotai/Kimi-K2-Instruct-75k",
+    "team": "planner-coder-tester",
+    "start_ts": "2025-09-01T20:42:52.238685+00:00",
+    "end_ts": "2025-09-01T20:43:08.078170+00:00",
+    "elapsed_sec": 15.839,
+    "messages": 10,
+    "final_pytest_tail": "3387 deselected, 3 errors in 2.81s",
+    "status": "fail",
+    "tokens": {"prompt": 1200, "completion": 80, "total": 1280},
+}
+
+
+class Skip(Exception):
+    pass
+
+
+def _git(*args: str, cwd: str = ROOT) -> str:
+    p = subprocess.run(["git", *args], cwd=cwd, text=True, capture_output=True)
+    return p.stdout.strip() if p.returncode == 0 else ""
+
+
+def commit_key() -> str:
+    sha = _git("rev-parse", "--short=12", "HEAD") or "nogit"
+    dirty = _git("status", "--porcelain", "--untracked-files=no")
+    return f"{sha}-dirty" if dirty else sha
+
+
+def _stats(samples: List[float]) -> Dict[str, Any]:
+    return {
+        "median": round(statistics.median(samples), 6),
+        "min": round(min(samples), 6),
+        "max": round(max(samples), 6),
+        "n": len(samples),
+    }
+
+
+def _timed(fn: Callable[[], Any]) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def _docker_available() -> bool:
+    if os.environ.get("BENCH_FAKE_DOCKER", "").strip() in ("1", "true", "yes"):
+        return False
+    if not shutil.which("docker"):
+        return False
+    try:
+        return subprocess.run(["docker", "info"], capture_output=True, timeout=10).returncode == 0
+    except Exception:
+        return False
+
+
+# ---------------- environment ----------------
+class BenchEnv:
+    """Temp workspace with a local git fixture and (optionally) the docker shim on PATH."""
+
+    def __init__(self, base: str):
+        self.base = base
+        self.sandbox = os.path.join(base, "sandbox")
+        self.backend = (os.environ.get("SWE_BACKEND", "") or "docker").strip().lower()
+        self.real_docker = self.backend != "local" and _docker_available()
+        os.makedirs(self.sandbox, exist_ok=True)
+        self.fixture = os.path.join(self.sandbox, "fixture_repo")
+        self._make_fixture()
+        if self.real_docker:
+            self.repo_url = "file:///workspace/fixture_repo"
+        elif self.backend == "local":
+            self.repo_url = "file://" + self.fixture
+        else:
+            bindir = os.path.join(base, "bin")
+            os.makedirs(bindir, exist_ok=True)
+            shim = os.path.join(bindir, "docker")
+            with open(shim, "w", encoding="utf-8") as f:
+                f.write(DOCKER_SHIM)
+            os.chmod(shim, 0o755)
+            os.environ["PATH"] = bindir + os.pathsep + os.environ.get("PATH", "")
+            self.repo_url = "file://" + self.fixture
+        self._runner: Any = None
+
+    def _make_fixture(self) -> None:
+        os.makedirs(os.path.join(self.fixture, "tests"), exist_ok=True)
+        files = {
+            "requirements.txt": "# no third-party deps\n",
+            "fixture_pkg.py": "def add(a, b):\n    return a + b\n",
+            "tests/test_add.py": "from fixture_pkg import add\n\n\ndef test_add():\n    assert add(1, 2) == 3\n",
+            "tests/conftest.py": "import os, sys\nsys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))\n",
+        }
+        for rel, text in files.items():
+            with open(os.path.join(self.fixture, rel), "w", encoding="utf-8") as f:
+                f.write(text)
+        for args in (
+            ["init", "-q"],
+            ["add", "-A"],
+            ["-c", "user.name=bench", "-c", "user.email=bench@localhost", "commit", "-q", "-m", "fixture"],
+        ):
+            subprocess.run(["git", *args], cwd=self.fixture, check=True, capture_output=True)
+
+    def runner(self) -> Any:
+        """Import run_oneagent configured for the fixture; Skip if its deps are missing."""
+        if self._runner is None:
+            os.environ.setdefault("CHUTES_API_KEY", "bench-offline")
+            os.environ["TARGET_REPO"] = self.repo_url
+            os.environ["TARGET_REF"] = ""
+            os.environ["PYTEST_K"] = ""
+            os.environ.pop("SWE_INSTANCE_FILE", None)
+            if ROOT not in sys.path:
+                sys.path.insert(0, ROOT)
+            try:
+                import run_oneagent
+            except ImportError as e:
+                raise Skip(f"run_oneagent unavailable: {e}")
+            self._runner = run_oneagent
+        return self._runner
+
+    def tools(self) -> Any:
+        """swe_tools as the runner configured it: the clone/install/pytest tools and their state."""
+        self.runner()
+        import swe_tools
+
+        return swe_tools
+
+
+# ---------------- benchmarks ----------------
+def bench_docker(env: BenchEnv) -> Dict[str, List[float]]:
+    t = env.tools()
+    return {"docker_roundtrip": [_timed(lambda: t._exec("true")) for _ in range(REPEAT)]}
+
+
+@contextlib.contextmanager
+def _snapshots(env: BenchEnv, on: bool) -> Iterator[None]:
+    """Workspace snapshots (the warm/cached state) on or off, kept inside the bench sandbox."""
+    saved = {k: os.environ.get(k) for k in ("SWE_SNAPSHOT", "SWE_SNAPSHOT_DIR")}
+    os.environ["SWE_SNAPSHOT"] = "1" if on else "0"
+    os.environ["SWE_SNAPSHOT_DIR"] = os.path.join(env.sandbox, "snapshots")
+    try:
+        yield
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+
+def _fresh_clone(env: BenchEnv) -> None:
+    """A plain clone with no snapshot state, so later benches start from a cold tree."""
+    t = env.tools()
+    with _snapshots(env, False):
+        asyncio.run(t.swe_clone(repo_url=env.repo_url))
+
+
+def _seed_snapshot(env: BenchEnv) -> bool:
+    """Untimed: capture the cloned + installed fixture; False where snapshots are not used."""
+    t = env.tools()
+    if not t.snapshots_enabled(t.BACKEND):
+        return False
+    asyncio.run(t.swe_clone(repo_url=env.repo_url))
+    if t.SNAPSHOT is None:
+        asyncio.run(t.swe_install())  # captures the snapshot
+    return True
+
+
+def _warm_clone(env: BenchEnv) -> None:
+    t = env.tools()
+    asyncio.run(t.swe_clone(repo_url=env.repo_url))
+    if t.SNAPSHOT is None:
+        raise Skip("the seeded snapshot was not restored; warm/cached numbers would be cold")
+
+
+def bench_clone(env: BenchEnv) -> Dict[str, List[float]]:
+    t = env.tools()
+    clone = lambda: asyncio.run(t.swe_clone(repo_url=env.repo_url))  # noqa: E731
+    with _snapshots(env, False):
+        out = {"clone_cold": [_timed(clone) for _ in range(REPEAT)]}
+    # Warm: restore of a snapshot seeded outside the timed runs. Dropped where snapshots are
+    # not used (the local backend), since nothing else makes a second clone cheaper.
+    with _snapshots(env, True):
+        if _seed_snapshot(env):
+            out["clone_warm"] = [_timed(lambda: _warm_clone(env)) for _ in range(REPEAT)]
+    _fresh_clone(env)
+    return out
+
+
+def bench_install(env: BenchEnv) -> Dict[str, List[float]]:
+    t = env.tools()
+    install = lambda: asyncio.run(t.swe_install())  # noqa: E731
+    cold = []
+    for _ in range(REPEAT):
+        _fresh_clone(env)
+        cold.append(_timed(install))
+    out = {"install_cold": cold}
+    # Cached: the install a restored snapshot replays; each sample restores it untimed first.
+    with _snapshots(env, True):
+        if _seed_snapshot(env):
+            cached = []
+            for _ in range(REPEAT):
+                _warm_clone(env)
+                cached.append(_timed(install))
+            out["install_cached"] = cached
+    _fresh_clone(env)
+    return out
+
+
+def bench_pytest(env: BenchEnv) -> Dict[str, List[float]]:
+    t = env.tools()
+    if not os.path.isdir(os.path.join(env.sandbox, "project")):
+        asyncio.run(t.swe_clone(repo_url=env.repo_url))
+    run = lambda: asyncio.run(t.swe_pytest(pytest_args="-q -p no:cacheprovider"))  # noqa: E731
+    return {"pytest_invocation": [_timed(run) for _ in range(REPEAT)]}
+
+
+def bench_tail(env: BenchEnv) -> Dict[str, List[float]]:
+    t = env.tools()
+    line = "tests/test_module.py::test_case[param-123] PASSED                [ 42%]\n"
+    big = line * 500_000 + "\n\n" + "12 failed, 3387 passed, 4 errors in 123.45s\n\n"
+    tails = ["3387 deselected, 3 errors in 2.97s", "10 passed in 0.5s", "1 failed, 2 passed"] * 100_000
+    return {
+        "last_nonempty_40MB": [_timed(lambda: t.last_nonempty(big)) for _ in range(REPEAT)],
+        "infer_status_300k": [_timed(lambda: [t.infer_status(s) for s in tails]) for _ in range(REPEAT)],
+    }
+
+
+def bench_read_results(env: BenchEnv) -> Dict[str, List[float]]:
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    import eval_summary
+
+    path = os.path.join(env.base, "results_1m.jsonl")
+    if not os.path.exists(path):
+        line = json.dumps(SAMPLE_RECORD) + "\n"
+        chunk = line * 10_000
+        with open(path, "w", encoding="utf-8") as f:
+            for _ in range(ROWS // 10_000):
+                f.write(chunk)
+            f.write(line * (ROWS % 10_000))
+    repeat = max(1, min(REPEAT, 3))
+    return {f"read_results_{ROWS}": [_timed(lambda: eval_summary.read_results(path)) for _ in range(repeat)]}
+
+
+def _scripted_client(env: BenchEnv) -> Any:
+    try:
+        from autogen_core import FunctionCall
+        from autogen_core.models import CreateResult, RequestUsage
+        from autogen_ext.models.replay import ReplayChatCompletionClient
+    except ImportError as e:
+        raise Skip(f"autogen unavailable: {e}")
+
+    def call(i: int, name: str, args: Dict[str, Any]) -> Any:
+        return CreateResult(
+            finish_reason="function_calls",
+            content=[FunctionCall(id=f"call_{i}", name=name, arguments=json.dumps(args))],
+            usage=RequestUsage(prompt_tokens=0, completion_tokens=0),
+            cached=False,
+        )
+
+    script = [
+        call(1, "swe_clone", {"repo_url": env.repo_url, "ref": ""}),
+        call(2, "swe_install", {}),
+        call(3, "swe_pytest", {"pytest_args": "-q -p no:cacheprovider"}),
+        "done",
+    ]
+    r = env.runner()
+    return ReplayChatCompletionClient(script, model_info=r.BASE_MODEL_INFO)
+
+
+def bench_episode(env: BenchEnv) -> Dict[str, List[float]]:
+    r = env.runner()
+    samples = []
+    with open(os.devnull, "w") as devnull:
+        for _ in range(max(1, min(REPEAT, 3))):
+            client = _scripted_client(env)
+            with contextlib.redirect_stdout(devnull):
+                samples.append(_timed(lambda: asyncio.run(r.main(model=client))))
+    return {"episode_scripted": samples}
+
+
+BENCHES: Dict[str, Callable[[BenchEnv], Dict[str, List[float]]]] = {
+    "docker": bench_docker,
+    "clone": bench_clone,
+    "install": bench_install,
+    "pytest": bench_pytest,
+    "tail": bench_tail,
+    "read_results": bench_read_results,
+    "episode": bench_episode,
+}
+
+
+# ---------------- run / compare ----------------
+@contextlib.contextmanager
+def _bench_env() -> Iterator[BenchEnv]:
+    cwd = os.getcwd()
+    saved_path = os.environ.get("PATH", "")
+    base = tempfile.mkdtemp(prefix="swe_bench_")
+    try:
+        os.chdir(base)
+        yield BenchEnv(base)
+    finally:
+        os.chdir(cwd)
+        os.environ["PATH"] = saved_path
+        shutil.rmtree(base, ignore_errors=True)
+
+
+def run(names: List[str]) -> str:
+    unknown = [n for n in names if n not in BENCHES]
+    if unknown:
+        raise SystemExit(f"Unknown bench(es): {', '.join(unknown)}; see `python bench_harness.py list`")
+    results: Dict[str, Any] = {}
+    skipped: Dict[str, str] = {}
+    with _bench_env() as env:
+        for name in names or list(BENCHES):
+            try:
+                for metric, samples in BENCHES[name](env).items():
+                    results[metric] = _stats(samples)
+                    print(f"{metric:<28} median={results[metric]['median']:.4f}s  min={results[metric]['min']:.4f}s  n={len(samples)}")
+            except Skip as e:
+                skipped[name] = str(e)
+                print(f"{name:<28} skipped: {e}")
+        docker_mode = "local" if env.backend == "local" else ("real" if env.real_docker else "shim")
+
+    key = commit_key()
+    doc = {
+        "commit": key,
+        "ts": time.time(),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "docker": docker_mode,
+        "results": results,
+        "skipped": skipped,
+    }
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    path = os.path.join(BENCH_DIR, f"{key}.json")
+    # Merge with an earlier partial run of the same commit.
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                prev = json.load(f)
+            if prev.get("docker") == docker_mode:
+                doc["results"] = {**prev.get("results", {}), **results}
+        except Exception:
+            pass
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(doc, f, indent=2)
+    cache_manager.record("bench", os.path.basename(path))
+    print(f"\nSaved: {path}")
+    return path
+
+
+def _load(ref: str) -> Dict[str, Any]:
+    path = ref if ref.endswith(".json") else os.path.join(BENCH_DIR, f"{ref}.json")
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _stored() -> List[str]:
+    if not os.path.isdir(BENCH_DIR):
+        return []
+    files = [os.path.join(BENCH_DIR, f) for f in os.listdir(BENCH_DIR) if f.endswith(".json")]
+    return sorted(files, key=os.path.getmtime)
+
+
+def compare(base_ref: Optional[str], head_ref: Optional[str], threshold: float = THRESHOLD) -> int:
+    stored = _stored()
+    if head_ref is None:
+        head_path = os.path.join(BENCH_DIR, f"{commit_key()}.json")
+        head_ref = head_path if os.path.exists(head_path) else (stored[-1] if stored else "")
+    if base_ref is None:
+        others = [p for p in stored if os.path.abspath(p) != os.path.abspath(head_ref)]
+        base_ref = others[-1] if others else ""
+    if not base_ref or not head_ref:
+        print("Need two stored runs to compare; run `python bench_harness.py run` on both commits.")
+        return 2
+    base, head = _load(base_ref), _load(head_ref)
+    if base.get("docker") != head.get("docker"):
+        print(f"(warning) docker mode differs: base={base.get('docker')} head={head.get('docker')}")
+
+    print(f"base={base['commit']} head={head['commit']} threshold=+{threshold:.0%}")
+    print("\t".join(["metric", "base_median", "head_median", "change", "flag"]))
+    regressions = 0
+    for metric in sorted(set(base["results"]) | set(head["results"])):
+        b = base["results"].get(metric, {}).get("median")
+        h = head["results"].get(metric, {}).get("median")
+        if b is None or h is None:
+            print("\t".join([metric, str(b), str(h), "-", "missing"]))
+            continue
+        change = (h - b) / b if b else 0.0
+        flag = "REGRESSION" if change > threshold else ("improved" if change < -threshold else "")
+        regressions += flag == "REGRESSION"
+        print("\t".join([metric, f"{b:.4f}", f"{h:.4f}", f"{change:+.1%}", flag]))
+    return 1 if regressions else 0
+
+
+def main():
+    args = sys.argv[1:]
+    cmd = args[0] if args else "run"
+    if cmd == "list":
+        print("\n".join(BENCHES))
+    elif cmd == "run":
+        run(args[1:])
+    elif cmd == "compare":
+        rest = args[1:] + [None, None]  # type: ignore[list-item]
+        sys.exit(compare(rest[0], rest[1]))
+    else:
+        print(__doc__)
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
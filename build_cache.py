@@ -0,0 +1,109 @@
+"""
+Persistent compiled-extension build cache for scientific-stack instances.
+
+With SWE_BUILD_CACHE=1 the runners mount a host cache directory (default
+sandbox/.cache/build, override with SWE_BUILD_CACHE_DIR) at /cache and install
+the project editable through it:
+
+- C/C++ compiles go through ccache (CC="ccache gcc"), keyed per repo under /cache/ccache/<repo>
+- meson's Cython step goes through cython_cache.py (CYTHON=/cache/bin/cython-cached),
+  keyed per repo under /cache/cython/<repo>
+- meson-python projects: `pip install --no-build-isolation -e .` with a build dir
+  kept inside the project, so editable rebuilds on import stay incremental
+- setuptools projects: `pip install --no-build-isolation -e .` (picks up CC/CXX)
+
+Build tools must already be in the image: use Dockerfile.swe-sci
+(swebench-sci:py3.10), which adds compilers, ccache, meson, Cython and numpy.
+After the first build, rebuilding pandas at a nearby ref mostly hits the cache.
+
+The per-repo ccache/cython dirs are entries of cache_manager.py's "build"
+namespace: an episode pins its repo's entries while it runs and re-measures them
+after the install, so quota eviction only drops caches of repos nobody is using.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import shlex
+import shutil
+from typing import Dict
+
+import cache_manager
+
+CACHE_MOUNT = "/cache"
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def build_cache_enabled() -> bool:
+    return os.environ.get("SWE_BUILD_CACHE", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def cache_dir() -> str:
+    return os.path.abspath(os.environ.get("SWE_BUILD_CACHE_DIR", "").strip() or os.path.join("sandbox", ".cache", "build"))
+
+
+def repo_key(repo_url: str) -> str:
+    """`https://github.com/pandas-dev/pandas(.git)` -> `pandas-dev__pandas`."""
+    path = re.sub(r"^[a-z+]+://[^/]+/", "", (repo_url or "").strip().rstrip("/"))
+    path = re.sub(r"\.git$", "", path)
+    return re.sub(r"[^A-Za-z0-9._-]+", "__", path) or "default"
+
+
+def prepare() -> Dict[str, str]:
+    """Create the host cache dir and install the Cython wrapper; returns {host_dir: mount}."""
+    root = cache_dir()
+    bindir = os.path.join(root, "bin")
+    os.makedirs(bindir, exist_ok=True)
+    dst = os.path.join(bindir, "cython-cached")
+    src = os.path.join(HERE, "cython_cache.py")
+    if not os.path.exists(dst) or os.path.getmtime(dst) < os.path.getmtime(src):
+        shutil.copyfile(src, dst)
+        os.chmod(dst, 0o755)
+    return {root: CACHE_MOUNT}
+
+
+def cache_env(repo_url: str) -> Dict[str, str]:
+    key = repo_key(repo_url)
+    return {
+        "CCACHE_DIR": f"{CACHE_MOUNT}/ccache/{key}",
+        "CCACHE_BASEDIR": "/workspace/project",
+        "CCACHE_COMPILERCHECK": "content",
+        "CCACHE_NOHASHDIR": "1",
+        "CCACHE_MAXSIZE": os.environ.get("SWE_CCACHE_MAXSIZE", "5G"),
+        "CC": "ccache gcc",
+        "CXX": "ccache g++",
+        "CYTHON": f"{CACHE_MOUNT}/bin/cython-cached",
+        "CYTHON_CACHE_DIR": f"{CACHE_MOUNT}/cython/{key}",
+    }
+
+
+def pin_repo(repo_url: str) -> None:
+    """Keep this repo's caches from eviction for the rest of the process (later pytest runs rebuild through them)."""
+    key = repo_key(repo_url)
+    for kind in ("ccache", "cython"):
+        cache_manager.pin("build", f"{kind}/{key}")
+
+
+def record_repo(repo_url: str) -> None:
+    key = repo_key(repo_url)
+    for kind in ("ccache", "cython"):
+        cache_manager.record("build", f"{kind}/{key}")
+
+
+def install_command(req_file: str = "requirements.txt") -> str:
+    """Shell snippet: editable install (meson or setuptools) through the caches, then requirements."""
+    q = shlex.quote(req_file)
+    return f"""
+cd project
+# Fall back to plain compilers when the image has no ccache.
+command -v ccache >/dev/null 2>&1 || unset CC CXX
+if [ -f pyproject.toml ] && grep -q 'mesonpy' pyproject.toml; then
+    python -m pip install -q --no-build-isolation -Cbuild-dir=build/swe-editable -e . || exit $?
+elif [ -f setup.py ] || [ -f pyproject.toml ]; then
+    # Without isolation the image's Cython/numpy are reused; retry isolated for other build backends.
+    python -m pip install -q --no-build-isolation -e . || python -m pip install -q -e . || exit $?
+fi
+if [ -f {q} ]; then python -m pip install -q -r {q}; else echo 'no requirements.txt'; fi
+if command -v ccache >/dev/null 2>&1; then ccache --show-stats 2>/dev/null | grep -iE 'hit|miss' | head -3; fi
+"""
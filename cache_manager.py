@@ -0,0 +1,400 @@
+"""
+Disk cache manager for everything the harness keeps under sandbox/.
+
+Caches register as namespaces: a root directory plus glob patterns that name
+its entries (one snapshot, one repo's ccache dir, one durations file...). An
+SQLite index (SWE_CACHE_INDEX, default sandbox/.cache/index.sqlite) tracks each
+entry's size and last access. Quotas are enforced by evicting the
+least-recently used entries:
+
+- per namespace: SWE_CACHE_QUOTA_<NAME> (e.g. SWE_CACHE_QUOTA_SNAPSHOTS=40G)
+- global:        SWE_CACHE_QUOTA (default 50G); "0" disables a quota
+
+Subsystems call `touch` when they use an entry and `record` after writing one
+(which re-measures it and enforces quotas). They hold `pinned(...)` while an
+entry is being read or written, so parallel episodes never lose an entry
+mid-use: pins belong to a pid, and pins of dead processes are ignored.
+Entries that nobody reported (e.g. from before the manager existed) are picked
+up by `scan`, using their mtime as last access. Evicted entries are renamed
+aside first, then deleted, so a reader never sees a half-deleted tree under the
+entry's name.
+
+CLI:
+    python cache_manager.py ls [namespace]     entries, newest access first
+    python cache_manager.py du                 size and quota per namespace
+    python cache_manager.py prune [--dry-run] [--max-age DAYS] [namespace]
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import glob
+import time
+import shutil
+import sqlite3
+import contextlib
+from contextlib import closing
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_INDEX_PATH = os.path.join("sandbox", ".cache", "index.sqlite")
+DEFAULT_GLOBAL_QUOTA = "50G"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    ns          TEXT NOT NULL,
+    name        TEXT NOT NULL,
+    path        TEXT NOT NULL,
+    size        INTEGER NOT NULL DEFAULT 0,
+    last_access REAL NOT NULL,
+    created     REAL NOT NULL,
+    PRIMARY KEY (ns, name)
+);
+CREATE TABLE IF NOT EXISTS pins (
+    ns   TEXT NOT NULL,
+    name TEXT NOT NULL,
+    pid  INTEGER NOT NULL,
+    ts   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_lru ON entries(last_access);
+"""
+
+
+@dataclass
+class Namespace:
+    name: str
+    root: str
+    patterns: List[str] = field(default_factory=lambda: ["*"])
+    quota: str = "0"
+
+
+def _builtin_namespaces() -> Dict[str, Namespace]:
+    # Imported lazily: these modules import cache_manager themselves.
+    from build_cache import cache_dir as build_cache_dir
+    from pytest_manifest import manifest_root
+    from pytest_shards import durations_root
+    from workspace_snap import snapshot_root
+
+    return {
+        "snapshots": Namespace("snapshots", snapshot_root(), ["[0-9a-f]*[0-9a-f]"], "20G"),
+        "build": Namespace("build", build_cache_dir(), ["ccache/*", "cython/*"], "10G"),
+        "durations": Namespace("durations", durations_root(), ["*.json"], "64M"),
+        "manifests": Namespace("manifests", manifest_root(), ["*.json"], "64M"),
+        "bench": Namespace("bench", os.path.join(HERE, "sandbox", "bench"), ["*.json"], "256M"),
+        "candidates": Namespace("candidates", os.path.abspath(os.path.join("sandbox", ".candidates")), ["cand_*"], "2G"),
+    }
+
+
+_extra: Dict[str, Namespace] = {}
+
+
+def register(name: str, root: str, patterns: Optional[List[str]] = None, quota: str = "0") -> Namespace:
+    """Add a namespace for a new cache (the default quota is overridable via env)."""
+    ns = Namespace(name, os.path.abspath(root), patterns or ["*"], quota)
+    _extra[name] = ns
+    return ns
+
+
+def namespaces() -> Dict[str, Namespace]:
+    return {**_builtin_namespaces(), **_extra}
+
+
+def parse_size(s: str) -> int:
+    """"20G" / "512M" / "1.5T" / "1048576" -> bytes (0 = unlimited)."""
+    s = (s or "").strip().upper().rstrip("B")
+    if not s:
+        return 0
+    mult = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}.get(s[-1], 1)
+    return int(float(s[:-1] if s[-1] in "KMGT" else s) * mult)
+
+
+def fmt_size(n: int) -> str:
+    for unit in ("B", "K", "M", "G"):
+        if abs(n) < 1024:
+            return f"{n:.0f}{unit}" if unit == "B" else f"{n:.1f}{unit}"
+        n /= 1024  # type: ignore[assignment]
+    return f"{n:.1f}T"
+
+
+def quota_for(ns: Namespace) -> int:
+    return parse_size(os.environ.get(f"SWE_CACHE_QUOTA_{ns.name.upper()}", "").strip() or ns.quota)
+
+
+def global_quota() -> int:
+    return parse_size(os.environ.get("SWE_CACHE_QUOTA", "").strip() or DEFAULT_GLOBAL_QUOTA)
+
+
+def disk_usage(path: str) -> int:
+    """Allocated bytes of a file or tree (st_blocks, so sparse/CoW files count what they use)."""
+    def used(p: str) -> int:
+        try:
+            st = os.lstat(p)
+        except OSError:
+            return 0
+        return getattr(st, "st_blocks", 0) * 512 or st.st_size
+
+    if not os.path.isdir(path) or os.path.islink(path):
+        return used(path)
+    total = used(path)
+    for dirpath, dirnames, filenames in os.walk(path):
+        for n in dirnames + filenames:
+            total += used(os.path.join(dirpath, n))
+    return total
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+# ---------------- index ----------------
+def default_index_path() -> str:
+    return os.environ.get("SWE_CACHE_INDEX", "").strip() or DEFAULT_INDEX_PATH
+
+
+def _connect() -> sqlite3.Connection:
+    path = os.path.abspath(default_index_path())
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    db = sqlite3.connect(path, timeout=60, isolation_level=None)
+    db.row_factory = sqlite3.Row
+    db.executescript(_SCHEMA)
+    return db
+
+
+def _entry_path(ns: Namespace, name: str) -> str:
+    return os.path.join(ns.root, name)
+
+
+def touch(ns_name: str, name: str) -> None:
+    """Mark an entry as just used (creates the index row if it is new)."""
+    ns = namespaces()[ns_name]
+    now = time.time()
+    with closing(_connect()) as db:
+        db.execute(
+            "INSERT INTO entries (ns, name, path, size, last_access, created) VALUES (?, ?, ?, 0, ?, ?) "
+            "ON CONFLICT(ns, name) DO UPDATE SET last_access=excluded.last_access",
+            (ns_name, name, _entry_path(ns, name), now, now),
+        )
+
+
+def record(ns_name: str, name: str, enforce_quotas: bool = True) -> int:
+    """Re-measure an entry after writing it, then evict LRU entries if over quota."""
+    ns = namespaces()[ns_name]
+    path = _entry_path(ns, name)
+    size = disk_usage(path) if os.path.lexists(path) else 0
+    now = time.time()
+    with closing(_connect()) as db:
+        db.execute(
+            "INSERT INTO entries (ns, name, path, size, last_access, created) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(ns, name) DO UPDATE SET size=excluded.size, last_access=excluded.last_access",
+            (ns_name, name, path, size, now, now),
+        )
+    if enforce_quotas:
+        with pinned(ns_name, name):  # never evict the entry that was just written
+            enforce()
+    return size
+
+
+def pin(ns_name: str, name: str) -> None:
+    """Protect an entry from eviction until `unpin` or until this process exits.
+
+    Used directly for entries a process keeps referencing for its whole life,
+    e.g. a snapshot that is the lower dir of an overlay mount.
+    """
+    touch(ns_name, name)
+    with closing(_connect()) as db:
+        db.execute("INSERT INTO pins (ns, name, pid, ts) VALUES (?, ?, ?, ?)", (ns_name, name, os.getpid(), time.time()))
+
+
+def unpin(ns_name: str, name: str) -> None:
+    with closing(_connect()) as db:
+        db.execute(
+            "DELETE FROM pins WHERE rowid = (SELECT rowid FROM pins WHERE ns=? AND name=? AND pid=? LIMIT 1)",
+            (ns_name, name, os.getpid()),
+        )
+
+
+@contextlib.contextmanager
+def pinned(ns_name: str, name: str) -> Iterator[None]:
+    """Protect an entry from eviction while this process uses it."""
+    pin(ns_name, name)
+    try:
+        yield
+    finally:
+        unpin(ns_name, name)
+
+
+def _live_pins(db: sqlite3.Connection) -> set:
+    rows = db.execute("SELECT rowid, ns, name, pid FROM pins").fetchall()
+    dead = [r["rowid"] for r in rows if not _pid_alive(int(r["pid"]))]
+    if dead:
+        db.executemany("DELETE FROM pins WHERE rowid=?", [(d,) for d in dead])
+    return {(r["ns"], r["name"]) for r in rows if r["rowid"] not in dead}
+
+
+def scan(ns_names: Optional[List[str]] = None) -> None:
+    """Sync the index with disk: add unknown entries (mtime as last access), drop vanished ones."""
+    spaces = namespaces()
+    with closing(_connect()) as db:
+        for name in ns_names or list(spaces):
+            ns = spaces[name]
+            on_disk: Dict[str, str] = {}
+            for pat in ns.patterns:
+                for p in glob.glob(os.path.join(ns.root, pat)):
+                    base = os.path.basename(p)
+                    if ".tmp-" in base or base.endswith(".lock") or ".evict-" in base:
+                        continue
+                    on_disk[os.path.relpath(p, ns.root)] = p
+            known = {r["name"]: r for r in db.execute("SELECT * FROM entries WHERE ns=?", (name,)).fetchall()}
+            for entry, p in on_disk.items():
+                size = disk_usage(p)
+                if entry in known:
+                    db.execute("UPDATE entries SET size=? WHERE ns=? AND name=?", (size, name, entry))
+                else:
+                    mtime = os.lstat(p).st_mtime
+                    db.execute(
+                        "INSERT INTO entries (ns, name, path, size, last_access, created) VALUES (?, ?, ?, ?, ?, ?)",
+                        (name, entry, p, size, mtime, mtime),
+                    )
+            for entry in set(known) - set(on_disk):
+                db.execute("DELETE FROM entries WHERE ns=? AND name=?", (name, entry))
+
+
+def _evict(db: sqlite3.Connection, row: sqlite3.Row, dry_run: bool) -> Optional[int]:
+    """Remove an entry; returns the bytes freed, or None if it could not be moved aside."""
+    path = row["path"]
+    if not dry_run:
+        if os.path.lexists(path):
+            aside = f"{path}.evict-{os.getpid()}"
+            try:
+                os.replace(path, aside)
+            except OSError:
+                return None
+            if os.path.isdir(aside) and not os.path.islink(aside):
+                shutil.rmtree(aside, ignore_errors=True)
+            else:
+                os.remove(aside)
+        db.execute("DELETE FROM entries WHERE ns=? AND name=?", (row["ns"], row["name"]))
+    return int(row["size"])
+
+
+def enforce(max_age_days: Optional[float] = None, only: Optional[str] = None, dry_run: bool = False) -> List[Tuple[str, str, int]]:
+    """Evict LRU entries until every namespace and the global total fit their quotas.
+
+    Returns the evicted (namespace, entry, bytes). With `max_age_days`, entries
+    not accessed for that long are evicted regardless of quotas.
+    """
+    spaces = namespaces()
+    evicted: List[Tuple[str, str, int]] = []
+    db = _connect()
+    try:
+        db.execute("BEGIN IMMEDIATE")  # one evictor at a time
+        pins = _live_pins(db)
+        rows = [r for r in db.execute("SELECT * FROM entries ORDER BY last_access").fetchall() if r["ns"] in spaces]
+        if only:
+            rows = [r for r in rows if r["ns"] == only]
+        gone = set()
+
+        def drop(r: sqlite3.Row) -> bool:
+            if (r["ns"], r["name"]) in pins or (r["ns"], r["name"]) in gone:
+                return False
+            freed = _evict(db, r, dry_run)
+            if freed is None:
+                return False  # still on disk: keep counting it against the quota
+            gone.add((r["ns"], r["name"]))
+            evicted.append((r["ns"], r["name"], freed))
+            return True
+
+        if max_age_days is not None:
+            cutoff = time.time() - max_age_days * 86400
+            for r in rows:
+                if r["last_access"] < cutoff:
+                    drop(r)
+
+        for name, ns in spaces.items():
+            quota = quota_for(ns)
+            mine = [r for r in rows if r["ns"] == name and (name, r["name"]) not in gone]
+            total = sum(r["size"] for r in mine)
+            for r in mine:
+                if not quota or total <= quota:
+                    break
+                if drop(r):
+                    total -= r["size"]
+
+        quota = global_quota()
+        if not only and quota:
+            live = [r for r in rows if (r["ns"], r["name"]) not in gone]
+            total = sum(r["size"] for r in live)
+            for r in live:
+                if total <= quota:
+                    break
+                if drop(r):
+                    total -= r["size"]
+        db.execute("COMMIT")
+    except Exception:
+        db.execute("ROLLBACK")
+        raise
+    finally:
+        db.close()
+    return evicted
+
+
+def entries(ns_name: Optional[str] = None) -> List[Dict[str, Any]]:
+    with closing(_connect()) as db:
+        q, args = "SELECT * FROM entries", ()
+        if ns_name:
+            q, args = q + " WHERE ns=?", (ns_name,)
+        return [dict(r) for r in db.execute(q + " ORDER BY last_access DESC", args).fetchall()]
+
+
+# ---------------- CLI ----------------
+def _age(ts: float) -> str:
+    d = time.time() - ts
+    return f"{d / 86400:.1f}d" if d >= 86400 else f"{d / 3600:.1f}h" if d >= 3600 else f"{d / 60:.0f}m"
+
+
+def main():
+    args = sys.argv[1:]
+    cmd = args[0] if args else "du"
+    rest = args[1:]
+    if cmd == "ls":
+        scan()
+        print("\t".join(["namespace", "entry", "size", "last_access"]))
+        for e in entries(rest[0] if rest else None):
+            print("\t".join([e["ns"], e["name"], fmt_size(e["size"]), _age(e["last_access"])]))
+    elif cmd == "du":
+        scan()
+        rows = entries()
+        print("\t".join(["namespace", "entries", "size", "quota", "root"]))
+        for name, ns in namespaces().items():
+            mine = [e for e in rows if e["ns"] == name]
+            quota = quota_for(ns)
+            print("\t".join([name, str(len(mine)), fmt_size(sum(e["size"] for e in mine)), fmt_size(quota) if quota else "-", ns.root]))
+        total, quota = sum(e["size"] for e in rows), global_quota()
+        print("\t".join(["(total)", str(len(rows)), fmt_size(total), fmt_size(quota) if quota else "-", ""]))
+    elif cmd == "prune":
+        dry = "--dry-run" in rest
+        max_age = None
+        if "--max-age" in rest:
+            max_age = float(rest[rest.index("--max-age") + 1])
+            rest = rest[:rest.index("--max-age")] + rest[rest.index("--max-age") + 2:]
+        names = [a for a in rest if not a.startswith("--")]
+        scan()
+        evicted = enforce(max_age_days=max_age, only=names[0] if names else None, dry_run=dry)
+        for ns, name, size in evicted:
+            print(f"{'would evict' if dry else 'evicted'}\t{ns}\t{name}\t{fmt_size(size)}")
+        print(f"{len(evicted)} entr{'y' if len(evicted) == 1 else 'ies'}, {fmt_size(sum(e[2] for e in evicted))}")
+    else:
+        print(__doc__)
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,9 @@ Provides a zero-maintenance loader for CHUTES_API_KEY that:
   sets it in os.environ for the current process, and returns it.
 
 This avoids hard-coding keys in code and avoids shell wrappers.
+
+For key/endpoint pools, load_chutes_keys() and get_chutes_base_urls() return
+every configured key and endpoint; client_pool.py balances requests over them.
 """
 
 from __future__ import annotations
@@ -14,11 +17,18 @@ from __future__ import annotations
 import os
 import json
 import re
+import hashlib
 from pathlib import Path
+from typing import List
 
 
 DEFAULT_KEY_FILENAME = "chutes_key.txt"
 ENV_VAR = "CHUTES_API_KEY"
+KEYS_ENV_VAR = "CHUTES_API_KEYS"  # optional pool: comma/space separated keys (see client_pool.py)
+BASE_URLS_ENV_VAR = "CHUTES_BASE_URLS"  # optional pool: comma separated endpoints
+
+# Key load_chutes_key() exported from the key file; not a user-set CHUTES_API_KEY.
+_EXPORTED_KEY: str = ""
 
 
 def _default_key_path(filename: str = DEFAULT_KEY_FILENAME) -> Path:
@@ -77,6 +87,9 @@ def load_chutes_key(filename: str = DEFAULT_KEY_FILENAME, env_var: str = ENV_VAR
     key = os.environ.get(env_var)
     if key:
         return key
+    pool = [k for k in re.split(r"[,\s]+", os.environ.get(KEYS_ENV_VAR, "")) if k]
+    if pool:
+        return pool[0].strip('"\'')
 
     key_path = _default_key_path(filename)
     if not key_path.exists():
@@ -89,9 +102,98 @@ def load_chutes_key(filename: str = DEFAULT_KEY_FILENAME, env_var: str = ENV_VAR
     if not key:
         raise ValueError(f"Key file {key_path} is empty")
 
+    global _EXPORTED_KEY
     os.environ[env_var] = key
+    _EXPORTED_KEY = key
     return key
 
 
 def get_chutes_base_url(default: str = "https://llm.chutes.ai/v1") -> str:
     return os.environ.get("CHUTES_BASE_URL", default)
+
+
+# ---------------- key / endpoint pools ----------------
+
+
+def _dedupe(items: List[str]) -> List[str]:
+    seen: List[str] = []
+    for it in items:
+        if it and it not in seen:
+            seen.append(it)
+    return seen
+
+
+def _parse_key_list(text: str) -> List[str]:
+    """Extract one or more API keys; every format _parse_key_text accepts, plus lists.
+
+    Supported in addition:
+    - one key per line: a bare token (optionally quoted) or api_key/key/token=value;
+      # comments skipped. If any line is something else (base_url=..., model: ...),
+      the text is a single-key file and only its first key is returned.
+    - JSON list: ["k1", "k2"] or [{"api_key": "k1"}, ...]
+    - JSON object with a list: {"api_keys": ["k1", "k2"]} (also "keys")
+    """
+    s = (text or "").strip()
+    if not s:
+        return []
+    try:
+        obj = json.loads(s)
+    except Exception:
+        obj = None
+    if isinstance(obj, dict):
+        for k in ("api_keys", "keys"):
+            if isinstance(obj.get(k), list):
+                obj = obj[k]
+                break
+        else:
+            one = _parse_key_text(s)
+            return [one] if one else []
+    if isinstance(obj, list):
+        return _dedupe([_parse_key_text(json.dumps(v) if isinstance(v, dict) else str(v)) for v in obj])
+    keys = [_line_key(line) for line in s.splitlines() if line.strip() and not line.strip().startswith("#")]
+    if keys and all(keys):
+        return _dedupe(keys)
+    one = _parse_key_text(s)
+    return [one] if one else []
+
+
+_BARE_KEY_RE = re.compile(r"[^\s:=#]+")
+_KEY_NAMES = ("api_key", "key", "token")
+
+
+def _line_key(line: str) -> str:
+    """The key on one line of a key list, or "" if the line is not just a key."""
+    line = line.strip()
+    if "=" in line:
+        name, val = (p.strip().strip('"\'') for p in line.split("=", 1))
+        return val if name.lower() in _KEY_NAMES and _BARE_KEY_RE.fullmatch(val) else ""
+    tok = line.strip('"\'')
+    return tok if _BARE_KEY_RE.fullmatch(tok) else ""
+
+
+def load_chutes_keys(filename: str = DEFAULT_KEY_FILENAME) -> List[str]:
+    """All configured keys: CHUTES_API_KEYS (comma/space separated), else CHUTES_API_KEY,
+    else every key in the key file. Always at least one key (or the load_chutes_key error)."""
+    raw = os.environ.get(KEYS_ENV_VAR, "").strip()
+    if raw:
+        keys = _dedupe([k.strip().strip('"\'') for k in re.split(r"[,\s]+", raw)])
+        if keys:
+            return keys
+    # A value load_chutes_key() exported is only the file's first key; read the whole file.
+    if os.environ.get(ENV_VAR) and os.environ[ENV_VAR] != _EXPORTED_KEY:
+        return [os.environ[ENV_VAR]]
+    key_path = _default_key_path(filename)
+    keys = _parse_key_list(key_path.read_text(encoding="utf-8")) if key_path.exists() else []
+    return keys or [load_chutes_key(filename)]
+
+
+def get_chutes_base_urls(default: str = "https://llm.chutes.ai/v1") -> List[str]:
+    """CHUTES_BASE_URLS (comma separated), else the single get_chutes_base_url()."""
+    raw = os.environ.get(BASE_URLS_ENV_VAR, "").strip()
+    urls = _dedupe([u.strip() for u in raw.split(",")]) if raw else []
+    return urls or [get_chutes_base_url(default)]
+
+
+def key_fingerprint(key: str) -> str:
+    """Non-secret id for a key, safe to write into results."""
+    return "key-" + hashlib.sha256((key or "").encode("utf-8")).hexdigest()[:10]
@@ -0,0 +1,329 @@
+"""
+Load-balanced pool of Chutes API keys and endpoints.
+
+When more than one key (CHUTES_API_KEYS, or several keys in chutes_key.txt)
+or endpoint (CHUTES_BASE_URLS) is configured, `make_pooled_client` returns a
+PooledChatClient. It holds one OpenAI client per (key, endpoint) slot and
+routes every request to the slot with:
+
+1. no active rate-limit cooldown (set by a 429, honouring Retry-After),
+2. the fewest outstanding requests across all runner processes on this host,
+3. the most remaining headroom from the x-ratelimit-* response headers.
+
+Outstanding counts, cooldowns, and headroom are kept in a small JSON file guarded
+by an flock in SWE_KEYPOOL_DIR (default: a host-local temp dir), the same
+scheme resource_sched.py uses. Concurrent sweep workers therefore spread over
+the keys instead of each hammering the first one. Entries of dead processes
+are pruned. A 429 moves the request to the next slot immediately. Other
+transient failures (5xx, 408/409, timeouts, connection errors) cool the slot
+down for a moment and retry on another one after a short backoff. The per-slot
+OpenAI clients do not retry by themselves, so the pool owns all retries.
+
+`served_by(client)` reports which keys (as non-secret fingerprints) served a
+run, for results.jsonl.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import json
+import time
+import fcntl
+import asyncio
+import tempfile
+import contextlib
+from typing import Any, AsyncGenerator, Callable, Dict, Iterator, List, Optional, Tuple
+
+from autogen_core.models import ChatCompletionClient, RequestUsage
+
+from chutes_config import get_chutes_base_urls, key_fingerprint, load_chutes_keys
+
+MAX_COOLDOWN_SEC = 120.0
+TRANSIENT_COOLDOWN_SEC = 2.0  # a slot that just failed with a 5xx/connection error
+
+
+def _pool_dir() -> str:
+    return os.environ.get("SWE_KEYPOOL_DIR", "").strip() or os.path.join(tempfile.gettempdir(), "swe_keypool")
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+@contextlib.contextmanager
+def _locked_state() -> Iterator[Dict[str, Any]]:
+    d = _pool_dir()
+    os.makedirs(d, exist_ok=True)
+    path = os.path.join(d, "state.json")
+    with open(os.path.join(d, "lock"), "a+") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                state = {}
+            slots = state.setdefault("slots", {})
+            for s in slots.values():
+                s["outstanding"] = {p: n for p, n in s.get("outstanding", {}).items() if n > 0 and _pid_alive(int(p))}
+            try:
+                yield state
+            finally:
+                tmp = f"{path}.tmp-{os.getpid()}"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(state, f)
+                os.replace(tmp, path)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _parse_reset(value: Optional[str]) -> Optional[float]:
+    """Seconds from a reset header: "20", "1.5s", "6m0s", "250ms"."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    total = 0.0
+    for num, unit in re.findall(r"([\d.]+)(ms|s|m|h)", value):
+        total += float(num) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+    return total or None
+
+
+def _status(e: BaseException) -> Optional[int]:
+    code = getattr(e, "status_code", None)
+    if code is None:
+        code = getattr(getattr(e, "response", None), "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def _transient(e: BaseException) -> bool:
+    """Failures the OpenAI SDK would retry, other than 429."""
+    import openai
+
+    code = _status(e)
+    if code is not None:
+        return code in (408, 409) or code >= 500
+    return isinstance(e, openai.APIConnectionError)  # includes APITimeoutError
+
+
+def _backoff(attempt: int) -> float:
+    return min(8.0, 0.5 * 2.0 ** attempt)
+
+
+def _retry_after(e: BaseException) -> Optional[float]:
+    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+    return _parse_reset(headers.get("retry-after")) or _parse_reset(headers.get("x-ratelimit-reset-requests"))
+
+
+class Slot:
+    """One (key, endpoint) pair and its client."""
+
+    def __init__(self, key: str, base_url: str):
+        self.key = key
+        self.base_url = base_url
+        self.fingerprint = key_fingerprint(key)
+        self.id = f"{self.fingerprint}@{base_url}"
+        self.client: Any = None
+        self.http_client: Any = None
+        self.requests = 0
+        self.rate_limited = 0
+
+    async def on_response(self, response: Any) -> None:
+        """httpx response hook: remember the provider's rate-limit headroom for this slot."""
+        h = response.headers
+        update: Dict[str, Any] = {}
+        for kind in ("requests", "tokens"):
+            rem, lim = h.get(f"x-ratelimit-remaining-{kind}"), h.get(f"x-ratelimit-limit-{kind}")
+            try:
+                if rem is not None and lim is not None and float(lim) > 0:
+                    update[f"headroom_{kind}"] = float(rem) / float(lim)
+            except ValueError:
+                pass
+        reset = _parse_reset(h.get("x-ratelimit-reset-requests"))
+        if update.get("headroom_requests") == 0 and reset:
+            update["cooldown_until"] = time.time() + reset
+        if update:
+            with _locked_state() as state:
+                state["slots"].setdefault(self.id, {}).update(update)
+
+
+class PooledChatClient(ChatCompletionClient):
+    """ChatCompletionClient that spreads requests over several keys/endpoints."""
+
+    def __init__(self, slots: List[Slot]):
+        if not slots:
+            raise ValueError("PooledChatClient needs at least one slot")
+        self.slots = slots
+
+    # ---------------- slot selection ----------------
+    def _try_acquire(self) -> Tuple[Optional[Slot], float]:
+        now = time.time()
+        pid = str(os.getpid())
+        with _locked_state() as state:
+            table = state["slots"]
+
+            def score(i: int) -> Tuple[float, ...]:
+                s = table.get(self.slots[i].id, {})
+                headroom = min(s.get("headroom_requests", 1.0), s.get("headroom_tokens", 1.0))
+                # Rotate ties by pid so parallel processes start on different slots.
+                return (sum(s.get("outstanding", {}).values()), -headroom, (i + int(pid)) % len(self.slots))
+
+            ready = [i for i in range(len(self.slots)) if table.get(self.slots[i].id, {}).get("cooldown_until", 0) <= now]
+            if not ready:
+                wake = min(table.get(s.id, {}).get("cooldown_until", now) for s in self.slots)
+                return None, max(0.05, wake - now)
+            slot = self.slots[min(ready, key=score)]
+            entry = table.setdefault(slot.id, {})
+            out = entry.setdefault("outstanding", {})
+            out[pid] = out.get(pid, 0) + 1
+        slot.requests += 1
+        return slot, 0.0
+
+    async def _lease(self) -> Slot:
+        while True:
+            slot, wait = self._try_acquire()
+            if slot is not None:
+                return slot
+            await asyncio.sleep(min(wait, MAX_COOLDOWN_SEC))
+
+    def _release(self, slot: Slot, error: Optional[BaseException] = None) -> None:
+        limited = error is not None and _status(error) == 429
+        with _locked_state() as state:
+            entry = state["slots"].setdefault(slot.id, {})
+            out = entry.setdefault("outstanding", {})
+            pid = str(os.getpid())
+            out[pid] = max(0, out.get(pid, 0) - 1)
+            if limited:
+                strikes = entry.get("strikes", 0) + 1
+                wait = _retry_after(error) or min(MAX_COOLDOWN_SEC, 2.0 ** strikes)
+                entry.update(strikes=strikes, cooldown_until=time.time() + wait)
+            elif error is not None and _transient(error):
+                entry["cooldown_until"] = max(entry.get("cooldown_until", 0), time.time() + TRANSIENT_COOLDOWN_SEC)
+            elif error is None:
+                entry["strikes"] = 0
+        if limited:
+            slot.rate_limited += 1
+
+    # ---------------- ChatCompletionClient ----------------
+    async def create(self, *args: Any, **kwargs: Any) -> Any:
+        last: Optional[BaseException] = None
+        for attempt in range(max(3, len(self.slots) + 1)):
+            slot = await self._lease()
+            try:
+                result = await slot.client.create(*args, **kwargs)
+            except Exception as e:
+                self._release(slot, e)
+                if _status(e) == 429:
+                    last = e
+                    continue
+                if not _transient(e):
+                    raise
+                last = e
+                await asyncio.sleep(_backoff(attempt))
+                continue
+            self._release(slot)
+            return result
+        assert last is not None
+        raise last
+
+    def create_stream(self, *args: Any, **kwargs: Any) -> AsyncGenerator[Any, None]:
+        async def gen() -> AsyncGenerator[Any, None]:
+            last: Optional[BaseException] = None
+            for attempt in range(max(3, len(self.slots) + 1)):
+                slot = await self._lease()
+                started, released = False, False
+                try:
+                    async for chunk in slot.client.create_stream(*args, **kwargs):
+                        started = True
+                        yield chunk
+                except Exception as e:
+                    self._release(slot, e)
+                    released = True
+                    # Chunks already yielded cannot be taken back: only a stream that never started retries.
+                    if started or (_status(e) != 429 and not _transient(e)):
+                        raise
+                    last = e
+                    if _status(e) != 429:
+                        await asyncio.sleep(_backoff(attempt))
+                    continue
+                finally:
+                    if not released:
+                        self._release(slot)
+                return
+            assert last is not None
+            raise last
+
+        return gen()
+
+    async def close(self) -> None:
+        for s in self.slots:
+            await s.client.close()
+            if s.http_client is not None:
+                await s.http_client.aclose()
+
+    def actual_usage(self) -> RequestUsage:
+        usages = [s.client.actual_usage() for s in self.slots]
+        return RequestUsage(sum(u.prompt_tokens for u in usages), sum(u.completion_tokens for u in usages))
+
+    def total_usage(self) -> RequestUsage:
+        usages = [s.client.total_usage() for s in self.slots]
+        return RequestUsage(sum(u.prompt_tokens for u in usages), sum(u.completion_tokens for u in usages))
+
+    def count_tokens(self, *args: Any, **kwargs: Any) -> int:
+        return self.slots[0].client.count_tokens(*args, **kwargs)
+
+    def remaining_tokens(self, *args: Any, **kwargs: Any) -> int:
+        return self.slots[0].client.remaining_tokens(*args, **kwargs)
+
+    @property
+    def capabilities(self) -> Any:  # type: ignore[override]
+        return self.slots[0].client.model_info
+
+    @property
+    def model_info(self) -> Any:
+        return self.slots[0].client.model_info
+
+
+def make_pooled_client(model_name: str, make_client: Callable[..., Any], **kwargs: Any) -> Any:
+    """`make_client(model_name, **kwargs)` for a single key/endpoint; else a pool over all of them.
+
+    `make_client` must accept api_key, base_url, http_client and max_retries overrides.
+    """
+    keys, urls = load_chutes_keys(), get_chutes_base_urls()
+    if len(keys) * len(urls) == 1:
+        return make_client(model_name, **kwargs)
+    import openai
+
+    slots = []
+    for key in keys:
+        for url in urls:
+            slot = Slot(key, url)
+            slot.http_client = openai.DefaultAsyncHttpxClient(event_hooks={"response": [slot.on_response]})
+            # The pool retries 429s and transient errors on other slots instead of the SDK.
+            slot.client = make_client(
+                model_name, api_key=key, base_url=url, http_client=slot.http_client, max_retries=0, **kwargs
+            )
+            slots.append(slot)
+    return PooledChatClient(slots)
+
+
+def served_by(client: Any, default_key: Optional[str] = None) -> Dict[str, Any]:
+    """{key fingerprint: requests served} for results records."""
+    if isinstance(client, PooledChatClient):
+        out: Dict[str, Any] = {}
+        for s in client.slots:
+            if s.requests:
+                e = out.setdefault(s.fingerprint, {"requests": 0, "rate_limited": 0})
+                e["requests"] += s.requests
+                e["rate_limited"] += s.rate_limited
+        return out
+    return {key_fingerprint(default_key): None} if default_key else {}
@@ -0,0 +1,245 @@
+"""
+Partial clones and sparse checkouts for large target repos (SWE_CLONE_MODE).
+
+`swe_clone` normally does `git clone --depth 1`, which still downloads every
+blob of the tree, and escalates to `--unshallow` (the whole history, with
+blobs) for a ref that is not near the tip. The other modes avoid both:
+
+- partial: `git clone --filter=blob:none` (SWE_CLONE_FILTER, e.g. tree:0 for a
+           treeless clone). History comes without file contents, so any ref
+           resolves locally, and only the blobs of the checked-out commit are
+           downloaded.
+- sparse:  partial, plus a sparse checkout of what the run needs: top-level
+           files (build and pytest config), package dirs (those with an
+           __init__.py, or src/), test dirs, build-support dirs, and any
+           top-level dir the root build files mention. SWE_SPARSE_EXTRA adds dirs
+           ("a,b"). With SWE_SPARSE_K=1 the test files are also narrowed to the
+           ones whose path mentions a keyword of the instance's -k expression
+           (conftest.py, __init__.py and support files stay). That is
+           approximate: tests selected only by a function name inside some
+           other file are then missing.
+
+The sparse pattern list is computed on the host from `git ls-tree` of the
+target commit and handed to `git sparse-checkout set --no-cone --stdin`
+through <workspace>/.swe_sparse/patterns.txt.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import shlex
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+SPARSE_DIR = ".swe_sparse"  # relative to the workspace root, outside the git checkout
+MODES = ("full", "partial", "sparse")
+TEST_DIRS = {"test", "tests", "testing"}
+BUILD_DIRS = {"tools", "scripts", "build_tools", "cmake", "subprojects", "vendored-meson", "requirements"}
+ROOT_BUILD_FILES = ("pyproject.toml", "setup.py", "setup.cfg", "meson.build", "tox.ini", "pytest.ini")
+KEEP_ALWAYS = ("conftest.py", "__init__.py")
+
+_MARK = "---swe-clone:"
+
+Exec = Callable[[str], Tuple[int, str, str]]
+
+
+def clone_mode() -> str:
+    m = os.environ.get("SWE_CLONE_MODE", "").strip().lower()
+    return m if m in MODES else "full"
+
+
+def clone_filter() -> str:
+    return os.environ.get("SWE_CLONE_FILTER", "").strip() or "blob:none"
+
+
+def _sparse_k() -> bool:
+    return os.environ.get("SWE_SPARSE_K", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _extra_dirs() -> Set[str]:
+    return {d.strip().strip("/") for d in os.environ.get("SWE_SPARSE_EXTRA", "").split(",") if d.strip()}
+
+
+# ---------------- pattern selection ----------------
+def k_keywords(k_expr: str) -> List[str]:
+    """Keywords that select tests in a -k expression (operands of `not` only deselect)."""
+    out, negate = [], False
+    for w in re.findall(r"[A-Za-z_][A-Za-z0-9_.\[\]-]*", k_expr or ""):
+        lw = w.lower()
+        if lw == "not":
+            negate = True
+        elif lw not in ("and", "or"):
+            if not negate:
+                out.append(lw)
+            negate = False
+    return out
+
+
+def _is_test_file(path: str) -> bool:
+    name = path.rsplit("/", 1)[-1]
+    return name.endswith(".py") and (name.startswith("test_") or name.endswith("_test.py"))
+
+
+def select_paths(
+    paths: Sequence[str],
+    build_text: str = "",
+    k_expr: str = "",
+    narrow_tests: bool = False,
+    extra: Iterable[str] = (),
+) -> Set[str]:
+    """The subset of `paths` (from `git ls-tree -r --name-only`) a test run needs."""
+    top_dirs: Dict[str, List[str]] = {}
+    root_files: List[str] = []
+    for p in paths:
+        if "/" in p:
+            top_dirs.setdefault(p.split("/", 1)[0], []).append(p)
+        else:
+            root_files.append(p)
+    words = set(re.findall(r"[A-Za-z0-9_.-]+", build_text or ""))
+    extra = set(extra)
+    keep_dirs = set()
+    for d, files in top_dirs.items():
+        if (
+            d == "src"
+            or d in TEST_DIRS
+            or d in BUILD_DIRS
+            or d in extra
+            or f"{d}/__init__.py" in files
+            or d in words
+        ):
+            keep_dirs.add(d)
+
+    keywords = k_keywords(k_expr) if narrow_tests else []
+    selected = set(root_files)
+    for d in keep_dirs:
+        for p in top_dirs[d]:
+            if keywords and _is_test_file(p) and p.rsplit("/", 1)[-1] not in KEEP_ALWAYS:
+                if not any(k in p.lower() for k in keywords):
+                    continue
+            selected.add(p)
+    return selected
+
+
+def sparse_patterns(paths: Sequence[str], selected: Set[str]) -> List[str]:
+    """Compress a file selection into non-cone sparse-checkout patterns.
+
+    A directory whose files are all selected becomes one `/dir/` pattern;
+    otherwise its selected files are listed one by one.
+    """
+    tree: Dict[str, Tuple[int, int]] = {}  # dir -> (files, selected files), counted recursively
+    for p in paths:
+        parts = p.split("/")[:-1]
+        for i in range(1, len(parts) + 1):
+            d = "/".join(parts[:i])
+            n, s = tree.get(d, (0, 0))
+            tree[d] = (n + 1, s + (p in selected))
+
+    def full(d: str) -> bool:
+        n, s = tree[d]
+        return n == s
+
+    out: List[str] = []
+    for p in sorted(selected):
+        parts = p.split("/")[:-1]
+        # Shallowest fully-selected ancestor, if any, covers this file.
+        cover = next(("/".join(parts[:i]) for i in range(1, len(parts) + 1) if full("/".join(parts[:i]))), None)
+        pat = f"/{cover}/" if cover else f"/{p}"
+        if not out or out[-1] != pat:
+            out.append(pat)
+    return out
+
+
+# ---------------- clone ----------------
+def _resolve_commands(ref: Optional[str]) -> str:
+    """Shell: set $R to the target commit of a --no-checkout partial clone."""
+    if not ref:
+        return 'R=$(git rev-parse HEAD)'
+    r = shlex.quote(ref)
+    f = shlex.quote(clone_filter())
+    return (
+        f'R=$(git rev-parse --verify -q {shlex.quote(ref + "^{commit}")} || git rev-parse --verify -q {shlex.quote("origin/" + ref + "^{commit}")}) '
+        f"|| {{ git fetch -q --filter={f} origin {r} && R=$(git rev-parse FETCH_HEAD); }}"
+    )
+
+
+def clone(
+    run: Exec,
+    workspace_dir: str,
+    repo_url: str,
+    ref: Optional[str],
+    k_expr: str = "",
+    mode: Optional[str] = None,
+) -> Tuple[int, str, str, Dict[str, object]]:
+    """Clone into project/ with the partial or sparse mode; returns (code, out, err, info)."""
+    mode = mode or clone_mode()
+    f = shlex.quote(clone_filter())
+    u = shlex.quote(repo_url)
+    info: Dict[str, object] = {"mode": mode, "filter": clone_filter()}
+    checkout = '$(git symbolic-ref -q --short HEAD || echo "$R")' if not ref else '"$R"'
+    head = (
+        f"rm -rf project && git clone -q --filter={f} --no-checkout {u} project && "
+        "echo .swe_user/ >> project/.git/info/exclude && cd project && "
+        + _resolve_commands(ref)
+    )
+    stats = f'echo "{_MARK}stats $(du -sk .git | cut -f1) $(git ls-files -t | grep -vc \'^S\')"'
+
+    if mode != "sparse":
+        code, out, err = run(f"{head} && git checkout -q {checkout} && {stats}")
+        return code, out, err, {**info, **_parse_stats(out)}
+
+    # 1) commit, its file list and the root build files (a handful of small blobs)
+    show = " ".join(shlex.quote(n) for n in ROOT_BUILD_FILES)
+    code, out, err = run(
+        f"{head} && echo \"{_MARK}commit $R\" && git ls-tree -r --name-only \"$R\" && echo \"{_MARK}build\" && "
+        f'for n in {show}; do git cat-file -e "$R:$n" 2>/dev/null && git show "$R:$n"; done; true'
+    )
+    if code != 0:
+        return code, out, err, info
+    paths, build_text = _parse_listing(out)
+    selected = select_paths(paths, build_text, k_expr, _sparse_k(), _extra_dirs())
+    patterns = sparse_patterns(paths, selected)
+    d = os.path.join(workspace_dir, SPARSE_DIR)
+    os.makedirs(d, exist_ok=True)
+    with open(os.path.join(d, "patterns.txt"), "w", encoding="utf-8") as fh:
+        fh.write("\n".join(patterns) + "\n")
+
+    # 2) sparse checkout of the selection
+    code, out, err = run(
+        "cd project && " + _resolve_commands(ref) + " && "
+        f"git sparse-checkout set --no-cone --stdin < ../{SPARSE_DIR}/patterns.txt && "
+        f"git checkout -q {checkout} && {stats}"
+    )
+    info.update(
+        files_total=len(paths),
+        files_selected=len(selected),
+        patterns=len(patterns),
+        narrowed_by_k=bool(_sparse_k() and k_keywords(k_expr)),
+        **_parse_stats(out),
+    )
+    return code, out, err, info
+
+
+def _parse_listing(out: str) -> Tuple[List[str], str]:
+    paths: List[str] = []
+    build: List[str] = []
+    section = None
+    for ln in (out or "").splitlines():
+        if ln.startswith(_MARK):
+            section = ln[len(_MARK):].split(" ", 1)[0]
+            continue
+        if section == "commit" and ln.strip():
+            paths.append(ln.strip())
+        elif section == "build":
+            build.append(ln)
+    return paths, "\n".join(build)
+
+
+def _parse_stats(out: str) -> Dict[str, object]:
+    for ln in (out or "").splitlines():
+        if ln.startswith(_MARK + "stats "):
+            parts = ln.split()
+            try:
+                return {"git_kb": int(parts[1]), "files_checked_out": int(parts[2])}
+            except (IndexError, ValueError):
+                return {}
+    return {}
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Caching wrapper around the Cython compiler (a ccache for .pyx -> .c/.cpp).
+
+build_cache.py installs this script into the build-cache mount and points meson
+at it through the CYTHON environment variable. The lookup follows ccache's
+"direct mode":
+
+1. key1 = hash(Cython version, argv, input file contents)
+2. the manifest for key1 lists the .pxd/.pxi/.h files the input depended on
+   last time (taken from the depfile Cython writes with -M / --depfile)
+3. key2 = hash(key1, contents of those dependencies) -> cached outputs
+
+On a hit the generated source and depfile are copied into place without
+running Cython. Invocations without a depfile are passed through uncached,
+because their dependencies are unknown. CYTHON_CACHE_DIR selects the cache
+location; CYTHON_CACHE_DISABLE=1 turns the wrapper into a plain pass-through.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import json
+import shutil
+import hashlib
+import subprocess
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def _sha(*parts: bytes) -> str:
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(len(p).to_bytes(8, "little"))
+        h.update(p)
+    return h.hexdigest()
+
+
+def _read(path: str) -> bytes:
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return b"<missing>"
+
+
+def _parse_args(argv: List[str]) -> Tuple[Optional[str], Optional[str], bool]:
+    """Return (input, output, depfile requested)."""
+    output = None
+    inputs = []
+    depfile = False
+    i = 0
+    while i < len(argv):
+        a = argv[i]
+        if a in ("-o", "--output-file") and i + 1 < len(argv):
+            output = argv[i + 1]
+            i += 2
+            continue
+        if a.startswith("--output-file="):
+            output = a.split("=", 1)[1]
+        elif a in ("-M", "--depfile"):
+            depfile = True
+        elif a.endswith((".pyx", ".py")) and not a.startswith("-"):
+            inputs.append(a)
+        i += 1
+    return (inputs[0] if len(inputs) == 1 else None), output, depfile
+
+
+def _deps_from_depfile(path: str) -> List[str]:
+    text = _read(path).decode("utf-8", "replace").replace("\\\n", " ")
+    _, _, rhs = text.partition(":")
+    return sorted({d for d in rhs.split() if d})
+
+
+def _real_cython(argv: List[str]) -> int:
+    return subprocess.call([sys.executable, "-m", "cython", *argv])
+
+
+def main(argv: List[str]) -> int:
+    if os.environ.get("CYTHON_CACHE_DISABLE", "").strip() in ("1", "true", "yes"):
+        return _real_cython(argv)
+    src, out, wants_dep = _parse_args(argv)
+    cache = os.environ.get("CYTHON_CACHE_DIR", "").strip()
+    if not (src and out and wants_dep and cache):
+        return _real_cython(argv)
+    try:
+        import Cython
+
+        version = Cython.__version__
+    except Exception:
+        return _real_cython(argv)
+
+    dep_path = out + ".dep"
+    key1 = _sha(version.encode(), json.dumps(argv).encode(), _read(src))
+    manifest_path = os.path.join(cache, "manifests", key1 + ".json")
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest: Dict[str, Any] = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    deps = manifest.get("deps")
+    if deps is not None:
+        key2 = _sha(key1.encode(), *(_read(d) for d in deps))
+        obj = os.path.join(cache, "objects", key2)
+        if os.path.exists(os.path.join(obj, "out")) and os.path.exists(os.path.join(obj, "dep")):
+            shutil.copyfile(os.path.join(obj, "out"), out)
+            shutil.copyfile(os.path.join(obj, "dep"), dep_path)
+            return 0
+
+    code = _real_cython(argv)
+    if code != 0 or not os.path.exists(out) or not os.path.exists(dep_path):
+        return code
+
+    deps = _deps_from_depfile(dep_path)
+    key2 = _sha(key1.encode(), *(_read(d) for d in deps))
+    obj = os.path.join(cache, "objects", key2)
+    try:
+        # Write to a temp dir and rename so concurrent builds never see partial entries.
+        tmp = f"{obj}.tmp-{os.getpid()}"
+        os.makedirs(tmp, exist_ok=True)
+        shutil.copyfile(out, os.path.join(tmp, "out"))
+        shutil.copyfile(dep_path, os.path.join(tmp, "dep"))
+        if os.path.exists(obj):
+            shutil.rmtree(tmp, ignore_errors=True)
+        else:
+            os.replace(tmp, obj)
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        with open(manifest_path + f".tmp-{os.getpid()}", "w", encoding="utf-8") as f:
+            json.dump({"deps": deps}, f)
+        os.replace(manifest_path + f".tmp-{os.getpid()}", manifest_path)
+    except OSError:
+        pass  # caching is best effort; the compile itself succeeded
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
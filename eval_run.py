@@ -2,12 +2,43 @@ from __future__ import annotations
 
 import os
 import sys
-import shlex
+import json
+import time
+import threading
 import subprocess
-from typing import List
+from typing import Any, Dict, List, Tuple
+
+from sweep_plan import (
+    admit,
+    cheap_first,
+    fits_budget,
+    forecast_jobs,
+    plan_table,
+    queue_admission,
+    record_span,
+    record_tokens,
+    token_budget,
+    tokens_per_minute,
+)
+from work_queue import WorkQueue, LEASE_SEC, worker_id
 
 PYTHON = sys.executable
 ROOT = os.path.dirname(os.path.abspath(__file__))
+RESULTS = os.path.join(ROOT, "sandbox", "results.jsonl")
+POLL_SEC = float(os.environ.get("SWE_WORKER_POLL_SEC", "5"))
+
+USAGE = (
+    "Usage: python eval_run.py <one|team> <instance.json>\n"
+    "       python eval_run.py enqueue <one|team> <instance.json> [more.json ...]\n"
+    "       python eval_run.py worker\n"
+    "       python eval_run.py queue\n"
+    "       python eval_run.py requeue-deferred [sweep]\n"
+    "       python eval_run.py plan <one|team> <instance.json> [more.json ...]\n"
+    "Optionally set CHUTES_MODELS=csv or CHUTES_MODEL to control model(s).\n"
+    "SWE_SWEEP_TOKEN_BUDGET / SWE_SWEEP_TPM cap a sweep's total tokens / tokens per minute.\n"
+    "Queue modes use SWE_QUEUE (default sandbox/queue.sqlite); put it on a shared filesystem for multi-host sweeps.\n"
+    "Each enqueue is one sweep with its own token budget; SWE_SWEEP_ID adds jobs to an existing sweep."
+)
 
 
 def get_models() -> List[str]:
@@ -18,26 +49,212 @@ def get_models() -> List[str]:
     return [x.strip() for x in s.split(",") if x.strip()]
 
 
-def run_once(agent: str, instance_file: str, model: str | None) -> int:
+def build_run(agent: str, instance_file: str, model: str | None) -> Tuple[List[str], Dict[str, str]]:
     env = os.environ.copy()
     env["SWE_INSTANCE_FILE"] = instance_file
     if model:
         env["CHUTES_MODEL"] = model
     cmd = [PYTHON, "-u", "run_oneagent.py" if agent == "one" else "run_multiagent.py"]
+    return cmd, env
+
+
+def run_once(agent: str, instance_file: str, model: str | None, job_tag: str | None = None) -> int:
+    cmd, env = build_run(agent, instance_file, model)
+    if job_tag:
+        env["SWE_JOB_ID"] = job_tag
     print("RUN:", ("model=" + model if model else "model=(auto)"), "agent=", agent)
     return subprocess.call(cmd, cwd=ROOT, env=env)
 
 
-def main():
-    if len(sys.argv) < 3 or sys.argv[1] not in ("one", "team"):
-        print("Usage: python eval_run.py <one|team> <instance.json>\n"
-              "Optionally set CHUTES_MODELS=csv or CHUTES_MODEL to control model(s).")
+# ---------------- planning ----------------
+def plan_sweep(agent: str, instance_files: List[str], models: List[str | None]):
+    """Forecasts for every (instance, model) job, cheapest first unless SWE_SWEEP_ORDER=given."""
+    forecasts = forecast_jobs([(agent, inst, m) for inst in instance_files for m in models], RESULTS)
+    if os.environ.get("SWE_SWEEP_ORDER", "cheap").strip().lower() != "given":
+        forecasts = cheap_first(forecasts)
+    return forecasts
+
+
+def show_plan(agent: str, instance_files: List[str]) -> None:
+    budget, tpm = token_budget(), tokens_per_minute()
+    planned, deferred = fits_budget(plan_sweep(agent, instance_files, list(get_models()) or [None]), budget)
+    print(plan_table(planned, deferred, budget, tpm))
+
+
+def run_sweep(agent: str, instance_file: str, models: List[str]) -> int:
+    """Run each model once, cheapest first, within SWE_SWEEP_TOKEN_BUDGET / SWE_SWEEP_TPM."""
+    budget, tpm = token_budget(), tokens_per_minute()
+    forecasts = plan_sweep(agent, [instance_file], list(models))
+    spent, spans, rc = 0.0, [], 0
+    for i, f in enumerate(forecasts):
+        verdict = admit(f, spent, spans, [], budget, tpm)
+        while verdict == "wait":
+            time.sleep(POLL_SEC)
+            verdict = admit(f, spent, spans, [], budget, tpm)
+        if verdict == "defer":
+            print(f"DEFER: model={f.model} est_tokens={f.tokens:.0f} (spent {spent:.0f} of budget {budget:.0f})")
+            continue
+        job_tag = f"sweep-{os.getpid()}#{i}"
+        offset = os.path.getsize(RESULTS) if os.path.exists(RESULTS) else 0
+        code = run_once(agent, instance_file, f.model, job_tag)
+        rc = rc or code
+        for r in _records_for_job(offset, job_tag):
+            spent += record_tokens(r) or 0
+            span = record_span(r)
+            if span:
+                spans.append(span)
+    return rc
+
+
+# ---------------- queue mode ----------------
+def _records_for_job(offset: int, job_tag: str) -> List[Dict[str, Any]]:
+    """Result records appended since `offset` that belong to the given job."""
+    out: List[Dict[str, Any]] = []
+    if not os.path.exists(RESULTS):
+        return out
+    with open(RESULTS, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            try:
+                r = json.loads(line)
+            except Exception:
+                continue
+            if r.get("job_id") == job_tag:
+                out.append(r)
+    return out
+
+
+def enqueue(agent: str, instance_files: List[str]) -> None:
+    q = WorkQueue()
+    models: List[str | None] = list(get_models()) or [None]
+    # SWE_SWEEP_TOKEN_BUDGET applies per sweep, not to everything the queue file ever held.
+    sweep = os.environ.get("SWE_SWEEP_ID", "").strip() or time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+    # Jobs are leased in id order, so enqueueing in plan order runs cheap models first.
+    forecasts = plan_sweep(agent, instance_files, models)
+    for f in forecasts:
+        q.enqueue(agent, f.instance_file, f.model, est_tokens=round(f.tokens), est_sec=round(f.sec, 1), sweep=sweep)
+    print(f"Enqueued {len(forecasts)} job(s) as sweep {sweep} into {q.path}, ~{sum(f.tokens for f in forecasts):.0f} tokens forecast")
+
+
+def requeue_deferred(sweep: str | None) -> None:
+    q = WorkQueue()
+    n = q.requeue_deferred(sweep)
+    print(f"Requeued {n} deferred job(s){f' of sweep {sweep}' if sweep else ''} in {q.path}")
+
+
+def worker() -> int:
+    q = WorkQueue()
+    owner = worker_id()
+    budget, tpm = token_budget(), tokens_per_minute()
+    # Budget/TPM limits are checked against every worker's jobs in the shared queue.
+    admission = queue_admission(budget, tpm) if budget or tpm else None
+    print(f"[worker {owner}] queue={q.path}")
+    while True:
+        job = q.lease(owner, admit=admission)
+        if job is None:
+            counts = q.counts()
+            if not counts.get("queued") and not counts.get("leased"):
+                print(f"[worker {owner}] queue drained: {counts}")
+                if counts.get("deferred"):
+                    print(f"[worker {owner}] {counts['deferred']} job(s) deferred over budget; "
+                          "`python eval_run.py requeue-deferred [sweep]` queues them again")
+                return 0
+            time.sleep(POLL_SEC)
+            continue
+
+        print(f"[worker {owner}] job {job.id} attempt {job.attempts}: agent={job.agent} "
+              f"model={job.model or '(auto)'} instance={job.instance_file}")
+        cmd, env = build_run(job.agent, job.instance_file, job.model)
+        job_tag = f"{os.path.basename(q.path)}#{job.id}.{job.attempts}"
+        env["SWE_JOB_ID"] = job_tag
+        offset = os.path.getsize(RESULTS) if os.path.exists(RESULTS) else 0
+        proc = subprocess.Popen(cmd, cwd=ROOT, env=env)
+
+        # Heartbeat from a side thread; if the lease is lost the job has been
+        # handed to another worker, so stop running it here.
+        lost = threading.Event()
+
+        def beat() -> None:
+            while proc.poll() is None:
+                time.sleep(max(1.0, LEASE_SEC / 3))
+                if proc.poll() is None and not q.heartbeat(job.id, owner):
+                    lost.set()
+                    proc.terminate()
+                    return
+
+        t = threading.Thread(target=beat, daemon=True)
+        t.start()
+        code = proc.wait()
+        t.join(timeout=1)
+        if lost.is_set():
+            print(f"[worker {owner}] job {job.id}: lease lost, abandoned")
+            continue
+
+        records = _records_for_job(offset, job_tag)
+        if not q.complete(job.id, owner, code, {"host": owner, "records": records}):
+            # The lease expired between heartbeats and the job went to another worker.
+            print(f"[worker {owner}] job {job.id}: lease lost, result discarded (exit={code})")
+            continue
+        print(f"[worker {owner}] job {job.id} finished: exit={code} records={len(records)}")
+
+
+def show_queue() -> None:
+    q = WorkQueue()
+    print(f"queue: {q.path}")
+    print("counts:", json.dumps(q.counts()))
+    header = ["id", "sweep", "status", "attempts", "agent", "model", "instance", "owner", "exit", "est_tokens"]
+    print("\t".join(header))
+    for j in q.jobs():
+        print("\t".join([
+            str(j["id"]),
+            str(j.get("sweep") or ""),
+            str(j["status"]),
+            str(j["attempts"]),
+            str(j["agent"]),
+            str(j["model"] or "(auto)"),
+            os.path.basename(str(j["instance_file"])),
+            str(j["lease_owner"] or ""),
+            "" if j["exit_code"] is None else str(j["exit_code"]),
+            "" if j.get("est_tokens") is None else f"{j['est_tokens']:.0f}",
+        ]))
+
+
+def _instance_path(p: str) -> str:
+    path = os.path.abspath(p)
+    if not os.path.exists(path):
+        print(f"Instance not found: {path}")
         sys.exit(2)
-    agent = sys.argv[1]
-    instance_file = os.path.abspath(sys.argv[2])
-    if not os.path.exists(instance_file):
-        print(f"Instance not found: {instance_file}")
+    return path
+
+
+def main():
+    args = sys.argv[1:]
+    if args[:1] == ["worker"]:
+        sys.exit(worker())
+    if args[:1] == ["queue"]:
+        show_queue()
+        return
+    if args[:1] == ["requeue-deferred"]:
+        requeue_deferred(args[1] if len(args) > 1 else None)
+        return
+    if args[:1] == ["plan"]:
+        if len(args) < 3 or args[1] not in ("one", "team"):
+            print(USAGE)
+            sys.exit(2)
+        show_plan(args[1], [_instance_path(p) for p in args[2:]])
+        return
+    if args[:1] == ["enqueue"]:
+        if len(args) < 3 or args[1] not in ("one", "team"):
+            print(USAGE)
+            sys.exit(2)
+        enqueue(args[1], [_instance_path(p) for p in args[2:]])
+        return
+
+    if len(args) < 2 or args[0] not in ("one", "team"):
+        print(USAGE)
         sys.exit(2)
+    agent = args[0]
+    instance_file = _instance_path(args[1])
 
     models = get_models()
     if not models:
@@ -45,11 +262,7 @@ def main():
         code = run_once(agent, instance_file, None)
         sys.exit(code)
 
-    rc = 0
-    for m in models:
-        code = run_once(agent, instance_file, m)
-        rc = rc or code
-    sys.exit(rc)
+    sys.exit(run_sweep(agent, instance_file, models))
 
 
 if __name__ == "__main__":
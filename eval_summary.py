@@ -3,9 +3,13 @@ from __future__ import annotations
 import os
 import json
 import sys
-from typing import Any, Dict, List
+import math
+import time
+import bisect
+from typing import Any, Dict, List, Optional, Tuple
 
 RESULTS = os.path.join("sandbox", "results.jsonl")
+REFRESH_SEC = float(os.environ.get("SUMMARY_INTERVAL", "2"))
 
 
 def read_results(path: str = RESULTS) -> List[Dict[str, Any]]:
@@ -24,6 +28,93 @@ def read_results(path: str = RESULTS) -> List[Dict[str, Any]]:
     return items
 
 
+def read_new(path: str, offset: int) -> Tuple[List[Dict[str, Any]], int]:
+    """Parse records appended after byte `offset`; returns (rows, new_offset).
+
+    Only complete lines are consumed, so a record that is still being written is
+    picked up on the next call. If the file shrank (rotated/truncated), start over.
+    """
+    rows: List[Dict[str, Any]] = []
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return rows, 0
+    if size < offset:
+        offset = 0
+    if size == offset:
+        return rows, offset
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(size - offset)
+    end = data.rfind(b"\n")
+    if end < 0:
+        return rows, offset
+    for line in data[: end + 1].splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            rows.append(json.loads(line))
+        except Exception:
+            pass
+    return rows, offset + end + 1
+
+
+def percentile(sorted_vals: List[float], q: float) -> Optional[float]:
+    # nearest-rank percentile on an already sorted list
+    if not sorted_vals:
+        return None
+    k = max(0, min(len(sorted_vals) - 1, math.ceil(q / 100.0 * len(sorted_vals)) - 1))
+    return sorted_vals[k]
+
+
+class Aggregates:
+    """Running per-(model, team, instance) aggregates, updated one record at a time."""
+
+    def __init__(self) -> None:
+        self.groups: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+
+    def add(self, r: Dict[str, Any]) -> None:
+        key = (str(r.get("model", "")), str(r.get("team", "one-agent")), str(r.get("instance_id", "")))
+        g = self.groups.get(key)
+        if g is None:
+            g = self.groups[key] = {"runs": 0, "passes": 0, "elapsed": [], "tokens": 0, "msgs": 0, "msg_runs": 0}
+        g["runs"] += 1
+        if r.get("status") == "pass":
+            g["passes"] += 1
+        if isinstance(r.get("elapsed_sec"), (int, float)):
+            bisect.insort(g["elapsed"], float(r["elapsed_sec"]))
+        t = r.get("tokens")
+        if isinstance(t, dict):
+            g["tokens"] += int(t.get("total") or 0)
+        if isinstance(r.get("messages"), int):
+            g["msgs"] += r["messages"]
+            g["msg_runs"] += 1
+
+    def table(self) -> str:
+        header = ["model", "team", "instance_id", "runs", "pass_rate", "p50_sec", "p95_sec", "tokens_per_pass", "avg_msgs"]
+        out = ["\t".join(header)]
+        for (model, team, inst), g in sorted(self.groups.items()):
+            p50 = percentile(g["elapsed"], 50)
+            p95 = percentile(g["elapsed"], 95)
+            out.append(
+                "\t".join(
+                    [
+                        model,
+                        team,
+                        inst,
+                        str(g["runs"]),
+                        f"{g['passes'] / g['runs']:.0%}",
+                        "-" if p50 is None else f"{p50:.1f}",
+                        "-" if p95 is None else f"{p95:.1f}",
+                        f"{g['tokens'] // g['passes']}" if g["passes"] else "-",
+                        f"{g['msgs'] / g['msg_runs']:.1f}" if g["msg_runs"] else "-",
+                    ]
+                )
+            )
+        return "\n".join(out)
+
+
 def fmt_tokens(t: Dict[str, Any] | None) -> str:
     if not isinstance(t, dict):
         return "-"
@@ -61,11 +152,32 @@ def summarize(rows: List[Dict[str, Any]]) -> str:
     return "\n".join(out)
 
 
+def follow(keep, path: str = RESULTS) -> None:
+    """Tail `path`, parsing only appended records, and redraw the aggregate table in place."""
+    agg = Aggregates()
+    offset = 0
+    seen = 0
+    try:
+        while True:
+            if os.path.exists(path) and os.path.getsize(path) < offset:
+                # file was truncated/rotated: rebuild from scratch
+                agg, offset, seen = Aggregates(), 0, 0
+            rows, offset = read_new(path, offset)
+            for r in rows:
+                if keep(r):
+                    agg.add(r)
+            seen += len(rows)
+            sys.stdout.write("\x1b[H\x1b[J")
+            sys.stdout.write(f"{path}  records={seen}  updated={time.strftime('%H:%M:%S')}  (Ctrl-C to stop)\n\n")
+            sys.stdout.write((agg.table() if agg.groups else "(no results yet)") + "\n")
+            sys.stdout.flush()
+            time.sleep(REFRESH_SEC)
+    except KeyboardInterrupt:
+        pass
+
+
 def main():
-    rows = read_results()
-    if not rows:
-        print("(no results)")
-        return
+    args = sys.argv[1:]
 
     # Optional filters by env/args
     instance = os.environ.get("FILTER_INSTANCE")
@@ -81,7 +193,22 @@ def main():
             return False
         return True
 
+    if "--follow" in args or "-f" in args:
+        follow(keep)
+        return
+
+    rows = read_results()
+    if not rows:
+        print("(no results)")
+        return
+
     rows = [r for r in rows if keep(r)]
+    if "--agg" in args:
+        agg = Aggregates()
+        for r in rows:
+            agg.add(r)
+        print(agg.table())
+        return
     print(summarize(rows))
 
 
@@ -0,0 +1,155 @@
+"""
+Execution backends for running shell commands against the sandbox workspace.
+
+All runners (run_oneagent.py, team_swebench_mvp.py, repo_validate.py) execute
+their clone/install/pytest steps through one of these, selected with
+SWE_BACKEND:
+
+- docker (default): `docker run --rm` of SWE_IMAGE with the workspace bind-mounted at /workspace
+- podman:           same CLI contract via `podman run`
+- local:            `bash -c` on the host inside the workspace, with an isolated venv
+                    (<workspace>/.swe_venv) first on PATH; no container startup at all.
+                    Only use it for trusted repos and harness development.
+
+Commands always run with the workspace as their working directory, so relative
+paths such as `cd project` behave the same everywhere. Extra host directories
+can be exposed through `mounts`; environment values that reference /workspace
+or a mount point are rewritten to the host path by the local backend.
+"""
+
+from __future__ import annotations
+
+import os
+import abc
+import sys
+import shlex
+import shutil
+import subprocess
+from typing import Any, Dict, Optional, Tuple
+
+CONTAINER_WORKSPACE = "/workspace"
+DEFAULT_IMAGE = "swebench-lite:py3.10"
+
+
+def default_workspace() -> str:
+    # SWE_WORKSPACE gives concurrent episodes separate workspaces (default: ./sandbox)
+    return os.path.abspath(os.environ.get("SWE_WORKSPACE", "").strip() or "sandbox")
+
+
+class ExecBackend(abc.ABC):
+    """Runs a shell command in the workspace; returns (exit code, stdout, stderr)."""
+
+    name = "base"
+
+    def __init__(self, image: Optional[str] = None, workspace: Optional[str] = None):
+        self.image = image or os.environ.get("SWE_IMAGE", DEFAULT_IMAGE)
+        self._workspace = workspace
+        # Optional resource_sched.Allocation; applied to every command when set.
+        self.resources: Any = None
+        # Extra host dirs exposed to commands: {host_path: container_path}
+        self.mounts: Dict[str, str] = {}
+
+    def workspace_dir(self) -> str:
+        d = os.path.abspath(self._workspace) if self._workspace else default_workspace()
+        os.makedirs(d, exist_ok=True)
+        return d
+
+    @abc.abstractmethod
+    def run(self, cmd: str, env: Optional[Dict[str, str]] = None) -> Tuple[int, str, str]:
+        """Run `cmd` with bash in the workspace, with `env` on top of the backend's environment."""
+
+
+class DockerBackend(ExecBackend):
+    name = "docker"
+    binary = "docker"
+
+    def command(self, cmd: str, env: Optional[Dict[str, str]] = None) -> str:
+        limits = f"{self.resources.docker_flags()} " if self.resources else ""
+        envs = "".join(f"-e {shlex.quote(f'{k}={v}')} " for k, v in (env or {}).items())
+        mounts = "".join(f"-v {shlex.quote(f'{h}:{c}')} " for h, c in self.mounts.items())
+        return (
+            f"{self.binary} run --rm {limits}{envs}{mounts}-v {self.workspace_dir()}:{CONTAINER_WORKSPACE} "
+            f"-w {CONTAINER_WORKSPACE} {self.image} bash -lc {shlex.quote(cmd)}"
+        )
+
+    def run(self, cmd: str, env: Optional[Dict[str, str]] = None) -> Tuple[int, str, str]:
+        p = subprocess.run(self.command(cmd, env), shell=True, text=True, capture_output=True)
+        return p.returncode, p.stdout, p.stderr
+
+
+class PodmanBackend(DockerBackend):
+    name = "podman"
+    binary = "podman"
+
+
+class LocalBackend(ExecBackend):
+    name = "local"
+
+    # pip refuses --user installs inside a venv; the venv itself keeps installs.
+    DROP_ENV = ("PIP_USER", "PYTHONUSERBASE")
+
+    def venv_dir(self) -> str:
+        return os.path.join(self.workspace_dir(), ".swe_venv")
+
+    def _ensure_venv(self) -> str:
+        venv = self.venv_dir()
+        if not os.path.exists(os.path.join(venv, "bin", "python")):
+            base = os.environ.get("SWE_LOCAL_PYTHON", "").strip() or sys.executable
+            subprocess.run([base, "-m", "venv", venv], check=True, capture_output=True)
+        return venv
+
+    def _env(self, env: Optional[Dict[str, str]]) -> Dict[str, str]:
+        venv = self._ensure_venv()
+        ws = self.workspace_dir()
+        out = {k: v for k, v in os.environ.items() if k not in ("PYTHONHOME", "PYTHONPATH")}
+        paths = {CONTAINER_WORKSPACE: ws, **{c: h for h, c in self.mounts.items()}}
+        for k, v in (env or {}).items():
+            if k in self.DROP_ENV:
+                continue
+            for c, h in paths.items():
+                v = v.replace(c, h)
+            out[k] = v
+        out["VIRTUAL_ENV"] = venv
+        out["PATH"] = os.path.join(venv, "bin") + os.pathsep + out.get("PATH", "")
+        return out
+
+    def _preexec(self):
+        alloc = self.resources
+        if alloc is None:
+            return None
+
+        def limit() -> None:
+            import resource
+
+            os.sched_setaffinity(0, alloc.cpuset)
+            mem = alloc.mem_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (mem, mem))
+
+        return limit
+
+    def run(self, cmd: str, env: Optional[Dict[str, str]] = None) -> Tuple[int, str, str]:
+        p = subprocess.run(
+            ["bash", "-c", cmd],
+            cwd=self.workspace_dir(),
+            env=self._env(env),
+            text=True,
+            capture_output=True,
+            preexec_fn=self._preexec(),
+        )
+        return p.returncode, p.stdout, p.stderr
+
+
+BACKENDS = {
+    "docker": DockerBackend,
+    "podman": PodmanBackend,
+    "local": LocalBackend,
+}
+
+
+def get_backend(name: Optional[str] = None, image: Optional[str] = None, workspace: Optional[str] = None) -> ExecBackend:
+    name = (name or os.environ.get("SWE_BACKEND", "") or "docker").strip().lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown SWE_BACKEND '{name}'; expected one of: {', '.join(BACKENDS)}")
+    if name in ("docker", "podman") and not shutil.which(BACKENDS[name].binary):
+        print(f"[backend] warning: '{BACKENDS[name].binary}' not found on PATH")
+    return BACKENDS[name](image=image, workspace=workspace)
@@ -0,0 +1,190 @@
+"""
+Persistent-interpreter code executor for the local coding loop.
+
+LocalCommandLineCodeExecutor writes every code block to a file and starts a
+fresh `python` for it, so each agent turn pays interpreter startup and
+re-imports, and nothing survives between turns. PersistentPythonExecutor keeps
+one warm interpreter ("kernel") per session instead:
+
+- globals, imports and open state persist between executions of one session
+- each agent gets its own executor/kernel, so sessions never share a namespace
+  (they still share the work_dir, which is how the agents exchange files)
+- every execution has a timeout; on timeout, cancellation, or a crash the kernel
+  is killed and restarted (state is lost, and the result says so); when the
+  calling task itself is cancelled, the CancelledError propagates after the restart
+- the kernel runs under an address-space limit (RLIMIT_AS) that also applies
+  to any subprocesses it starts, such as `python -m pytest`
+- `%restart` as a code block, or `await executor.restart()`, gives a clean kernel
+
+The kernel redirects fds 1/2 into a temp file while a block runs, so output from
+subprocesses and C extensions is captured too. bash/sh blocks run through
+`subprocess` inside the kernel.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import signal
+import asyncio
+from typing import List, Optional
+
+from autogen_core import CancellationToken
+from autogen_core.code_executor import CodeBlock, CodeExecutor, CodeResult
+
+KERNEL = r'''
+import os, sys, json, tempfile, traceback
+_in = os.fdopen(os.dup(0), "r", encoding="utf-8")
+_out = os.fdopen(os.dup(1), "w", encoding="utf-8")
+os.dup2(os.open(os.devnull, os.O_RDONLY), 0)
+_ns = {"__name__": "__main__"}
+for _line in _in:
+    _code = json.loads(_line)["code"]
+    with tempfile.TemporaryFile() as _cap:
+        sys.stdout.flush(); sys.stderr.flush()
+        _saved = (os.dup(1), os.dup(2))
+        os.dup2(_cap.fileno(), 1); os.dup2(_cap.fileno(), 2)
+        _exit = 0
+        try:
+            exec(compile(_code, "<cell>", "exec"), _ns)
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                _exit = e.code or 0
+            else:
+                print(e.code, file=sys.stderr); _exit = 1
+        except BaseException:
+            _t, _v, _tb = sys.exc_info()
+            traceback.print_exception(_t, _v, _tb.tb_next); _exit = 1  # skip the kernel's own frame
+        finally:
+            sys.stdout.flush(); sys.stderr.flush()
+            os.dup2(_saved[0], 1); os.dup2(_saved[1], 2)
+            os.close(_saved[0]); os.close(_saved[1])
+        _cap.seek(0)
+        _output = _cap.read().decode("utf-8", "replace")
+    _out.write(json.dumps({"exit_code": _exit, "output": _output}) + "\n"); _out.flush()
+'''
+
+SHELL_LANGS = ("bash", "sh", "shell")
+PYTHON_LANGS = ("python", "py", "python3", "")
+
+
+class PersistentPythonExecutor(CodeExecutor):
+    """CodeExecutor backed by one long-lived Python interpreter per instance."""
+
+    def __init__(
+        self,
+        work_dir: str = "sandbox",
+        timeout: float = 60,
+        mem_mb: Optional[int] = 2048,
+        python: Optional[str] = None,
+    ):
+        self.work_dir = os.path.abspath(work_dir)
+        self.timeout = timeout
+        self.mem_mb = mem_mb
+        self.python = python or sys.executable
+        self._proc: Optional[asyncio.subprocess.Process] = None
+        self._lock = asyncio.Lock()
+        self.executions = 0
+        self.restarts = 0
+        self.exec_sec = 0.0
+
+    # ---------------- lifecycle ----------------
+    def _limits(self) -> None:
+        if self.mem_mb:
+            import resource
+
+            mem = self.mem_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (mem, mem))
+
+    async def start(self) -> None:
+        if self._proc is not None and self._proc.returncode is None:
+            return
+        os.makedirs(self.work_dir, exist_ok=True)
+        self._proc = await asyncio.create_subprocess_exec(
+            self.python, "-u", "-c", KERNEL,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            cwd=self.work_dir,
+            preexec_fn=self._limits,
+            start_new_session=True,  # timeouts kill the kernel together with its children
+            limit=64 * 1024 * 1024,
+        )
+
+    async def stop(self) -> None:
+        proc, self._proc = self._proc, None
+        if proc is None or proc.returncode is not None:
+            return
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        await proc.wait()
+
+    async def restart(self) -> None:
+        await self.stop()
+        self.restarts += 1
+        await self.start()
+
+    # ---------------- execution ----------------
+    async def _run(self, code: str, cancellation_token: CancellationToken) -> CodeResult:
+        await self.start()
+        assert self._proc is not None and self._proc.stdin is not None and self._proc.stdout is not None
+        self._proc.stdin.write((json.dumps({"code": code}) + "\n").encode("utf-8"))
+        await self._proc.stdin.drain()
+        reply = asyncio.ensure_future(self._proc.stdout.readline())
+        cancellation_token.link_future(reply)
+        try:
+            line = await asyncio.wait_for(reply, timeout=self.timeout)
+        except asyncio.TimeoutError:
+            await self.restart()
+            return CodeResult(exit_code=124, output=f"Timeout: execution exceeded {self.timeout:g}s; interpreter restarted, state lost.\n")
+        except asyncio.CancelledError:
+            await self.restart()
+            task = asyncio.current_task()
+            # Only a cancelled token is an execution result; a cancelled caller (e.g. a losing
+            # best-of-N candidate) must see the CancelledError and stop. (Task.cancelling: 3.11+)
+            if not cancellation_token.is_cancelled() or getattr(task, "cancelling", lambda: 0)():
+                raise
+            return CodeResult(exit_code=1, output="Execution cancelled; interpreter restarted, state lost.\n")
+        if not line:
+            code_ = self._proc.returncode
+            await self.restart()
+            hint = " (memory limit?)" if self.mem_mb else ""
+            return CodeResult(exit_code=137, output=f"Interpreter died{hint} (exit {code_}); restarted, state lost.\n")
+        msg = json.loads(line)
+        return CodeResult(exit_code=int(msg["exit_code"]), output=msg["output"])
+
+    async def execute_code_blocks(
+        self, code_blocks: List[CodeBlock], cancellation_token: CancellationToken
+    ) -> CodeResult:
+        outputs: List[str] = []
+        exit_code = 0
+        async with self._lock:
+            for block in code_blocks:
+                lang = (block.language or "").strip().lower()
+                code = block.code
+                if code.strip() == "%restart":
+                    await self.restart()
+                    outputs.append("Interpreter restarted.\n")
+                    continue
+                if lang in SHELL_LANGS:
+                    code = f"import subprocess as _sp\nraise SystemExit(_sp.run({code!r}, shell=True, executable='/bin/bash').returncode)\n"
+                elif lang not in PYTHON_LANGS:
+                    outputs.append(f"Unsupported language: {block.language}\n")
+                    exit_code = 1
+                    break
+                t0 = time.time()
+                result = await self._run(code, cancellation_token)
+                self.exec_sec += time.time() - t0
+                self.executions += 1
+                outputs.append(result.output)
+                exit_code = result.exit_code
+                if exit_code != 0:
+                    break
+        return CodeResult(exit_code=exit_code, output="".join(outputs))
+
+    def stats(self) -> dict:
+        return {"executions": self.executions, "restarts": self.restarts, "exec_sec": round(self.exec_sec, 3)}
@@ -0,0 +1,163 @@
+"""
+Speculative prefetch of the episode's setup steps (SWE_PREFETCH=1).
+
+The clone and install calls are fully determined by the instance, yet each
+one normally waits for an LLM round trip first. With prefetch, the runners
+start them in a background thread as soon as a model has passed preflight,
+while the first model turns are still running:
+
+    PREFETCH.start([("swe_clone", {...}, _swe_clone), ("swe_install", {...}, _swe_install)])
+
+Each tool first calls `await PREFETCH.claim(tool, **args)`:
+
+- the next unclaimed step has the same tool and arguments: wait for it (if it
+  is still running) and return its result; the tool does not run again
+- anything else (other arguments, another tool, a step out of order): the
+  remaining steps are dropped, the one in flight is allowed to finish so it
+  cannot race the real call, and the tool runs normally (claim returns None)
+
+Steps run one after another; a step that fails ("(exit N)") stops the rest.
+`record()` reports per-step timing and how long the tools waited, for
+results.jsonl. A step that ran but was never claimed (e.g. the install, when
+the model went straight to pytest) is "done" and counts as overlapped time;
+only steps that never started are "dropped".
+"""
+
+from __future__ import annotations
+
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Argument values a model may use for "no ref".
+_EMPTY = (None, "", "(default)")
+
+
+def prefetch_enabled() -> bool:
+    return os.environ.get("SWE_PREFETCH", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _same_args(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    norm = lambda d: {k: (None if v in _EMPTY else v) for k, v in d.items()}
+    return norm(a) == norm(b)
+
+
+@dataclass
+class Step:
+    tool: str
+    args: Dict[str, Any]
+    run: Callable[..., Awaitable[str]]
+    future: Future = field(default_factory=Future)
+    state: str = "pending"  # pending | running | done (ran, not claimed) | claimed | dropped (never ran)
+    start: Optional[float] = None
+    end: Optional[float] = None
+    waited: Optional[float] = None
+
+
+class Prefetcher:
+    def __init__(self) -> None:
+        self.steps: List[Step] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._t0 = 0.0
+
+    @property
+    def started(self) -> bool:
+        return self._thread is not None
+
+    def start(self, steps: Sequence[Tuple[str, Dict[str, Any], Callable[..., Awaitable[str]]]]) -> None:
+        self.steps = [Step(tool, dict(args), run) for tool, args, run in steps]
+        self._t0 = time.time()
+        self._thread = threading.Thread(target=self._work, name="swe-prefetch", daemon=True)
+        self._thread.start()
+
+    def _work(self) -> None:
+        for step in self.steps:
+            with self._lock:
+                if self._stop.is_set():
+                    step.state = "dropped"
+                    step.future.cancel()
+                    continue
+                step.state, step.start = "running", time.time()
+            try:
+                # The tool bodies block on backend commands; they get their own loop here.
+                result = asyncio.run(step.run(**step.args))
+            except BaseException as e:
+                step.end = time.time()
+                self._stop.set()
+                with self._lock:
+                    step.state = "done"
+                step.future.set_exception(e)
+                continue
+            step.end = time.time()
+            # "done" before the result is visible, so it cannot overwrite a claim's "claimed".
+            if isinstance(result, str) and result.startswith("(exit"):
+                self._stop.set()
+            with self._lock:
+                step.state = "done"
+            step.future.set_result(result)
+
+    async def claim(self, tool: str, **args: Any) -> Optional[str]:
+        """Prefetched result for this call, or None when the tool must run itself."""
+        if not self.started:
+            return None
+        with self._lock:
+            nxt = next((s for s in self.steps if s.state not in ("claimed", "dropped")), None)
+        if nxt is not None and nxt.tool == tool and _same_args(nxt.args, args):
+            t = time.time()
+            try:
+                result = await asyncio.wrap_future(nxt.future)
+            except (Exception, asyncio.CancelledError):
+                # Dropped before it ran, or failed with an exception: run for real.
+                await self._abandon()
+                return None
+            nxt.waited = time.time() - t
+            with self._lock:
+                nxt.state = "claimed"
+            return result
+        await self._abandon()
+        return None
+
+    async def _abandon(self) -> None:
+        self._stop.set()
+        with self._lock:
+            running = [s for s in self.steps if s.state == "running"]
+        if self._thread is not None and self._thread.is_alive():
+            t = time.time()
+            await asyncio.get_running_loop().run_in_executor(None, self._thread.join)
+            for s in running:
+                s.waited = time.time() - t
+        with self._lock:
+            # Steps that ran stay "done": their effects (a checkout, installed packages) are real.
+            for s in self.steps:
+                if s.state == "pending":
+                    s.state = "dropped"
+
+    def close(self) -> None:
+        """Stop after the step in flight and wait for it (before releasing resources)."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def record(self) -> Optional[Dict[str, Any]]:
+        if not self.started:
+            return None
+        steps = []
+        saved = 0.0
+        for s in self.steps:
+            sec = (s.end - s.start) if s.start and s.end else None
+            if s.state in ("claimed", "done") and sec is not None:
+                saved += max(0.0, sec - (s.waited or 0.0))
+            steps.append({
+                "tool": s.tool,
+                "state": s.state,
+                "start_offset_sec": round(s.start - self._t0, 3) if s.start else None,
+                "sec": round(sec, 3) if sec is not None else None,
+                "waited_sec": round(s.waited, 3) if s.waited is not None else None,
+            })
+        return {"steps": steps, "overlapped_sec": round(saved, 3)}
@@ -0,0 +1,160 @@
+"""
+Cache-friendly prompt layout and provider prompt-cache accounting.
+
+Providers reuse the KV cache of a prompt prefix they have seen recently, but
+only while the prefix is byte-identical. The runner tasks therefore start with
+a fixed instruction block that is shared by every episode of a sweep. The
+per-run values (instance id, repo URL, ref, pytest args) come last in a
+"Run parameters" block. Tools are passed in name order, so their schemas
+serialize the same way in every run.
+
+`track_cached_tokens` hooks the raw OpenAI client underneath an
+OpenAIChatCompletionClient. It records `usage.prompt_tokens_details.cached_tokens`
+(or DeepSeek-style `prompt_cache_hit_tokens`) for every call, because the
+autogen RequestUsage drops that detail.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+ONE_AGENT_PREFIX = """Validate a Python repo in Docker. Execute EXACTLY these three tool calls, then STOP.
+Do NOT print tool call syntax, XML/angle-bracket markup, or explanations. Paste only tool returns when prompted.
+
+1) swe_clone(repo_url=<repo_url>, ref=<ref>)
+2) swe_install()
+3) swe_pytest(pytest_args=<pytest_args>)
+
+Take <repo_url>, <ref> and <pytest_args> verbatim from the run parameters below.
+
+CRITICAL OUTPUT RULE:
+After step 3, print ONLY the exact string returned by swe_pytest (the last non-empty pytest stdout line). No extra words.
+"""
+
+TEAM_PREFIX = """You are a team validating a Python repo inside Docker.
+
+Tools (call them and paste ONLY tool output; do not paraphrase):
+- swe_clone(repo_url, ref) -> clones into /workspace/project
+- swe_install(req_file="requirements.txt") -> installs deps if file exists
+- swe_pytest(pytest_args="-q") -> runs pytest and returns ONLY the last non-empty stdout line
+
+Goal:
+1) Clone the repo_url at ref from the run parameters below.
+2) Install dependencies.
+3) Run tests with the pytest_args from the run parameters.
+4) If tests fail, re-run with a narrower -k or briefly suggest next steps (but do not edit code in this MVP).
+After each test run, paste ONLY the exact line returned by swe_pytest (no extra words).
+"""
+
+
+def run_parameters(instance_id: Optional[str], repo_url: str, ref: str, pytest_args: str) -> str:
+    lines = ["Run parameters:"]
+    if instance_id:
+        lines.append(f"instance_id = {instance_id}")
+    lines += [
+        f'repo_url    = "{repo_url}"',
+        f'ref         = "{ref}"',
+        f'pytest_args = "{pytest_args}"',
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def one_agent_task(instance_id: Optional[str], repo_url: str, ref: str, pytest_args: str) -> str:
+    return ONE_AGENT_PREFIX + "\n" + run_parameters(instance_id, repo_url, ref, pytest_args)
+
+
+def team_task(instance_id: Optional[str], repo_url: str, ref: str, pytest_args: str) -> str:
+    return TEAM_PREFIX + "\n" + run_parameters(instance_id, repo_url, ref, pytest_args)
+
+
+def prefix_id(prefix: str) -> str:
+    """Short hash of a shared prefix, recorded so sweeps can group runs by it."""
+    return hashlib.sha1(prefix.encode("utf-8")).hexdigest()[:12]
+
+
+def sorted_tools(tools: Sequence[Callable[..., Any]]) -> List[Callable[..., Any]]:
+    return sorted(tools, key=lambda t: getattr(t, "__name__", str(t)))
+
+
+# ---------------- cache-hit accounting ----------------
+def _cached_from_usage(u: Any) -> Optional[int]:
+    if u is None:
+        return None
+    get = (lambda o, k: (o.get(k) if isinstance(o, dict) else getattr(o, k, None)))
+    details = get(u, "prompt_tokens_details")
+    cached = get(details, "cached_tokens") if details is not None else None
+    if cached is None:
+        cached = get(u, "prompt_cache_hit_tokens")
+    return cached if isinstance(cached, int) else None
+
+
+class _StreamProxy:
+    """Passes an AsyncStream through unchanged, noting usage once it is exhausted."""
+
+    def __init__(self, stream: Any, on_usage: Callable[[Any], None]):
+        self._stream = stream
+        self._on_usage = on_usage
+        self._it: Any = None
+        self._usage: Any = None
+        self._done = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._it is None:
+            self._it = self._stream.__aiter__()
+        try:
+            chunk = await self._it.__anext__()
+        except StopAsyncIteration:
+            if not self._done:
+                self._done = True
+                self._on_usage(self._usage)
+            raise
+        self._usage = getattr(chunk, "usage", None) or self._usage
+        return chunk
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._stream, name)
+
+
+def track_cached_tokens(client: Any, totals: Dict[str, Any]) -> bool:
+    """Record cached prompt tokens per call into totals["cache_calls"]; False if unsupported."""
+    if hasattr(client, "slots"):  # client_pool.PooledChatClient: hook every slot's client
+        return all([track_cached_tokens(s.client, totals) for s in client.slots])
+    raw = getattr(getattr(getattr(client, "_client", None), "chat", None), "completions", None)
+    if raw is None or not hasattr(raw, "create"):
+        return False
+    totals.setdefault("cached_tokens", 0)
+    calls: List[Dict[str, Any]] = totals.setdefault("cache_calls", [])
+    orig = raw.create
+
+    def note(u: Any) -> None:
+        cached = _cached_from_usage(u)
+        prompt = (u.get("prompt_tokens") if isinstance(u, dict) else getattr(u, "prompt_tokens", None)) if u else None
+        calls.append({"prompt": prompt, "cached": cached})
+        if cached:
+            totals["cached_tokens"] += cached
+
+    async def create(*args, **kwargs):
+        resp = await orig(*args, **kwargs)
+        if kwargs.get("stream"):
+            return _StreamProxy(resp, note)
+        note(getattr(resp, "usage", None))
+        return resp
+
+    raw.create = create
+    return True
+
+
+def cache_record(totals: Optional[Dict[str, Any]], prefix: str) -> Dict[str, Any]:
+    calls = (totals or {}).get("cache_calls") or []
+    prompt = sum(c["prompt"] or 0 for c in calls)
+    cached = (totals or {}).get("cached_tokens", 0)
+    return {
+        "prefix_id": prefix_id(prefix),
+        "cached_tokens": cached,
+        "hit_rate": round(cached / prompt, 4) if prompt else None,
+        "calls": [[c["prompt"], c["cached"]] for c in calls],
+    }
@@ -0,0 +1,264 @@
+"""
+Cached collection manifests for swe_pytest (SWE_COLLECT_CACHE=1).
+
+A `-k` run still imports and collects the whole suite only to deselect most of
+it ("3387 deselected"). With collection manifests, the node IDs one run
+selected are remembered per (repo, ref, pytest args, dependency key), and a
+later run with the same arguments passes pytest just the files holding those
+tests. The original arguments (the -k expression included) still apply, so
+pytest selects the same tests but imports a handful of modules instead of the
+suite.
+
+- key:      repo, ref, the pytest arguments minus verbosity flags, and a
+            dependency key (backend image plus requirements*/constraints*
+            files, pyproject.toml, setup.py, setup.cfg)
+- validity: a fingerprint of the test files (test_*.py, *_test.py,
+            conftest.py, pytest.ini, tox.ini: paths and contents) read from
+            the checkout on the host; any edit, addition or removal misses
+- miss:     the run loads a tiny plugin (-p swe_manifest_plugin) that writes
+            the selected node IDs after deselection, unless collection had
+            errors or the rootdir is not the project dir
+- stale:    a cached run (or any shard of one) that exits with 4 (file not
+            found) or 5 (no tests) drops the manifest and is repeated with a
+            normal collection
+
+Arguments that name paths, or whose selection depends on earlier runs
+(--lf, --ff, --sw, --nf), are never cached. Sharded runs
+(SWE_PYTEST_SHARDS) reuse the manifest in place of their --collect-only
+pass. Manifests live in SWE_MANIFEST_DIR (default sandbox/.cache/manifests,
+the "manifests" namespace of cache_manager.py).
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import json
+import time
+import shlex
+import hashlib
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import cache_manager
+from pytest_shards import VERBOSITY_FLAGS
+
+MANIFEST_DIR = ".swe_manifest"  # relative to the workspace root, outside the git checkout
+
+# Loaded with `-p swe_manifest_plugin`: writes the selected node IDs (and how many
+# tests the arguments deselected) to SWE_MANIFEST_OUT.
+PLUGIN = '''import os
+import json
+
+_FAILED = []
+_DESELECTED = []
+
+
+def pytest_collectreport(report):
+    if report.failed:
+        _FAILED.append(report.nodeid)
+
+
+def pytest_deselected(items):
+    _DESELECTED.append(len(items))
+
+
+def pytest_collection_finish(session):
+    path = os.environ.get("SWE_MANIFEST_OUT")
+    rootdir = str(getattr(session.config, "rootpath", session.config.rootdir))
+    # Node IDs are rootdir-relative; only a clean collection from the rootdir can be replayed.
+    if not path or _FAILED or os.path.realpath(rootdir) != os.path.realpath(os.getcwd()):
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"nodeids": [item.nodeid for item in session.items], "deselected": sum(_DESELECTED)}, f)
+'''
+
+TEST_FILE_RE = re.compile(r"^(test_.*|.*_test)\.py$")
+TEST_CONFIG = ("conftest.py", "pytest.ini", "tox.ini")
+DEP_FILE_RE = re.compile(r"^(.*requirements.*\.txt|constraints.*\.txt|pyproject\.toml|setup\.py|setup\.cfg)$")
+SKIP_DIRS = {"node_modules", "build", "dist", "__pycache__", "venv"}
+
+# Options that take a separate value; any other bare argument is a path and disables caching.
+VALUE_OPTS = {
+    "-k", "-m", "-p", "-c", "-o", "-W", "-r", "-n", "--maxfail", "--tb", "--durations", "--rootdir",
+    "--confcutdir", "--basetemp", "--ignore", "--ignore-glob", "--deselect", "--import-mode",
+    "--log-level", "--junitxml", "--junit-xml", "--override-ini", "--pythonwarnings", "--dist",
+}
+UNCACHEABLE = {"--lf", "--last-failed", "--ff", "--failed-first", "--sw", "--stepwise", "--nf", "--new-first", "--co", "--collect-only"}
+
+
+def manifest_enabled() -> bool:
+    return os.environ.get("SWE_COLLECT_CACHE", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def manifest_root() -> str:
+    return os.path.abspath(os.environ.get("SWE_MANIFEST_DIR", "").strip() or os.path.join("sandbox", ".cache", "manifests"))
+
+
+def selection_args(pytest_args: str) -> Optional[List[str]]:
+    """The arguments that decide which tests run, or None when the selection cannot be cached."""
+    try:
+        args = shlex.split(pytest_args or "")
+    except ValueError:
+        return None
+    out: List[str] = []
+    takes_value = False
+    for a in args:
+        if takes_value:
+            out.append(a)
+            takes_value = False
+        elif a in VERBOSITY_FLAGS:
+            continue
+        elif a.split("=", 1)[0] in UNCACHEABLE:
+            return None
+        elif a.startswith("-"):
+            out.append(a)
+            takes_value = a in VALUE_OPTS
+        else:
+            return None
+    return out
+
+
+# ---------------- fingerprints ----------------
+def _walk(project_dir: str):
+    for root, dirs, files in os.walk(project_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith(".") and d not in SKIP_DIRS and not d.endswith(".egg-info"))
+        for name in sorted(files):
+            yield os.path.relpath(os.path.join(root, name), project_dir).replace(os.sep, "/"), name
+
+
+def _digest(project_dir: str, paths: Sequence[str]) -> str:
+    h = hashlib.sha1()
+    for rel in paths:
+        h.update(rel.encode("utf-8") + b"\0")
+        try:
+            with open(os.path.join(project_dir, rel), "rb") as f:
+                h.update(hashlib.sha1(f.read()).digest())
+        except OSError:
+            h.update(b"?")
+    return h.hexdigest()
+
+
+def fingerprints(project_dir: str, image: str = "") -> Tuple[str, str]:
+    """(test files, dependency key) digests of a checkout."""
+    tests: List[str] = []
+    deps: List[str] = []
+    for rel, name in _walk(project_dir):
+        if TEST_FILE_RE.match(name) or name in TEST_CONFIG:
+            tests.append(rel)
+        # Dependency files at the top level or one directory down (ci/, requirements/, testing/).
+        if rel.count("/") <= 1 and DEP_FILE_RE.match(name):
+            deps.append(rel)
+    return _digest(project_dir, tests), hashlib.sha1((image + "\0" + _digest(project_dir, deps)).encode("utf-8")).hexdigest()
+
+
+# ---------------- manifests ----------------
+@dataclass
+class Manifest:
+    path: str
+    tests_fp: str
+    nodeids: Optional[List[str]]  # None on a miss
+    lookup_sec: float
+    deselected: int = 0  # tests the arguments deselected, for sharded tails
+
+    def record(self) -> Dict[str, Any]:
+        return {
+            "hit": self.nodeids is not None,
+            "tests": len(self.nodeids) if self.nodeids is not None else None,
+            "files": len(files_of(self.nodeids)) if self.nodeids is not None else None,
+            "lookup_sec": round(self.lookup_sec, 3),
+        }
+
+
+def manifest_key(repo_url: str, ref: Optional[str], args: Sequence[str], deps_fp: str) -> str:
+    return hashlib.sha1(json.dumps([repo_url, ref or "", list(args), deps_fp]).encode("utf-8")).hexdigest()[:16]
+
+
+def lookup(workspace_dir: str, pytest_args: str, repo_url: str, ref: Optional[str], image: str = "") -> Optional[Manifest]:
+    """The cached selection for this run (nodeids None on a miss); None when it is not cacheable."""
+    args = selection_args(pytest_args)
+    project = os.path.join(workspace_dir, "project")
+    if args is None or not os.path.isdir(project):
+        return None
+    t0 = time.time()
+    tests_fp, deps_fp = fingerprints(project, image)
+    path = os.path.join(manifest_root(), manifest_key(repo_url, ref, args, deps_fp) + ".json")
+    nodeids, deselected = None, 0
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("tests_fp") == tests_fp and data.get("nodeids"):
+            nodeids = [str(t) for t in data["nodeids"]]
+            deselected = int(data.get("deselected") or 0)
+            cache_manager.touch("manifests", os.path.basename(path))
+    except (OSError, ValueError, AttributeError):
+        pass
+    return Manifest(path, tests_fp, nodeids, time.time() - t0, deselected)
+
+
+def save(m: Manifest, nodeids: Sequence[str], deselected: int = 0) -> None:
+    if not nodeids:
+        return
+    os.makedirs(os.path.dirname(m.path), exist_ok=True)
+    tmp = f"{m.path}.tmp-{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"tests_fp": m.tests_fp, "created": time.time(), "deselected": deselected, "nodeids": list(nodeids)}, f)
+    os.replace(tmp, m.path)
+    cache_manager.record("manifests", os.path.basename(m.path))
+
+
+def invalidate(m: Manifest) -> None:
+    try:
+        os.remove(m.path)
+    except OSError:
+        pass
+    m.nodeids = None
+
+
+def files_of(nodeids: Sequence[str]) -> List[str]:
+    return sorted({t.split("::", 1)[0] for t in nodeids})
+
+
+# ---------------- run ----------------
+def command(m: Manifest, pytest_args: str, workspace_dir: str) -> Tuple[str, Dict[str, str]]:
+    """(pytest command, extra env) for a run through the manifest cache."""
+    if m.nodeids is not None:
+        files = " ".join(shlex.quote(p) for p in files_of(m.nodeids))
+        return f"python -m pytest {pytest_args} {files}", {}
+    d = os.path.join(workspace_dir, MANIFEST_DIR)
+    os.makedirs(d, exist_ok=True)
+    with open(os.path.join(d, "swe_manifest_plugin.py"), "w", encoding="utf-8") as f:
+        f.write(PLUGIN)
+    try:
+        os.remove(os.path.join(d, "collected.json"))
+    except OSError:
+        pass
+    return f"python -m pytest {pytest_args} -p swe_manifest_plugin", {
+        "SWE_MANIFEST_OUT": f"/workspace/{MANIFEST_DIR}/collected.json",
+        "PYTHONPATH": f"/workspace/{MANIFEST_DIR}",
+    }
+
+
+def stale(m: Manifest, codes: Sequence[int]) -> bool:
+    """Drop a cached selection the tree no longer matches; True when the run must be repeated.
+
+    `codes` are the exit codes of the cached run (one per shard when sharded):
+    4 is a file that is gone, 5 a file without the selected tests.
+    """
+    if m.nodeids is None or not any(c in (4, 5) for c in codes):
+        return False
+    invalidate(m)
+    return True
+
+
+def finish(m: Manifest, code: int, workspace_dir: str) -> bool:
+    """Store a miss's selection; True when a cached run went stale and must be repeated."""
+    if m.nodeids is not None:
+        return stale(m, [code])
+    try:
+        with open(os.path.join(workspace_dir, MANIFEST_DIR, "collected.json"), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        save(m, [str(t) for t in data.get("nodeids") or []], int(data.get("deselected") or 0))
+    except (OSError, ValueError, AttributeError):
+        pass
+    return False
@@ -0,0 +1,248 @@
+"""
+Profiling mode for the target test run (swe_pytest and repo_validate.py).
+
+With SWE_PROFILE=1 the pytest run is wrapped so that a few seconds of
+"3387 deselected, 3 errors" can be broken down:
+
+- phases:   a tiny plugin (-p swe_profile_plugin) timestamps interpreter + pytest
+            startup, configuration (conftest/plugin loading), collection and the
+            test loop, and counts collected vs selected tests
+- imports:  `python -X importtime` (with --capture=sys, so imports made during
+            collection reach stderr); the summary lists the slowest top-level
+            imports and the time spent importing the target package itself
+- tests:    `--durations=N` (SWE_PROFILE_TOP, default 15) for the slowest tests
+- sampler:  SWE_PROFILE_SAMPLER=py-spy records a speedscope profile of the pytest
+            process (installed on demand; falls back to cProfile when py-spy
+            cannot attach), SWE_PROFILE_SAMPLER=cprofile writes pstats plus a
+            cumulative top list. Off by default, since both slow the run down.
+
+Artifacts land in <workspace>/.swe_profile (sandbox/.swe_profile by default),
+overwritten by each profiled run; `summarize` condenses them into the
+`profile` field of the results record.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from pytest_shards import parse_durations
+
+PROFILE_DIR = ".swe_profile"  # relative to the workspace root, outside the git checkout
+SAMPLERS = ("py-spy", "cprofile")
+
+# Loaded with `-p swe_profile_plugin`: records phase timestamps into $SWE_PROFILE_DIR/phases.json.
+PLUGIN = '''import os
+import json
+import time
+
+import pytest
+
+_T = {"plugin_loaded": time.time()}
+
+
+def pytest_sessionstart(session):
+    _T["sessionstart"] = time.time()
+
+
+def pytest_collection(session):
+    _T["collect_start"] = time.time()
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_collection_modifyitems(items):
+    _T["collected"] = len(items)  # before -k/-m deselect anything
+
+
+def pytest_collection_finish(session):
+    _T["collect_end"] = time.time()
+    _T["selected"] = len(session.items)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    _T["finish"] = time.time()
+    _T["exitstatus"] = int(exitstatus)
+    try:
+        _T["t0"] = float(os.environ.get("SWE_PROFILE_T0", "") or _T["plugin_loaded"])
+    except ValueError:
+        _T["t0"] = _T["plugin_loaded"]
+    path = os.path.join(os.environ.get("SWE_PROFILE_DIR", "."), "phases.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(_T, f)
+'''
+
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def profiling_enabled() -> bool:
+    return os.environ.get("SWE_PROFILE", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def sampler() -> Optional[str]:
+    s = os.environ.get("SWE_PROFILE_SAMPLER", "").strip().lower()
+    return s if s in SAMPLERS else None
+
+
+def top_n() -> int:
+    try:
+        return max(1, int(os.environ.get("SWE_PROFILE_TOP", "15").strip() or "15"))
+    except ValueError:
+        return 15
+
+
+def prepare(workspace_dir: str) -> str:
+    """Reset the artifact dir for a new run and install the plugin; returns its host path."""
+    d = os.path.join(workspace_dir, PROFILE_DIR)
+    os.makedirs(d, exist_ok=True)
+    for name in os.listdir(d):
+        p = os.path.join(d, name)
+        if os.path.isfile(p):
+            os.remove(p)
+    with open(os.path.join(d, "swe_profile_plugin.py"), "w", encoding="utf-8") as f:
+        f.write(PLUGIN)
+    return d
+
+
+def pytest_command(pytest_args: str, mode: Optional[str] = None) -> str:
+    """Shell snippet, run from the project dir, that profiles `python -m pytest <pytest_args>`.
+
+    Paths are resolved in the shell relative to the project, so the same snippet
+    works in a container (/workspace) and with the local backend.
+    """
+    mode = mode if mode in SAMPLERS else None
+    args = f"{pytest_args} -p swe_profile_plugin --durations={top_n()}"
+    if not re.search(r"(^|\s)(-s|--capture\b)", pytest_args or ""):
+        # fd capture would swallow the importtime lines of everything imported during
+        # collection (the test modules and usually the target package).
+        args += " --capture=sys"
+    t0 = 'SWE_PROFILE_T0="$(date +%s.%N)"'
+    cprofile = f'{t0} python -X importtime -m cProfile -o "$P/profile.pstats" -m pytest {args}'
+    plain = f"python -X importtime -m pytest {args}"
+    if mode == "py-spy":
+        run = f"""command -v py-spy >/dev/null 2>&1 || python -m pip install -q py-spy >/dev/null 2>&1
+if command -v py-spy >/dev/null 2>&1; then
+    # py-spy prints its own notes on stdout; keep pytest's summary the last line.
+    {t0} py-spy record -o "$P/profile.speedscope.json" -f speedscope -r 100 --subprocesses -- {plain} 2> "$P/stderr.log" | grep -v '^py-spy> '
+    code=1
+fi
+if [ ! -f "$P/phases.json" ]; then
+    # py-spy missing or not allowed to attach (ptrace): profile with cProfile instead.
+    echo cprofile > "$P/sampler_fallback"
+    {cprofile} 2> "$P/stderr.log"
+    code=$?
+fi"""
+    elif mode == "cprofile":
+        run = f"""{cprofile} 2> "$P/stderr.log"
+code=$?"""
+    else:
+        run = f"""{t0} {plain} 2> "$P/stderr.log"
+code=$?"""
+    return f"""P="$(cd .. && pwd)/{PROFILE_DIR}"
+export SWE_PROFILE_DIR="$P"
+export PYTHONPATH="$P${{PYTHONPATH:+:$PYTHONPATH}}"
+code=1
+{run}
+# py-spy does not pass pytest's exit status through; the plugin recorded it.
+if [ -f "$P/phases.json" ]; then
+    code=$(python -c "import json,sys; print(json.load(open(sys.argv[1]))['exitstatus'])" "$P/phases.json" 2>/dev/null || echo $code)
+fi
+grep '^import time:' "$P/stderr.log" > "$P/importtime.log"
+grep -v '^import time:' "$P/stderr.log" >&2
+if [ -f "$P/profile.pstats" ]; then
+    python -c "import pstats,sys; pstats.Stats(sys.argv[1], stream=open(sys.argv[2], 'w')).sort_stats('cumulative').print_stats(40)" "$P/profile.pstats" "$P/profile_top.txt" 2>/dev/null
+fi
+exit $code"""
+
+
+# ---------------- summary ----------------
+def parse_importtime(text: str) -> List[Tuple[int, str, float, float]]:
+    """(depth, module, self_sec, cumulative_sec) per `-X importtime` line."""
+    out = []
+    for ln in (text or "").splitlines():
+        m = IMPORTTIME_RE.match(ln)
+        if m:
+            depth = max(0, (len(m.group(3)) - 1) // 2)
+            out.append((depth, m.group(4), int(m.group(1)) / 1e6, int(m.group(2)) / 1e6))
+    return out
+
+
+def target_modules(repo_url: str) -> Tuple[str, ...]:
+    """Likely top-level module names of the repo under test (`pandas`, `pytest`/`_pytest`)."""
+    name = re.sub(r"\.git$", "", (repo_url or "").rstrip("/")).rsplit("/", 1)[-1].lower().replace("-", "_")
+    return (name, "_" + name) if name else ()
+
+
+def summarize(profile_dir: str, pytest_out: str, repo_url: str = "", mode: Optional[str] = None) -> Dict[str, Any]:
+    """Condense the artifacts of one profiled run; also written to summary.json."""
+    def read(name: str) -> str:
+        try:
+            with open(os.path.join(profile_dir, name), "r", encoding="utf-8", errors="replace") as f:
+                return f.read()
+        except OSError:
+            return ""
+
+    summary: Dict[str, Any] = {"dir": profile_dir}
+    try:
+        t = json.loads(read("phases.json"))
+    except ValueError:
+        t = {}
+    if t.get("finish"):
+        collect_start = t.get("collect_start", t["sessionstart"])
+        collect_end = t.get("collect_end", collect_start)
+        summary["phases"] = {
+            "startup_sec": round(t["plugin_loaded"] - t["t0"], 3),
+            "configure_sec": round(t["sessionstart"] - t["plugin_loaded"], 3),
+            "collect_sec": round(collect_end - collect_start, 3),
+            "run_sec": round(t["finish"] - collect_end, 3),
+            "wall_sec": round(t["finish"] - t["t0"], 3),
+        }
+        summary["collected"] = t.get("collected")
+        summary["selected"] = t.get("selected")
+        summary["exitstatus"] = t.get("exitstatus")
+
+    imports = parse_importtime(read("importtime.log"))
+    top_level = [(mod, cum) for depth, mod, _, cum in imports if depth == 0]
+    targets = target_modules(repo_url)
+    summary["imports"] = {
+        "modules": len(imports),
+        "total_sec": round(sum(cum for _, cum in top_level), 3),
+        "target_sec": round(sum(cum for mod, cum in top_level if mod.split(".")[0] in targets), 3),
+        "top": [[mod, round(cum, 3)] for mod, cum in sorted(top_level, key=lambda x: -x[1])[: top_n()]],
+    }
+    slowest = sorted(parse_durations(pytest_out).items(), key=lambda x: -x[1])[: top_n()]
+    summary["slowest"] = [[nodeid, round(sec, 3)] for nodeid, sec in slowest]
+
+    if os.path.exists(os.path.join(profile_dir, "sampler_fallback")):
+        mode = "cprofile"
+    summary["sampler"] = mode
+    summary["artifacts"] = sorted(
+        n for n in os.listdir(profile_dir) if n not in ("swe_profile_plugin.py", "stderr.log", "sampler_fallback")
+    ) if os.path.isdir(profile_dir) else []
+    try:
+        with open(os.path.join(profile_dir, "summary.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    except OSError:
+        pass
+    return summary
+
+
+def format_summary(s: Dict[str, Any]) -> str:
+    """A few human-readable lines for CLI output."""
+    lines = []
+    ph = s.get("phases")
+    if ph:
+        lines.append(
+            "profile: startup {startup_sec:.2f}s, configure {configure_sec:.2f}s, collect {collect_sec:.2f}s, "
+            "run {run_sec:.2f}s (wall {wall_sec:.2f}s)".format(**ph)
+            + f"; {s.get('selected')}/{s.get('collected')} tests selected"
+        )
+    imp = s.get("imports") or {}
+    if imp.get("modules"):
+        top = ", ".join(f"{m} {sec:.2f}s" for m, sec in imp["top"][:5])
+        lines.append(f"imports: {imp['total_sec']:.2f}s total, target package {imp['target_sec']:.2f}s; top: {top}")
+    for nodeid, sec in (s.get("slowest") or [])[:5]:
+        lines.append(f"slow: {sec:.2f}s {nodeid}")
+    lines.append(f"artifacts: {s.get('dir')}")
+    return "\n".join(lines)
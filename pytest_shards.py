@@ -0,0 +1,279 @@
+"""
+Duration-aware pytest sharding for swe_pytest.
+
+With SWE_PYTEST_SHARDS=N (N > 1) the runners split one pytest invocation into N
+shards over the same checkout and run them in parallel, one backend command
+(one container) per shard:
+
+1. collect:  `pytest --collect-only -q <args>` lists the selected node IDs
+2. balance:  longest-processing-time-first over per-test durations remembered
+             for this (repo, ref); unknown tests get the median known duration
+3. run:      each shard runs `pytest <args> <its files>` with a tiny plugin that
+             deselects every node ID outside the shard, `--durations=0` to
+             refresh the timings, and the cache provider disabled so shards do
+             not race on .pytest_cache
+4. merge:    the shard summaries are summed into one pytest-style tail, e.g.
+             "2 failed, 310 passed, 3387 deselected in 41.20s (4 shards)";
+             the deselected count is the collect pass's, as in a single run
+
+When the episode holds a resource_sched allocation, its CPU set and memory are
+split across the shards instead of oversubscribing the host. Durations live in
+SWE_DURATIONS_DIR (default sandbox/.cache/durations, the "durations" namespace
+of cache_manager.py). Any collection problem
+falls back to the normal single run. With SWE_COLLECT_CACHE=1 a cached
+collection manifest (pytest_manifest.py) replaces step 1.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import copy
+import json
+import heapq
+import shlex
+import statistics
+import time
+import dataclasses
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+import cache_manager
+from workspace_snap import snapshot_key
+
+SHARD_DIR = ".swe_shards"  # relative to the workspace root, outside the git checkout
+
+ENSURE_PYTEST = """python - <<'PY'
+import subprocess
+try:
+    import pytest  # noqa: F401
+except Exception:
+    subprocess.run('python -m pip install -q -U pytest', shell=True, check=False)
+PY"""
+
+# Loaded with `-p swe_shard_plugin`: keeps only the node IDs listed in SWE_SHARD_FILE.
+PLUGIN = '''import os
+
+
+def pytest_collection_modifyitems(config, items):
+    path = os.environ.get("SWE_SHARD_FILE")
+    if not path:
+        return
+    with open(path, encoding="utf-8") as f:
+        keep = set(line.rstrip("\\n") for line in f if line.strip())
+    selected = [it for it in items if it.nodeid in keep]
+    deselected = [it for it in items if it.nodeid not in keep]
+    if deselected:
+        config.hook.pytest_deselected(items=deselected)
+        items[:] = selected
+'''
+
+SUMMARY_RE = re.compile(r"(\d+) (failed|passed|skipped|deselected|xfailed|xpassed|errors?|warnings?)")
+DURATION_RE = re.compile(r"^\s*([\d.]+)s\s+(setup|call|teardown)\s+(\S.*)$")
+VERBOSITY_FLAGS = ("-q", "-qq", "-v", "-vv", "--quiet", "--verbose")
+ORDER = ("failed", "passed", "skipped", "deselected", "xfailed", "xpassed", "error", "warning")
+
+
+def shards_requested() -> int:
+    try:
+        return max(1, int(os.environ.get("SWE_PYTEST_SHARDS", "1").strip() or "1"))
+    except ValueError:
+        return 1
+
+
+def durations_root() -> str:
+    return os.path.abspath(os.environ.get("SWE_DURATIONS_DIR", "").strip() or os.path.join("sandbox", ".cache", "durations"))
+
+
+def durations_path(repo_url: str, ref: Optional[str]) -> str:
+    return os.path.join(durations_root(), snapshot_key(repo_url, ref) + ".json")
+
+
+def load_durations(repo_url: str, ref: Optional[str]) -> Dict[str, float]:
+    path = durations_path(repo_url, ref)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        out = {k: float(v) for k, v in data.items()}
+    except (OSError, ValueError, AttributeError):
+        return {}
+    cache_manager.touch("durations", os.path.basename(path))
+    return out
+
+
+def save_durations(repo_url: str, ref: Optional[str], new: Dict[str, float]) -> None:
+    if not new:
+        return
+    path = durations_path(repo_url, ref)
+    merged = {**load_durations(repo_url, ref), **new}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(merged, f)
+    os.replace(tmp, path)
+    cache_manager.record("durations", os.path.basename(path))
+
+
+# ---------------- collect / balance ----------------
+def parse_collected(out: str) -> List[str]:
+    """Node IDs from `pytest --collect-only -q` output."""
+    return [ln.strip() for ln in (out or "").splitlines() if "::" in ln and not ln.startswith((" ", "="))]
+
+
+def balance(nodeids: Sequence[str], durations: Dict[str, float], n: int) -> List[List[str]]:
+    """Greedy LPT: longest known test first, each onto the currently lightest shard."""
+    known = [durations[t] for t in nodeids if t in durations]
+    default = statistics.median(known) if known else 1.0
+    weighted = sorted(nodeids, key=lambda t: (-durations.get(t, default), t))
+    heap = [(0.0, i) for i in range(n)]
+    shards: List[List[str]] = [[] for _ in range(n)]
+    for t in weighted:
+        load, i = heapq.heappop(heap)
+        shards[i].append(t)
+        heapq.heappush(heap, (load + durations.get(t, default), i))
+    return [s for s in shards if s]
+
+
+def parse_durations(out: str) -> Dict[str, float]:
+    """Per-test seconds (setup + call + teardown) from `--durations=0` output."""
+    total: Dict[str, float] = {}
+    for ln in (out or "").splitlines():
+        m = DURATION_RE.match(ln)
+        if m:
+            total[m.group(3).strip()] = total.get(m.group(3).strip(), 0.0) + float(m.group(1))
+    return total
+
+
+def parse_summary(tail: str) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for num, word in SUMMARY_RE.findall(tail or ""):
+        word = word.rstrip("s") if word in ("errors", "warnings") else word
+        counts[word] = counts.get(word, 0) + int(num)
+    return counts
+
+
+def merge_tail(counts: Dict[str, int], wall: float, n: int) -> str:
+    parts = [f"{counts[k]} {k + ('s' if k in ('error', 'warning') and counts[k] != 1 else '')}" for k in ORDER if counts.get(k)]
+    if not parts:
+        return "no tests ran"
+    return f"{', '.join(parts)} in {wall:.2f}s ({n} shards)"
+
+
+# ---------------- run ----------------
+def _split_resources(alloc: Any, n: int) -> List[Any]:
+    """One slice of the episode's allocation per shard (shared when it cannot be split)."""
+    if alloc is None:
+        return [None] * n
+    cpus = list(alloc.cpuset)
+    if len(cpus) < n:
+        return [alloc] * n
+    per = len(cpus) // n
+    return [
+        dataclasses.replace(alloc, cpuset=cpus[i * per:(i + 1) * per] if i < n - 1 else cpus[i * per:], mem_mb=max(256, alloc.mem_mb // n))
+        for i in range(n)
+    ]
+
+
+def _last_nonempty(s: str) -> str:
+    lines = [ln for ln in (s or "").splitlines() if ln.strip()]
+    return lines[-1] if lines else ""
+
+
+def run_sharded(
+    backend: Any,
+    env: Dict[str, str],
+    pytest_args: str,
+    repo_url: str,
+    ref: Optional[str],
+    n: Optional[int] = None,
+    nodeids: Optional[Sequence[str]] = None,
+    deselected: int = 0,
+) -> Optional[Dict[str, Any]]:
+    """Run pytest in `n` parallel shards; returns None when sharding does not apply.
+
+    `nodeids` is a known selection (a pytest_manifest.py hit) that replaces the
+    --collect-only pass; `deselected` is then the number of tests its own
+    arguments deselected, for the merged tail.
+    """
+    n = n or shards_requested()
+    if n <= 1:
+        return None
+    collected = nodeids is None
+    if collected:
+        # Exactly one -q lists node IDs (-qq would only print per-file counts).
+        quiet = " ".join(shlex.quote(a) for a in shlex.split(pytest_args) if a not in VERBOSITY_FLAGS)
+        code, out, _ = backend.run(f"{ENSURE_PYTEST}\ncd project && python -m pytest --collect-only -q {quiet}", env=env)
+        nodeids = parse_collected(out)
+        if code != 0:
+            return None
+        # "3/3390 tests collected (3387 deselected)": what the user's -k/-m dropped.
+        deselected = parse_summary(_last_nonempty(out)).get("deselected", 0)
+    nodeids = list(nodeids)
+    if len(nodeids) < 2:
+        return None
+
+    durations = load_durations(repo_url, ref)
+    shards = balance(nodeids, durations, min(n, len(nodeids)))
+    shard_dir = os.path.join(backend.workspace_dir(), SHARD_DIR)
+    os.makedirs(shard_dir, exist_ok=True)
+    with open(os.path.join(shard_dir, "swe_shard_plugin.py"), "w", encoding="utf-8") as f:
+        f.write(PLUGIN)
+
+    def run_one(i: int, ids: List[str], resources: Any) -> Dict[str, Any]:
+        with open(os.path.join(shard_dir, f"shard_{i}.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(ids) + "\n")
+        # Narrow collection to the shard's files; the plugin then filters to its exact node IDs.
+        files = " ".join(shlex.quote(p) for p in sorted({t.split("::", 1)[0] for t in ids}))
+        shard_env = {
+            **env,
+            "SWE_SHARD_FILE": f"/workspace/{SHARD_DIR}/shard_{i}.txt",
+            "PYTHONPATH": f"/workspace/{SHARD_DIR}",
+        }
+        cmd = f"cd project && python -m pytest {pytest_args} -p swe_shard_plugin -p no:cacheprovider --durations=0 {files}"
+        b = copy.copy(backend)
+        b.resources = resources
+        t0 = time.time()
+        code, out, err = b.run(cmd, env=shard_env)
+        return {
+            "shard": i,
+            "tests": len(ids),
+            "code": code,
+            "sec": round(time.time() - t0, 3),
+            "tail": _last_nonempty(out) or _last_nonempty(err),
+            "durations": parse_durations(out),
+        }
+
+    t0 = time.time()
+    slices = _split_resources(getattr(backend, "resources", None), len(shards))
+    with ThreadPoolExecutor(max_workers=len(shards)) as pool:
+        results = list(pool.map(run_one, range(len(shards)), shards, slices))
+    wall = time.time() - t0
+
+    counts: Dict[str, int] = {}
+    measured: Dict[str, float] = {}
+    for r in results:
+        for k, v in parse_summary(r["tail"]).items():
+            if k != "deselected":  # every shard deselects the other shards' tests
+                counts[k] = counts.get(k, 0) + v
+        shard_durations = r.pop("durations")
+        if r["code"] in (0, 1):
+            # pytest hides durations under 5ms; tests that ran without a line were that fast.
+            measured.update({t: 0.0 for t in shards[r["shard"]]})
+        measured.update(shard_durations)
+    if deselected:
+        counts["deselected"] = deselected
+    save_durations(repo_url, ref, measured)
+    return {
+        "tail": merge_tail(counts, wall, len(shards)),
+        "code": max((r["code"] for r in results), default=0),
+        "nodeids": nodeids if collected else None,
+        "deselected": deselected,
+        "record": {
+            "n": len(shards),
+            "tests": len(nodeids),
+            "wall_sec": round(wall, 3),
+            "balanced_by": "durations" if durations else "count",
+            "collected_from": "pytest" if collected else "manifest",
+            "shards": results,
+        },
+    }
@@ -1,13 +1,15 @@
-import os, sys, shlex, subprocess
+import os, sys, shlex
+from exec_backend import get_backend
+from resource_sched import maybe_acquire, release
+from pytest_profile import profiling_enabled, prepare as profile_prepare, pytest_command as profile_command, sampler as profile_sampler, summarize as profile_summarize, format_summary
 
 DOCKER_IMAGE = os.environ.get("SWE_IMAGE", "swebench-lite:py3.10")
-WORKDIR = os.path.abspath("sandbox")
+BACKEND = get_backend(image=DOCKER_IMAGE)  # SWE_BACKEND=docker|podman|local
+WORKDIR = BACKEND.workspace_dir()
+ALLOCATION = None  # set in main() when SWE_SCHED is enabled
 
 def run(cmd: str):
-    os.makedirs(WORKDIR, exist_ok=True)
-    full = f"docker run --rm -v {WORKDIR}:/workspace -w /workspace {DOCKER_IMAGE} bash -lc {shlex.quote(cmd)}"
-    p = subprocess.run(full, shell=True, text=True, capture_output=True)
-    return p.returncode, p.stdout, p.stderr
+    return BACKEND.run(cmd)
 
 def tail(s: str) -> str:
     lines = [ln for ln in (s or "").splitlines() if ln.strip()]
@@ -23,10 +25,24 @@ def main():
     k_expr   = sys.argv[2] if len(sys.argv) >= 3 else ""
     kflag    = f'-k "{k_expr}"' if k_expr else ""
 
+    global ALLOCATION
+    ALLOCATION = maybe_acquire(repo_url)
+    BACKEND.resources = ALLOCATION
+    try:
+        validate(repo_url, kflag)
+    finally:
+        release(ALLOCATION)
+
+def validate(repo_url: str, kflag: str):
     code, out, err = run(f"rm -rf project && git clone --depth 1 {shlex.quote(repo_url)} project")
     if code != 0:
         print("CLONE FAILED"); print(tail(err) or err.strip()); raise SystemExit(1)
 
+    # SWE_PROFILE=1: profile the final pytest run (artifacts in <workspace>/.swe_profile).
+    pytest_run = f"python -m pytest -q {kflag}"
+    if profiling_enabled():
+        profile_dir, mode = profile_prepare(WORKDIR), profile_sampler()
+        pytest_run = "set +e\n" + profile_command(f"-q {kflag}", mode)
     combined = f"""
 set -e
 python -m pip install -q -U pip
@@ -39,11 +55,13 @@ subprocess.run("python -m pip install -q -e .[dev]", shell=True, check=False)
 PY
 if [ -f testing/requirements.txt ]; then python -m pip install -q -r testing/requirements.txt; fi
 python -m pip install -q -U pytest
-python -m pytest -q {kflag}
+{pytest_run}
 """
     code, out, err = run(combined)
     last = tail(out) or tail(err) or "(no output)"
     print(last)
+    if profiling_enabled():
+        print(format_summary(profile_summarize(profile_dir, out, repo_url, mode)))
     if code != 0:
         os.makedirs(WORKDIR, exist_ok=True)
         log_out = os.path.join(WORKDIR, "last_run_stdout.log")
@@ -0,0 +1,216 @@
+"""
+Host-local CPU/memory scheduler for concurrent episodes.
+
+Each episode asks for an allocation sized by its job class (heavy compiled repos
+such as pandas/numpy versus light pure-Python ones). The scheduler hands out
+disjoint CPU sets plus a memory cap from the host's capacity, and makes callers
+wait in FIFO order while the host is saturated. The allocation is turned into
+`docker run` flags so that concurrent runs neither fight over cores nor produce
+timings that depend on what else was running.
+
+State lives in a small JSON file guarded by an flock in SWE_SCHED_DIR (default:
+a host-local temp dir), so separate runner processes on the same host
+coordinate. Entries of dead processes are pruned automatically, so a crashed
+runner never leaks its CPUs.
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import fcntl
+import tempfile
+import contextlib
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+HEAVY_REPOS = {"pandas", "numpy", "scipy", "scikit-learn", "matplotlib", "astropy", "statsmodels", "xarray"}
+
+# cpus, memory (MB) per job class; override with e.g. SWE_SCHED_HEAVY="6,12288"
+DEFAULT_CLASSES: Dict[str, Tuple[int, int]] = {
+    "light": (2, 4096),
+    "heavy": (4, 8192),
+}
+
+
+def sched_enabled() -> bool:
+    return os.environ.get("SWE_SCHED", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _sched_dir() -> str:
+    return os.environ.get("SWE_SCHED_DIR", "").strip() or os.path.join(tempfile.gettempdir(), "swe_sched")
+
+
+def job_classes() -> Dict[str, Tuple[int, int]]:
+    out = dict(DEFAULT_CLASSES)
+    for name in list(out):
+        raw = os.environ.get(f"SWE_SCHED_{name.upper()}", "").strip()
+        if raw:
+            try:
+                cpus, mem = (int(x) for x in raw.split(","))
+                out[name] = (cpus, mem)
+            except ValueError:
+                pass
+    return out
+
+
+def classify(repo_url: str) -> str:
+    """Job class for a target repo: SWE_JOB_CLASS wins, else heavy for known compiled stacks."""
+    forced = os.environ.get("SWE_JOB_CLASS", "").strip()
+    if forced:
+        return forced
+    name = (repo_url or "").rstrip("/").rsplit("/", 1)[-1].lower()
+    if name.endswith(".git"):
+        name = name[:-4]
+    return "heavy" if name in HEAVY_REPOS else "light"
+
+
+def host_cpus() -> List[int]:
+    try:
+        cpus = sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = list(range(os.cpu_count() or 1))
+    reserve = int(os.environ.get("SWE_HOST_RESERVE_CPUS", "1"))
+    # Keep the first `reserve` CPUs for the host (agents, docker daemon) when we can afford it.
+    return cpus[reserve:] if len(cpus) > reserve else cpus
+
+
+def host_mem_mb() -> int:
+    total = 0
+    try:
+        with open("/proc/meminfo", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    total = int(line.split()[1]) // 1024
+                    break
+    except OSError:
+        pass
+    if not total:
+        try:
+            total = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)
+        except (ValueError, OSError, AttributeError):
+            total = 8192
+    reserve = int(os.environ.get("SWE_HOST_RESERVE_MEM_MB", "2048"))
+    return max(total - reserve, 1024)
+
+
+@dataclass
+class Allocation:
+    token: str
+    job_class: str
+    cpuset: List[int]
+    mem_mb: int
+    wait_sec: float = 0.0
+
+    def docker_flags(self) -> str:
+        cpus = ",".join(str(c) for c in self.cpuset)
+        return (
+            f"--cpuset-cpus={cpus} --cpus={len(self.cpuset)} "
+            f"--memory={self.mem_mb}m --memory-swap={self.mem_mb}m"
+        )
+
+    def as_record(self) -> Dict[str, Any]:
+        d = asdict(self)
+        d.pop("token", None)
+        d["wait_sec"] = round(self.wait_sec, 3)
+        return d
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+@contextlib.contextmanager
+def _locked_state() -> Iterator[Dict[str, Any]]:
+    d = _sched_dir()
+    os.makedirs(d, exist_ok=True)
+    path = os.path.join(d, "state.json")
+    with open(os.path.join(d, "lock"), "a+") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                state = {}
+            state.setdefault("allocs", {})
+            state.setdefault("waiting", [])
+            # Drop entries of processes that died without releasing.
+            state["allocs"] = {k: v for k, v in state["allocs"].items() if _pid_alive(int(v.get("pid", 0)))}
+            state["waiting"] = [w for w in state["waiting"] if _pid_alive(int(w.split(":")[0]))]
+            try:
+                yield state
+            finally:
+                tmp = path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(state, f)
+                os.replace(tmp, path)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _try_place(state: Dict[str, Any], want_cpus: int, want_mem: int) -> Optional[List[int]]:
+    cpus = host_cpus()
+    used = {c for a in state["allocs"].values() for c in a["cpuset"]}
+    used_mem = sum(int(a["mem_mb"]) for a in state["allocs"].values())
+    free = [c for c in cpus if c not in used]
+    if len(free) < want_cpus or used_mem + want_mem > host_mem_mb():
+        return None
+    # Prefer a contiguous run of CPUs (better cache/NUMA locality), else the lowest free ones.
+    for i in range(len(free) - want_cpus + 1):
+        run = free[i:i + want_cpus]
+        if run[-1] - run[0] == want_cpus - 1:
+            return run
+    return free[:want_cpus]
+
+
+def acquire(job_class: str, poll_sec: float = 2.0, timeout: Optional[float] = None) -> Allocation:
+    """Block until the host has room for a `job_class` episode, then reserve it."""
+    classes = job_classes()
+    want_cpus, want_mem = classes.get(job_class, classes["light"])
+    want_cpus = min(want_cpus, len(host_cpus()))
+    want_mem = min(want_mem, host_mem_mb())
+    token = f"{os.getpid()}:{time.time_ns()}"
+    t0 = time.time()
+    announced = False
+    while True:
+        with _locked_state() as state:
+            if token not in state["waiting"]:
+                state["waiting"].append(token)
+            # FIFO: only the oldest waiter may take resources.
+            cpuset = _try_place(state, want_cpus, want_mem) if state["waiting"][0] == token else None
+            if cpuset is not None:
+                state["waiting"].remove(token)
+                state["allocs"][token] = {"pid": os.getpid(), "cpuset": cpuset, "mem_mb": want_mem, "class": job_class}
+                return Allocation(token, job_class, cpuset, want_mem, time.time() - t0)
+            if timeout is not None and time.time() - t0 > timeout:
+                state["waiting"].remove(token)
+                raise TimeoutError(f"no capacity for a {job_class} job after {timeout:.0f}s")
+        if not announced:
+            print(f"[sched] host saturated; waiting for {want_cpus} cpu(s) / {want_mem}MB ({job_class})")
+            announced = True
+        time.sleep(poll_sec)
+
+
+def release(alloc: Optional[Allocation]) -> None:
+    if alloc is None:
+        return
+    with _locked_state() as state:
+        state["allocs"].pop(alloc.token, None)
+
+
+def maybe_acquire(repo_url: str) -> Optional[Allocation]:
+    """Acquire an allocation for `repo_url` when SWE_SCHED is enabled, else None."""
+    if not sched_enabled():
+        return None
+    alloc = acquire(classify(repo_url))
+    print(f"[sched] {alloc.job_class}: cpuset={alloc.cpuset} mem={alloc.mem_mb}MB (waited {alloc.wait_sec:.1f}s)")
+    return alloc
@@ -2,14 +2,11 @@
 # One-agent MVP for repo validation in Docker with robust termination and quick debugging.
 
 import os
-import re
 import json
 from datetime import datetime, timezone
-import shlex
 import time
 import asyncio
-import subprocess
-from typing import List, Optional, Tuple
+from typing import List, Optional
 
 from autogen_agentchat.agents import AssistantAgent
 from autogen_agentchat.teams import RoundRobinGroupChat
@@ -19,8 +16,13 @@ from autogen_agentchat.ui import Console
 from autogen_core.models import UserMessage
 from autogen_ext.models.openai import OpenAIChatCompletionClient
 from chutes_config import load_chutes_key, get_chutes_base_url
+from client_pool import make_pooled_client, served_by
 from swe_instance import load_instance, SWEInstance
 from swe_instance import load_instance, SWEInstance
+from resource_sched import Allocation, maybe_acquire, release
+from prompts import ONE_AGENT_PREFIX, one_agent_task, sorted_tools, track_cached_tokens, cache_record
+import swe_tools
+from swe_tools import BACKEND, PREFETCH, swe_clone, swe_install, swe_pytest, infer_status, start_prefetch, configure as configure_tools
 
 # ---------------- config ----------------
 CHUTES_API_KEY = load_chutes_key()
@@ -48,7 +50,6 @@ BASE_MODEL_INFO = {
     "family": "unknown",
 }
 
-DOCKER_IMAGE = os.environ.get("SWE_IMAGE", "swebench-lite:py3.10")
 MAX_TURNS = 4  # small cap—should finish in ~3 messages
 
 TARGET_REPO = os.environ.get("TARGET_REPO", "https://github.com/pytest-dev/pytest")
@@ -72,8 +73,9 @@ if INSTANCE_FILE:
 
 
 # ------------- model + preflight -------------
-def make_client(model_name: str) -> OpenAIChatCompletionClient:
-    return OpenAIChatCompletionClient(
+def make_client(model_name: str, **overrides) -> OpenAIChatCompletionClient:
+    # overrides: api_key/base_url/http_client/max_retries when built for a key pool slot
+    args = dict(
         model=model_name,
         api_key=CHUTES_API_KEY,
         base_url=CHUTES_BASE_URL,
@@ -81,6 +83,8 @@ def make_client(model_name: str) -> OpenAIChatCompletionClient:
         include_name_in_message=True,
         model_info=BASE_MODEL_INFO,
     )
+    args.update(overrides)
+    return OpenAIChatCompletionClient(**args)
 
 
 async def preflight(client: OpenAIChatCompletionClient) -> bool:
@@ -108,9 +112,10 @@ def _get_candidate_models() -> List[str]:
 
 
 def _instrument_client(client: OpenAIChatCompletionClient, model_name: str) -> OpenAIChatCompletionClient:
-    """Wrap create_stream to always request usage and accumulate totals on the client."""
-    totals = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    """Wrap create/create_stream to accumulate usage totals (and cached prompt tokens) on the client."""
+    totals = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "calls": 0}
 
+    orig_create = client.create
     orig_create_stream = client.create_stream
 
     def _merge_usage(u) -> None:
@@ -141,6 +146,7 @@ def _instrument_client(client: OpenAIChatCompletionClient, model_name: str) -> O
         extra["stream_options"] = stream_opts
         kwargs["extra_create_args"] = extra
         stream = orig_create_stream(*args, **kwargs)
+        totals["calls"] += 1
 
         async def gen():
             async for chunk in stream:
@@ -151,8 +157,19 @@ def _instrument_client(client: OpenAIChatCompletionClient, model_name: str) -> O
 
         return gen()
 
+    # AssistantAgent calls create() unless streaming is enabled
+    async def create_wrapper(*args, **kwargs):
+        result = await orig_create(*args, **kwargs)
+        totals["calls"] += 1
+        u = getattr(result, "usage", None)
+        if u:
+            _merge_usage(u)
+        return result
+
     # monkey-patch
+    client.create = create_wrapper  # type: ignore
     client.create_stream = create_stream_wrapper  # type: ignore
+    track_cached_tokens(client, totals)
     client._usage_totals = totals  # type: ignore
     client._selected_model_name = model_name  # type: ignore
     return client
@@ -160,7 +177,7 @@ def _instrument_client(client: OpenAIChatCompletionClient, model_name: str) -> O
 
 async def pick_ready_model() -> OpenAIChatCompletionClient:
     for m in _get_candidate_models():
-        c = make_client(m)
+        c = make_pooled_client(m, make_client)  # a key/endpoint pool when several are configured
         if await preflight(c):
             print(f"[preflight] Using model: {m}")
             return _instrument_client(c, m)
@@ -168,108 +185,63 @@ async def pick_ready_model() -> OpenAIChatCompletionClient:
     raise RuntimeError("No model available for now.")
 
 
-# ---------------- docker helpers ----------------
-def _docker(cmd: str) -> Tuple[int, str, str]:
-    workdir = os.path.abspath("sandbox")
-    os.makedirs(workdir, exist_ok=True)
-    full = f"docker run --rm -v {workdir}:/workspace -w /workspace {DOCKER_IMAGE} bash -lc {shlex.quote(cmd)}"
-    p = subprocess.run(full, shell=True, text=True, capture_output=True)
-    return p.returncode, p.stdout, p.stderr
-
-
-# ---- tools (async functions with type hints) ----
-async def swe_clone(*, repo_url: str, ref: Optional[str] = None) -> str:
-    cmds = [f"rm -rf project && git clone --depth 1 {shlex.quote(repo_url)} project"]
-    if ref:
-        r = shlex.quote(ref)
-        cmds.append(
-            "cd project && "
-            f"(git fetch --depth 1 origin {r} && git checkout -q {r}) "
-            f"|| (git fetch --depth 50 origin {r} && git checkout -q {r}) "
-            f"|| ((git fetch --unshallow origin || git fetch --unshallow || true) && git checkout -q {r})"
-        )
-    code, out, err = _docker(" && ".join(cmds))
-    return "(cloned)" if code == 0 else f"(exit {code})\nSTDOUT:\n{out}\nSTDERR:\n{err}"
+# ---------------- tools ----------------
+# clone / install / pytest and their episode state live in swe_tools.py, shared by all runners.
+configure_tools(TARGET_REPO, PYTEST_K)
 
+# Set by main() when SWE_SCHED is enabled; pins runs to a CPU set + memory cap.
+ALLOCATION: Optional[Allocation] = None
 
-async def swe_install(*, req_file: str = "requirements.txt") -> str:
-    cmd = (
-        f"cd project && "
-        f"if [ -f {shlex.quote(req_file)} ]; then python -m pip install -q -r {shlex.quote(req_file)}; "
-        f"else echo 'no requirements.txt'; fi"
-    )
-    code, out, err = _docker(cmd)
-    return (out or "ok").strip() if code == 0 else f"(exit {code})\nSTDOUT:\n{out}\nSTDERR:\n{err}"
-
-
-async def swe_pytest(*, pytest_args: str = "-q") -> str:
-    cmd = f"""
-cd project
-python - <<'PY'
-import sys, subprocess
-try:
-    import pytest  # noqa: F401
-except Exception:
-    subprocess.run('python -m pip install -q -U pytest', shell=True, check=False)
-PY
-python -m pytest {pytest_args}
-"""
-    code, out, err = _docker(cmd)
-    # Return ONLY the last non-empty line of stdout; fallback to stderr; else simple message
-    def last_nonempty(s: str) -> str:
-        lines = [ln for ln in (s or "").splitlines() if ln.strip()]
-        return lines[-1] if lines else ""
-
-    tail = last_nonempty(out) or last_nonempty(err) or ""
-    # record last tail for metrics (only if non-empty)
-    global LAST_PYTEST_TAIL
-    if tail:
-        LAST_PYTEST_TAIL = tail
-    return tail
 
 
 # ---------------- main ----------------
-async def main():
-    model = await pick_ready_model()
-
-    # One agent with the tools
-    runner = AssistantAgent("Runner", model_client=model, tools=[swe_clone, swe_install, swe_pytest])
-
-    # Robust termination: catch typical pytest tails (pass/fail/error/summary variants)
-    term = (
-        TextMentionTermination(" passed in ")
-        | TextMentionTermination(" passed")
-        | TextMentionTermination(" failed")
-        | TextMentionTermination(" error")
-        | TextMentionTermination(" deselected")
-        | TextMentionTermination(" skipped")
-        | TextMentionTermination(" short test summary ")
-        | TextMentionTermination(" no tests ran")
-        | MaxMessageTermination(MAX_TURNS)
-    )
-    team = RoundRobinGroupChat([runner], termination_condition=term)
-
-    # Build pytest args w/ clean quoting
-    kflag = f'-k "{PYTEST_K}"' if PYTEST_K else ""
-    pytest_args = f"-q {kflag}".strip()
-
-    inst_hint = f"Instance: {INSTANCE.id}\n" if INSTANCE else ""
-    task = f"""{inst_hint}Validate a Python repo in Docker. Execute EXACTLY these three tool calls, then STOP.
-Do NOT print tool call syntax, XML/angle-bracket markup, or explanations. Paste only tool returns when prompted.
-
-1) swe_clone(repo_url="{TARGET_REPO}", ref="{TARGET_REF}")
-2) swe_install()
-3) swe_pytest(pytest_args="{pytest_args}")
-
-CRITICAL OUTPUT RULE:
-After step 3, print ONLY the exact string returned by swe_pytest (the last non-empty pytest stdout line). No extra words.
-"""
-
-    t0 = time.time()
-    started = datetime.now(timezone.utc).isoformat()
-    res = await Console(team.run_stream(task=task))
-    elapsed = time.time() - t0
-    ended = datetime.now(timezone.utc).isoformat()
+async def main(model: Optional[OpenAIChatCompletionClient] = None):
+    global ALLOCATION
+    try:
+        # A pre-built client (e.g. a scripted model in bench_harness.py) skips preflight.
+        if model is None:
+            model = await pick_ready_model()
+
+        # Only once a model is ready: a failed preflight should not hold a slot or pull the repo.
+        ALLOCATION = maybe_acquire(TARGET_REPO)
+        BACKEND.resources = ALLOCATION
+        # SWE_PREFETCH=1: clone and install start now, overlapping the first turns.
+        start_prefetch(TARGET_REPO, TARGET_REF)
+
+        # One agent with the tools
+        # Tools in name order so their schemas serialize identically across runs (prefix caching).
+        runner = AssistantAgent("Runner", model_client=model, tools=sorted_tools([swe_clone, swe_install, swe_pytest]))
+
+        # Robust termination: catch typical pytest tails (pass/fail/error/summary variants)
+        term = (
+            TextMentionTermination(" passed in ")
+            | TextMentionTermination(" passed")
+            | TextMentionTermination(" failed")
+            | TextMentionTermination(" error")
+            | TextMentionTermination(" deselected")
+            | TextMentionTermination(" skipped")
+            | TextMentionTermination(" short test summary ")
+            | TextMentionTermination(" no tests ran")
+            | MaxMessageTermination(MAX_TURNS)
+        )
+        team = RoundRobinGroupChat([runner], termination_condition=term)
+
+        # Build pytest args w/ clean quoting
+        kflag = f'-k "{PYTEST_K}"' if PYTEST_K else ""
+        pytest_args = f"-q {kflag}".strip()
+
+        # Shared instructions first, per-run values last, so providers can reuse the prefix cache.
+        task = one_agent_task(INSTANCE.id if INSTANCE else None, TARGET_REPO, TARGET_REF, pytest_args)
+
+        t0 = time.time()
+        started = datetime.now(timezone.utc).isoformat()
+        res = await Console(team.run_stream(task=task))
+        elapsed = time.time() - t0
+        ended = datetime.now(timezone.utc).isoformat()
+    finally:
+        # Also on errors, Ctrl-C or a failed preflight: never leak the slot or the prefetch thread.
+        PREFETCH.close()
+        release(ALLOCATION)
     print(f"\n--- SUMMARY ---\nElapsed seconds: {elapsed:.2f}")
     try:
         print(f"Messages: {len(res.messages)}")
@@ -277,17 +249,6 @@ After step 3, print ONLY the exact string returned by swe_pytest (the last non-e
         pass
 
     # ---- metrics recording ----
-    def infer_status(tail: str) -> str:
-        s = (tail or "").lower()
-        if not s:
-            return "unknown"
-        # success if has 'passed' count and not 'failed'/'error'
-        if re.search(r"\b\d+\s+passed\b", s) and not ("failed" in s or "error" in s or "errors" in s):
-            return "pass"
-        if "failed" in s or "error" in s or "errors" in s:
-            return "fail"
-        return "unknown"
-
     try:
         msg_count = len(res.messages)
     except Exception:
@@ -302,17 +263,24 @@ After step 3, print ONLY the exact string returned by swe_pytest (the last non-e
         "ref": TARGET_REF,
         "pytest_k": PYTEST_K,
         "model": model_name,
+        "job_id": os.environ.get("SWE_JOB_ID") or None,
+        "api_keys": served_by(model, CHUTES_API_KEY),
         "start_ts": started,
         "end_ts": ended,
         "elapsed_sec": round(elapsed, 3),
         "messages": msg_count,
-        "final_pytest_tail": globals().get("LAST_PYTEST_TAIL", None),
-        "status": infer_status(globals().get("LAST_PYTEST_TAIL", "") or ""),
+        "resources": ALLOCATION.as_record() if ALLOCATION else None,
+        **swe_tools.record(),
+        "llm_calls": usage.get("calls") if isinstance(usage, dict) else None,
+        "prompt_cache": cache_record(usage, ONE_AGENT_PREFIX) if isinstance(usage, dict) else None,
+        "final_pytest_tail": swe_tools.LAST_PYTEST_TAIL,
+        "status": infer_status(swe_tools.LAST_PYTEST_TAIL or ""),
         "tokens": (
             {
                 "prompt": usage.get("prompt_tokens", 0),
                 "completion": usage.get("completion_tokens", 0),
                 "total": usage.get("total_tokens", 0),
+                "cached": usage.get("cached_tokens", 0),
             }
             if isinstance(usage, dict)
             else None
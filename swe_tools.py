@@ -0,0 +1,255 @@
+"""
+Workspace tools shared by the runners (run_oneagent.py, team_swebench_mvp.py).
+
+`swe_clone`, `swe_install` and `swe_pytest` are the async tools the agents
+call; they run through the execution backend (exec_backend.py) and leave
+their episode state here, for results.jsonl:
+
+- LAST_CLONE:      (repo_url, ref) of the current checkout
+- SNAPSHOT:        workspace snapshot metadata when the checkout was restored (SWE_SNAPSHOT)
+- LAST_CLONE_INFO: what a partial/sparse clone fetched (SWE_CLONE_MODE)
+- LAST_SHARDS:     per-shard stats of the last sharded swe_pytest (SWE_PYTEST_SHARDS)
+- LAST_PROFILE:    profile summary of the last swe_pytest (SWE_PROFILE)
+- LAST_MANIFEST:   manifest hit/miss of the last swe_pytest (SWE_COLLECT_CACHE)
+- LAST_PYTEST_TAIL: last non-empty pytest tail
+- PREFETCH:        background clone + install of the episode (SWE_PREFETCH)
+
+State is rebound by the tools, so read it as `swe_tools.SNAPSHOT`, never through
+`from swe_tools import SNAPSHOT`. Runners call `configure()` once they know the
+episode's target (it may come from SWE_INSTANCE_FILE), and `record()` gives
+the results.jsonl fields for the state above.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import shlex
+from typing import Any, Dict, Optional, Tuple
+
+from exec_backend import get_backend
+from build_cache import build_cache_enabled, prepare as build_cache_prepare, cache_env as build_cache_env, install_command
+from build_cache import pin_repo as build_cache_pin, record_repo as build_cache_record
+from prefetch import Prefetcher, prefetch_enabled
+from pytest_shards import run_sharded, shards_requested
+from pytest_manifest import manifest_enabled, lookup as manifest_lookup, command as manifest_command, finish as manifest_finish, save as manifest_save, stale as manifest_stale
+from pytest_profile import profiling_enabled, prepare as profile_prepare, pytest_command as profile_command, sampler as profile_sampler, summarize as profile_summarize
+from clone_modes import clone_mode, clone as mode_clone
+from workspace_snap import snapshots_enabled, backend_env, restore as snapshot_restore, capture as snapshot_capture, unmount as snapshot_unmount
+
+DOCKER_IMAGE = os.environ.get("SWE_IMAGE", "swebench-lite:py3.10")
+
+# SWE_BACKEND=docker (default) | podman | local; see exec_backend.py
+BACKEND = get_backend(image=DOCKER_IMAGE)
+
+# Installs go to the project's own user site so they survive `docker run --rm`
+# between tool calls and are captured by workspace snapshots.
+WORKSPACE_ENV = {"PIP_USER": "1", "PYTHONUSERBASE": "/workspace/project/.swe_user"}
+
+# The episode's target, set by configure(): the fallback repo for build caches and
+# profiles, and the -k expression a sparse clone narrows its tests to.
+TARGET_REPO = ""
+PYTEST_K = ""
+
+LAST_CLONE: Optional[Tuple[str, Optional[str]]] = None
+SNAPSHOT: Optional[dict] = None
+LAST_CLONE_INFO: Optional[dict] = None
+LAST_SHARDS: Optional[dict] = None
+LAST_PROFILE: Optional[dict] = None
+LAST_MANIFEST: Optional[dict] = None
+LAST_PYTEST_TAIL: Optional[str] = None
+PREFETCH = Prefetcher()
+
+
+def configure(target_repo: str, pytest_k: str) -> None:
+    global TARGET_REPO, PYTEST_K
+    TARGET_REPO, PYTEST_K = target_repo, pytest_k
+
+
+def _workspace() -> str:
+    return BACKEND.workspace_dir()
+
+
+def _exec(cmd: str) -> Tuple[int, str, str]:
+    return BACKEND.run(cmd, env=WORKSPACE_ENV)
+
+
+# ---------------- output helpers ----------------
+def last_nonempty(s: str) -> str:
+    lines = [ln for ln in (s or "").splitlines() if ln.strip()]
+    return lines[-1] if lines else ""
+
+
+def infer_status(tail: str) -> str:
+    s = (tail or "").lower()
+    if not s:
+        return "unknown"
+    # success if has 'passed' count and not 'failed'/'error'
+    if re.search(r"\b\d+\s+passed\b", s) and not ("failed" in s or "error" in s or "errors" in s):
+        return "pass"
+    if "failed" in s or "error" in s or "errors" in s:
+        return "fail"
+    return "unknown"
+
+
+# ---------------- tools ----------------
+async def swe_clone(*, repo_url: str, ref: Optional[str] = None) -> str:
+    # SWE_PREFETCH=1: reuse the background clone started at episode begin when the arguments match.
+    prefetched = await PREFETCH.claim("swe_clone", repo_url=repo_url, ref=ref)
+    return prefetched if prefetched is not None else await _swe_clone(repo_url=repo_url, ref=ref)
+
+
+async def swe_install(*, req_file: str = "requirements.txt") -> str:
+    prefetched = await PREFETCH.claim("swe_install", req_file=req_file)
+    return prefetched if prefetched is not None else await _swe_install(req_file=req_file)
+
+
+async def _swe_clone(*, repo_url: str, ref: Optional[str] = None) -> str:
+    global LAST_CLONE, SNAPSHOT, LAST_CLONE_INFO
+    LAST_CLONE, SNAPSHOT, LAST_CLONE_INFO = None, None, None
+    dest = os.path.join(_workspace(), "project")
+    if snapshots_enabled(BACKEND):
+        SNAPSHOT = snapshot_restore(repo_url, ref, dest, remove=lambda: _exec("rm -rf project"), env=backend_env(BACKEND))
+        if SNAPSHOT is not None:
+            LAST_CLONE = (repo_url, ref)
+            return "(cloned)"
+    snapshot_unmount(dest)  # an overlay from an earlier restore would block `rm -rf project`
+
+    if clone_mode() != "full":
+        # Blob-less partial clone, optionally sparse-checked-out to source, build files and tests.
+        code, out, err, LAST_CLONE_INFO = mode_clone(_exec, _workspace(), repo_url, ref, PYTEST_K)
+    else:
+        cmds = [
+            f"rm -rf project && git clone --depth 1 {shlex.quote(repo_url)} project",
+            "echo .swe_user/ >> project/.git/info/exclude",
+        ]
+        if ref:
+            r = shlex.quote(ref)
+            cmds.append(
+                "cd project && "
+                f"(git fetch --depth 1 origin {r} && git checkout -q {r}) "
+                f"|| (git fetch --depth 50 origin {r} && git checkout -q {r}) "
+                f"|| ((git fetch --unshallow origin || git fetch --unshallow || true) && git checkout -q {r})"
+            )
+        code, out, err = _exec(" && ".join(cmds))
+    if code == 0:
+        LAST_CLONE = (repo_url, ref)
+    return "(cloned)" if code == 0 else f"(exit {code})\nSTDOUT:\n{out}\nSTDERR:\n{err}"
+
+
+async def _swe_install(*, req_file: str = "requirements.txt") -> str:
+    # A restored snapshot is already installed; replay its recorded output.
+    if SNAPSHOT is not None and SNAPSHOT.get("install", {}).get("req_file") == req_file:
+        return SNAPSHOT["install"]["output"]
+    if build_cache_enabled():
+        # Compiled projects: editable install through ccache/Cython caches on a host mount.
+        # The env stays set so editable rebuilds triggered by later pytest runs hit it too.
+        BACKEND.mounts.update(build_cache_prepare())
+        repo = LAST_CLONE[0] if LAST_CLONE else TARGET_REPO
+        WORKSPACE_ENV.update(build_cache_env(repo))
+        build_cache_pin(repo)
+        cmd = install_command(req_file)
+    else:
+        cmd = (
+            f"cd project && "
+            f"if [ -f {shlex.quote(req_file)} ]; then python -m pip install -q -r {shlex.quote(req_file)}; "
+            f"else echo 'no requirements.txt'; fi"
+        )
+    code, out, err = _exec(cmd)
+    if build_cache_enabled():
+        build_cache_record(repo)
+    if code != 0:
+        return f"(exit {code})\nSTDOUT:\n{out}\nSTDERR:\n{err}"
+    result = (out or "ok").strip()
+    # A sparse checkout is not the full tree other episodes expect from a snapshot.
+    if snapshots_enabled(BACKEND) and LAST_CLONE and SNAPSHOT is None and clone_mode() != "sparse":
+        project = os.path.join(_workspace(), "project")
+        snapshot_capture(LAST_CLONE[0], LAST_CLONE[1], project, {"req_file": req_file, "output": result}, env=backend_env(BACKEND))
+    return result
+
+
+async def swe_pytest(*, pytest_args: str = "-q") -> str:
+    global LAST_PYTEST_TAIL, LAST_SHARDS, LAST_PROFILE, LAST_MANIFEST
+    # Never prefetched; this only waits out a prefetch step still in flight.
+    await PREFETCH.claim("swe_pytest", pytest_args=pytest_args)
+    # SWE_COLLECT_CACHE=1: a run with the same arguments before selected these node IDs;
+    # pytest then only collects the files that hold them.
+    manifest = None
+    if manifest_enabled() and LAST_CLONE and not profiling_enabled():
+        manifest = manifest_lookup(BACKEND.workspace_dir(), pytest_args, LAST_CLONE[0], LAST_CLONE[1], BACKEND.image)
+        LAST_MANIFEST = manifest.record() if manifest is not None else None
+    # SWE_PYTEST_SHARDS=N: split the selected tests across N parallel containers.
+    # A profiled run stays in one process, so its phases and samples are whole.
+    if shards_requested() > 1 and LAST_CLONE and not profiling_enabled():
+        sharded = run_sharded(
+            BACKEND, WORKSPACE_ENV, pytest_args, LAST_CLONE[0], LAST_CLONE[1],
+            nodeids=manifest.nodeids if manifest else None, deselected=manifest.deselected if manifest else 0,
+        )
+        if sharded is not None and manifest is not None:
+            if manifest_stale(manifest, [s["code"] for s in sharded["record"]["shards"]]):
+                # A shard found a file gone or without its tests: collect the whole suite again.
+                return await swe_pytest(pytest_args=pytest_args)
+            if sharded["nodeids"]:
+                manifest_save(manifest, sharded["nodeids"], sharded["deselected"])
+        if sharded is not None:
+            LAST_SHARDS = sharded["record"]
+            LAST_PYTEST_TAIL = sharded["tail"]
+            return sharded["tail"]
+    # SWE_PROFILE=1: importtime, phase timings, slowest tests and an optional sampler profile.
+    run, env = f"python -m pytest {pytest_args}", WORKSPACE_ENV
+    if manifest is not None:
+        run, extra_env = manifest_command(manifest, pytest_args, BACKEND.workspace_dir())
+        env = {**WORKSPACE_ENV, **extra_env}
+    if profiling_enabled():
+        profile_dir, mode = profile_prepare(BACKEND.workspace_dir()), profile_sampler()
+        run = profile_command(pytest_args, mode)
+    cmd = f"""
+cd project
+python - <<'PY'
+import subprocess
+try:
+    import pytest  # noqa: F401
+except Exception:
+    subprocess.run('python -m pip install -q -U pytest', shell=True, check=False)
+PY
+{run}
+"""
+    code, out, err = BACKEND.run(cmd, env=env)
+    if manifest is not None and manifest_finish(manifest, code, BACKEND.workspace_dir()):
+        # The cached files no longer hold the selection: collect the whole suite again.
+        return await swe_pytest(pytest_args=pytest_args)
+    if profiling_enabled():
+        LAST_PROFILE = profile_summarize(profile_dir, out, LAST_CLONE[0] if LAST_CLONE else TARGET_REPO, mode)
+    # Return ONLY the last non-empty line of stdout; fallback to stderr
+    tail = last_nonempty(out) or last_nonempty(err) or ""
+    # record tail for metrics only if non-empty
+    if tail:
+        LAST_PYTEST_TAIL = tail
+    # Always return something the model can act on (success or not)
+    return tail if tail else "no tests ran"
+
+
+# ---------------- episode ----------------
+def start_prefetch(repo_url: str, ref: Optional[str]) -> None:
+    """SWE_PREFETCH=1: clone and install need no model, so start them before its first turn."""
+    if prefetch_enabled():
+        PREFETCH.start([
+            ("swe_clone", {"repo_url": repo_url, "ref": ref or None}, _swe_clone),
+            ("swe_install", {"req_file": "requirements.txt"}, _swe_install),
+        ])
+
+
+def record() -> Dict[str, Any]:
+    """The results.jsonl fields for the tools' episode state."""
+    return {
+        "snapshot": (
+            {"method": SNAPSHOT.get("restore_method"), "restore_sec": SNAPSHOT.get("restore_sec")}
+            if SNAPSHOT
+            else None
+        ),
+        "shards": LAST_SHARDS,
+        "profile": LAST_PROFILE,
+        "prefetch": PREFETCH.record(),
+        "clone": LAST_CLONE_INFO,
+        "manifest": LAST_MANIFEST,
+    }
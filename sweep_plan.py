@@ -0,0 +1,347 @@
+"""
+Token-budget-aware sweep planning for eval_run.py.
+
+Before a sweep, every (agent, instance, model) job gets a forecast of its tokens
+and wall time, taken from the first source that has data:
+
+1. history:   mean of earlier runs of the same (agent, instance, model) in results.jsonl
+2. model:     the model's mean over other instances, scaled by how this instance
+              compares to others across models (when it has any history)
+3. instance:  the instance's mean over other models
+4. estimate:  the task prompt counted with tiktoken, grown over a typical number
+              of LLM calls (the conversation is re-sent on every call)
+
+Jobs are then ordered cheapest first, so with a fixed quota cheap and fast
+models finish and the expensive ones are what gets left out. Two limits apply
+while the sweep runs:
+
+- SWE_SWEEP_TOKEN_BUDGET: total tokens for the sweep. A job whose forecast no
+  longer fits (actual spend so far + forecasts of running jobs) is deferred
+  instead of started.
+- SWE_SWEEP_TPM: tokens per minute. A job starts only when the tokens spent in
+  the last minute, plus the forecast rate of running jobs, plus its own rate,
+  stay under the limit; otherwise the launcher waits.
+
+Queue mode stores the forecasts with the jobs, so the limits hold across all
+workers of a shared queue. There the budget applies per sweep (one `enqueue`),
+so an exhausted earlier sweep never defers a later one in the same queue file.
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import statistics
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from eval_summary import read_results
+from prompts import one_agent_task, team_task
+from swe_instance import load_instance
+
+WINDOW_SEC = 60.0
+DEFAULT_SEC = 180.0
+# Typical shape of an episode when there is no history at all.
+DEFAULT_CALLS = {"one": 4, "team": 12}
+TOOL_SCHEMA_TOKENS = 350  # three tool schemas sent with every call
+TURN_TOKENS = 150  # conversation growth per call (tool call + tool output)
+COMPLETION_TOKENS = 120
+
+_encoding: Any = None
+
+
+def count_tokens(text: str) -> int:
+    """tiktoken count (cl100k_base); about 4 characters per token without tiktoken."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    if _encoding is False:
+        return max(1, len(text) // 4)
+    return len(_encoding.encode(text))
+
+
+def _env_float(name: str) -> Optional[float]:
+    s = os.environ.get(name, "").strip()
+    try:
+        v = float(s) if s else 0.0
+    except ValueError:
+        return None
+    return v if v > 0 else None
+
+
+def token_budget() -> Optional[float]:
+    return _env_float("SWE_SWEEP_TOKEN_BUDGET")
+
+
+def tokens_per_minute() -> Optional[float]:
+    return _env_float("SWE_SWEEP_TPM")
+
+
+def agent_of(r: Dict[str, Any]) -> str:
+    return "one" if str(r.get("team", "one-agent")) == "one-agent" else "team"
+
+
+def record_tokens(r: Dict[str, Any]) -> Optional[int]:
+    t = r.get("tokens")
+    if isinstance(t, dict) and t.get("total"):
+        return int(t["total"])
+    return None
+
+
+# ---------------- forecasting ----------------
+@dataclass
+class Forecast:
+    agent: str
+    instance_file: str
+    instance_id: str
+    model: Optional[str]
+    tokens: float
+    sec: float
+    source: str
+    runs: int = 0
+
+    def rate(self) -> float:
+        """Forecast tokens per minute while the job runs."""
+        return self.tokens / max(1.0, self.sec / 60.0)
+
+
+class History:
+    """Per-(agent, instance, model) token and elapsed samples from results.jsonl."""
+
+    def __init__(self, rows: Iterable[Dict[str, Any]]):
+        self.samples: Dict[Tuple[str, str, str], List[Tuple[int, float]]] = {}
+        for r in rows:
+            tokens = record_tokens(r)
+            if tokens is None or not r.get("instance_id") or not r.get("model"):
+                continue
+            sec = r.get("elapsed_sec")
+            key = (agent_of(r), str(r["instance_id"]), str(r["model"]))
+            self.samples.setdefault(key, []).append((tokens, float(sec) if isinstance(sec, (int, float)) else DEFAULT_SEC))
+
+    def _means(self, pred) -> Optional[Tuple[float, float, int]]:
+        pts = [p for k, v in self.samples.items() if pred(k) for p in v]
+        if not pts:
+            return None
+        return statistics.mean(p[0] for p in pts), statistics.mean(p[1] for p in pts), len(pts)
+
+    def forecast(self, agent: str, instance_id: str, model: Optional[str]) -> Optional[Tuple[float, float, str, int]]:
+        if model:
+            exact = self._means(lambda k: k == (agent, instance_id, model))
+            if exact:
+                return (*exact[:2], "history", exact[2])
+            by_model = self._means(lambda k: k[0] == agent and k[2] == model)
+            if by_model:
+                # Scale by this instance relative to all instances, measured across models.
+                inst = self._means(lambda k: k[0] == agent and k[1] == instance_id)
+                overall = self._means(lambda k: k[0] == agent)
+                tf = sf = 1.0
+                if inst and overall:
+                    tf, sf = inst[0] / overall[0], inst[1] / overall[1]
+                return by_model[0] * tf, by_model[1] * sf, "model", by_model[2]
+        by_inst = self._means(lambda k: k[0] == agent and k[1] == instance_id)
+        if by_inst:
+            return (*by_inst[:2], "instance", by_inst[2])
+        return None
+
+
+def prompt_estimate(agent: str, instance_file: str) -> Tuple[float, float]:
+    """Tokens for a typical episode from the task prompt alone."""
+    inst = load_instance(instance_file)
+    args = f'-q -k "{inst.pytest_k}"' if inst.pytest_k else "-q"
+    task = (one_agent_task if agent == "one" else team_task)(inst.id, inst.repo_url, inst.ref, args)
+    base = count_tokens(task) + TOOL_SCHEMA_TOKENS
+    calls = DEFAULT_CALLS.get(agent, 4)
+    prompt = sum(base + i * TURN_TOKENS for i in range(calls))
+    return float(prompt + calls * COMPLETION_TOKENS), DEFAULT_SEC
+
+
+def forecast_jobs(
+    jobs: Sequence[Tuple[str, str, Optional[str]]],
+    results_path: str,
+) -> List[Forecast]:
+    """Forecasts for (agent, instance_file, model) jobs, in the given order.
+
+    Prompt-only estimates are calibrated by how real runs of the same instances
+    compared to their own prompt estimates, when any history exists.
+    """
+    history = History(read_results(results_path))
+    out: List[Forecast] = []
+    ratios: Dict[str, List[float]] = {}
+    for agent, inst_file, model in jobs:
+        inst_id = load_instance(inst_file).id
+        hit = history.forecast(agent, inst_id, model)
+        if hit:
+            tokens, sec, source, runs = hit
+        else:
+            (tokens, sec), source, runs = prompt_estimate(agent, inst_file), "estimate", 0
+        out.append(Forecast(agent, inst_file, inst_id, model, tokens, sec, source, runs))
+    for f in out:
+        if f.source != "estimate":
+            observed = history.forecast(f.agent, f.instance_id, None)
+            if observed:
+                ratios.setdefault(f.agent, []).append(observed[0] / prompt_estimate(f.agent, f.instance_file)[0])
+    for f in out:
+        if f.source == "estimate" and ratios.get(f.agent):
+            f.tokens *= statistics.mean(ratios[f.agent])
+    return out
+
+
+def cheap_first(forecasts: List[Forecast]) -> List[Forecast]:
+    """Order by model cost (mean forecast tokens per job), then by job tokens.
+
+    Whole models are kept together, so a tight budget defers the expensive
+    models rather than a few instances of every model.
+    """
+    per_model: Dict[Optional[str], List[float]] = {}
+    for f in forecasts:
+        per_model.setdefault(f.model, []).append(f.tokens)
+    cost = {m: statistics.mean(v) for m, v in per_model.items()}
+    return sorted(forecasts, key=lambda f: (cost[f.model], f.model or "", f.tokens))
+
+
+def fits_budget(forecasts: List[Forecast], budget: Optional[float]) -> Tuple[List[Forecast], List[Forecast]]:
+    """Split into (planned, deferred) by cumulative forecast tokens."""
+    if not budget:
+        return list(forecasts), []
+    planned, deferred, total = [], [], 0.0
+    for f in forecasts:
+        if total + f.tokens <= budget:
+            planned.append(f)
+            total += f.tokens
+        else:
+            deferred.append(f)
+    return planned, deferred
+
+
+def plan_wall_sec(forecasts: List[Forecast], tpm: Optional[float], workers: int = 1) -> float:
+    """Wall time: job time spread over workers, but never faster than the TPM limit allows."""
+    wall = sum(f.sec for f in forecasts) / max(1, workers)
+    if tpm:
+        wall = max(wall, sum(f.tokens for f in forecasts) / tpm * 60.0)
+    return wall
+
+
+def plan_table(planned: List[Forecast], deferred: List[Forecast], budget: Optional[float], tpm: Optional[float]) -> str:
+    header = ["#", "agent", "model", "instance_id", "est_tokens", "est_sec", "source", "runs", "plan"]
+    out = ["\t".join(header)]
+    for i, f in enumerate(planned + deferred, 1):
+        out.append("\t".join([
+            str(i), f.agent, f.model or "(auto)", f.instance_id, f"{f.tokens:.0f}", f"{f.sec:.0f}",
+            f.source, str(f.runs), "run" if i <= len(planned) else "defer",
+        ]))
+    total = sum(f.tokens for f in planned)
+    out.append("")
+    out.append(
+        f"planned: {len(planned)} job(s), ~{total:.0f} tokens, ~{plan_wall_sec(planned, tpm) / 60:.1f} min sequential"
+        + (f"; budget {budget:.0f}" if budget else "")
+        + (f"; tpm {tpm:.0f}" if tpm else "")
+    )
+    if deferred:
+        out.append(f"deferred: {len(deferred)} job(s), ~{sum(f.tokens for f in deferred):.0f} tokens over budget")
+    return "\n".join(out)
+
+
+# ---------------- admission during the sweep ----------------
+def window_tokens(spans: Iterable[Tuple[float, float, float]], now: float, window: float = WINDOW_SEC) -> float:
+    """Tokens of finished jobs that fall into the last `window` seconds.
+
+    A job's tokens are spread evenly over its (start, end) span, since they are
+    only reported once it ends.
+    """
+    lo = now - window
+    total = 0.0
+    for start, end, tokens in spans:
+        if end <= lo:
+            continue
+        if end <= start:
+            total += tokens
+            continue
+        total += tokens * (min(end, now) - max(start, lo)) / (end - start)
+    return total
+
+
+def admit(
+    job: Forecast,
+    spent: float,
+    spans: Iterable[Tuple[float, float, float]],
+    running: Sequence[Forecast],
+    budget: Optional[float],
+    tpm: Optional[float],
+    now: Optional[float] = None,
+) -> str:
+    """"run", "wait" (TPM limit; retry later) or "defer" (no longer fits the budget)."""
+    if budget and spent + sum(r.tokens for r in running) + job.tokens > budget:
+        return "defer"
+    if tpm:
+        busy = window_tokens(spans, now or time.time()) + sum(r.rate() for r in running)
+        # With nothing else in flight, waiting cannot help: run even a job faster than the limit.
+        if busy > 0 and busy + job.rate() > tpm:
+            return "wait"
+    return "run"
+
+
+def queue_admission(budget: Optional[float], tpm: Optional[float]):
+    """`admit` callback for WorkQueue.lease over the jobs of a shared queue.
+
+    The token budget covers the job's own sweep (the jobs of one enqueue); the
+    TPM limit covers every job in the queue, since they share the provider.
+    """
+
+    def check(row: Dict[str, Any], rows: List[Dict[str, Any]]) -> str:
+        spent, spans, running, sweep_running = 0.0, [], [], []
+        for r in rows:
+            same_sweep = r.get("sweep") == row.get("sweep")
+            if r["status"] == "leased":
+                running.append(_row_forecast(r))
+                if same_sweep:
+                    sweep_running.append(running[-1])
+            elif r["status"] in ("done", "failed") and r.get("result"):
+                try:
+                    records = json.loads(r["result"]).get("records") or []
+                except (ValueError, AttributeError):
+                    records = []
+                for rec in records:
+                    if same_sweep:
+                        spent += record_tokens(rec) or 0
+                    span = record_span(rec)
+                    if span:
+                        spans.append(span)
+        job = _row_forecast(row)
+        if admit(job, spent, [], sweep_running, budget, None) == "defer":
+            return "defer"
+        return admit(job, 0.0, spans, running, None, tpm)
+
+    return check
+
+
+def _epoch(ts: Any) -> Optional[float]:
+    """Record timestamps are ISO-8601 strings (older records may hold epoch seconds)."""
+    if isinstance(ts, (int, float)):
+        return float(ts)
+    try:
+        return datetime.fromisoformat(str(ts)).timestamp()
+    except ValueError:
+        return None
+
+
+def record_span(rec: Dict[str, Any]) -> Optional[Tuple[float, float, float]]:
+    """(start, end, tokens) of a results record, for `window_tokens`."""
+    start, end = _epoch(rec.get("start_ts")), _epoch(rec.get("end_ts"))
+    if start is None or end is None:
+        return None
+    return start, end, float(record_tokens(rec) or 0)
+
+
+def _row_forecast(r: Dict[str, Any]) -> Forecast:
+    return Forecast(
+        agent=r["agent"], instance_file=r["instance_file"], instance_id=os.path.basename(r["instance_file"]),
+        model=r["model"], tokens=float(r.get("est_tokens") or 0), sec=float(r.get("est_sec") or DEFAULT_SEC),
+        source="queue",
+    )
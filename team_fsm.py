@@ -0,0 +1,124 @@
+"""
+Tool-outcome driven speaker selection for the Planner/Coder/Tester team.
+
+RoundRobinGroupChat spends one LLM call per agent per cycle, even when that
+agent has nothing new to look at: the Planner re-plans a task that already
+lists its steps, and the Tester reruns swe_pytest right after the Coder did.
+With TEAM_MODE=selector, team_swebench_mvp.py uses SelectorGroupChat with
+`OutcomeRouter.select` as its selector_func instead. The next speaker follows
+from the last tool outcomes, and no LLM call is spent on the selection itself:
+
+- start / Planner spoke        -> Coder
+- clone or install failed      -> Coder retries (up to `retries`), then Planner
+- tests failed                 -> Planner, if it has not seen this result yet; else Coder
+- set up, no test run yet      -> Tester (only when the Coder stopped without running pytest)
+- tests passed                 -> the team's termination condition stops the run
+
+`round_robin_turns` replays the same productive turns on a round-robin schedule,
+so a run can record how many agent turns (and LLM calls) the selector saved.
+"""
+
+from __future__ import annotations
+
+from typing import Callable, Dict, List, Optional, Sequence
+
+from autogen_agentchat.messages import BaseChatMessage, ToolCallExecutionEvent
+
+
+def speaker_turns(messages: Sequence[object]) -> List[str]:
+    """Agent names in speaking order; each turn ends with exactly one chat message."""
+    return [m.source for m in messages if isinstance(m, BaseChatMessage) and m.source != "user"]
+
+
+def round_robin_turns(turns: Sequence[str], order: Sequence[str]) -> int:
+    """Turns a round-robin over `order` needs to produce `turns` in sequence.
+
+    Every agent skipped while waiting for the next productive speaker costs one
+    idle turn, which is an LLM call that produces nothing.
+    """
+    if not order:
+        return len(turns)
+    pos = 0
+    total = 0
+    for name in turns:
+        if name not in order:
+            continue
+        while order[pos % len(order)] != name:
+            pos += 1
+            total += 1
+        pos += 1
+        total += 1
+    return total
+
+
+class OutcomeRouter:
+    """selector_func for SelectorGroupChat; always returns a participant name."""
+
+    def __init__(
+        self,
+        planner: str,
+        coder: str,
+        tester: str,
+        test_status: Callable[[str], str],
+        retries: int = 1,
+    ):
+        self.planner, self.coder, self.tester = planner, coder, tester
+        self.test_status = test_status
+        self.retries = retries
+        self._seen = 0
+        self._failures = 0
+        self.cloned = False
+        self.installed = False
+        self.test_runs = 0
+        self.last_test: Optional[str] = None
+        self._planner_saw = 0  # test_runs value the Planner last responded to
+        self.selections: Dict[str, int] = {}
+
+    def _outcomes(self, messages: Sequence[object]) -> List[tuple]:
+        """(tool, ok) for tool results added since the previous selection; updates state."""
+        out = []
+        for m in messages[self._seen:]:
+            if not isinstance(m, ToolCallExecutionEvent):
+                continue
+            for r in m.content:
+                name, text = getattr(r, "name", ""), str(r.content or "")
+                ok = not (getattr(r, "is_error", False) or text.startswith("(exit"))
+                if name == "swe_clone":
+                    self.cloned, self.installed = ok, False
+                elif name == "swe_install":
+                    self.installed = ok
+                elif name == "swe_pytest":
+                    self.test_runs += 1
+                    self.last_test = self.test_status(text)
+                    ok = self.last_test == "pass"
+                out.append((name, ok))
+        self._seen = len(messages)
+        return out
+
+    def _pick(self, messages: Sequence[object]) -> str:
+        turns = speaker_turns(messages)
+        last = turns[-1] if turns else None
+        outcomes = self._outcomes(messages)
+        if last is None:
+            return self.coder  # the task already lists the steps; nothing to plan yet
+        if last == self.planner:
+            self._planner_saw = self.test_runs
+            self._failures = 0
+            return self.coder
+
+        failed_setup = [t for t, ok in outcomes if t in ("swe_clone", "swe_install") and not ok]
+        if failed_setup:
+            self._failures += 1
+            return self.coder if self._failures <= self.retries else self.planner
+        if any(t == "swe_pytest" for t, _ in outcomes) and self.last_test != "pass":
+            return self.planner if self._planner_saw < self.test_runs else self.coder
+        if last == self.coder and not outcomes and self.cloned and self.installed and self.test_runs == 0:
+            return self.tester
+        if self.last_test == "fail" and self._planner_saw < self.test_runs:
+            return self.planner
+        return self.coder
+
+    def select(self, messages: Sequence[object]) -> str:
+        name = self._pick(messages)
+        self.selections[name] = self.selections.get(name, 0) + 1
+        return name
@@ -4,9 +4,12 @@
 # Requires: pip install -U autogen-agentchat autogen-ext[openai]
 
 import os
+import re
+import sys
 import time
+import shutil
 import asyncio
-from typing import List
+from typing import Any, Dict, List, Optional
 
 from autogen_agentchat.agents import AssistantAgent
 from autogen_agentchat.teams import RoundRobinGroupChat
@@ -17,7 +20,9 @@ from autogen_core.models import UserMessage
 from autogen_ext.models.openai import OpenAIChatCompletionClient
 from autogen_ext.code_executors.local import LocalCommandLineCodeExecutor
 from autogen_ext.tools.code_execution import PythonCodeExecutionTool
+from persistent_executor import PersistentPythonExecutor
 from chutes_config import load_chutes_key, get_chutes_base_url
+from client_pool import make_pooled_client
 
 
 # ============================= CONFIG =============================
@@ -42,20 +47,34 @@ BASE_MODEL_INFO = {
 
 MULTI_CODERS = False
 NUM_CODERS = 5
+# Parallel best-of-N: NUM_CODERS coders work concurrently in sandbox/.candidates/cand_<i>;
+# the first passing candidate wins (BEST_OF=best waits for all, picks most tests passed).
+PARALLEL_CODERS = os.environ.get("PARALLEL_CODERS", "").strip().lower() in ("1", "true", "yes", "on")
+BEST_OF = os.environ.get("BEST_OF", "first").strip().lower()
+# How long cancelled losers get to stop before the winner is used without them.
+CANCEL_GRACE_SEC = float(os.environ.get("CANCEL_GRACE_SEC", "10"))
 MAX_TURNS = 40
 
+# persistent: one warm interpreter per agent (persistent_executor.py); local: a new process per block
+CODE_EXECUTOR = os.environ.get("CODE_EXECUTOR", "persistent").strip().lower()
+EXEC_TIMEOUT = float(os.environ.get("EXEC_TIMEOUT", "60"))
+EXEC_MEM_MB = int(os.environ.get("EXEC_MEM_MB", "2048"))
+
 
 # ====================== MODEL CLIENT + PREFLIGHT ======================
-def make_client(model_name: str) -> OpenAIChatCompletionClient:
-    return OpenAIChatCompletionClient(
+def make_client(model_name: str, temperature: float = 0.2, **overrides) -> OpenAIChatCompletionClient:
+    # overrides: api_key/base_url/http_client/max_retries when built for a key pool slot
+    args = dict(
         model=model_name,
         api_key=CHUTES_API_KEY,
         base_url=CHUTES_BASE_URL,   # must end with /v1
-        temperature=0.2,
+        temperature=temperature,
         include_name_in_message=True,
         model_info=BASE_MODEL_INFO,
         # extra_create_args={"max_tokens": 768},  # optional cap
     )
+    args.update(overrides)
+    return OpenAIChatCompletionClient(**args)
 
 async def preflight(client: OpenAIChatCompletionClient, tries: int = 2, delay: float = 1.5) -> bool:
     for attempt in range(tries):
@@ -75,10 +94,11 @@ async def preflight(client: OpenAIChatCompletionClient, tries: int = 2, delay: f
 
 async def pick_ready_model(models: List[str]) -> OpenAIChatCompletionClient:
     for m in models:
-        client = make_client(m)
+        client = make_pooled_client(m, make_client)  # a key/endpoint pool when several are configured
         ok = await preflight(client)
         if ok:
             print(f"[preflight] Using model: {m}")
+            client._selected_model_name = m  # type: ignore
             return client
         else:
             print(f"[preflight] Model not ready: {m} -> trying next")
@@ -101,22 +121,145 @@ async def try_print_stream_usage(model_client: OpenAIChatCompletionClient):
         print(f"(Usage check skipped): {e}")
 
 
+# ============================= EXECUTION =============================
+def make_executor(work_dir: str):
+    # One executor per agent: persistent sessions keep separate interpreters and namespaces.
+    if CODE_EXECUTOR == "local":
+        return LocalCommandLineCodeExecutor(work_dir=work_dir, timeout=int(EXEC_TIMEOUT))
+    return PersistentPythonExecutor(work_dir=work_dir, timeout=EXEC_TIMEOUT, mem_mb=EXEC_MEM_MB)
+
+
+# ============================= PARALLEL BEST-OF-N =============================
+# PROMPT: Do NOT include "passed in" or any other stop phrase here.
+CANDIDATE_TASK = """You are solving a tiny coding task on your own.
+
+Implement function sum_of_squares(nums: list[int]) -> int in a file solution.py in the current directory.
+Also create test_solution.py next to it with pytest tests (normal and edge cases).
+Use the Python execution tool to write files (Python file I/O), then run tests via:
+  python -m pytest -q
+After each run, paste ONLY the last non-empty line of pytest stdout.
+Iterate until tests pass. Keep outputs concise."""
+
+
+async def verify_candidate(cand_dir: str) -> Dict[str, Any]:
+    """Tester step for one candidate: run its tests in a fresh process, no LLM call."""
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "pytest", "-q", "-p", "no:cacheprovider",
+        cwd=cand_dir,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+    )
+    out, _ = await proc.communicate()
+    lines = [ln for ln in out.decode("utf-8", "replace").splitlines() if ln.strip()]
+    tail = lines[-1] if lines else ""
+    m = re.search(r"(\d+) passed", tail)
+    passed = int(m.group(1)) if m else 0
+    return {"ok": proc.returncode == 0 and passed > 0, "passed": passed, "tail": tail}
+
+
+async def run_candidate(i: int, model_name: str) -> Dict[str, Any]:
+    # Dot-dir: pytest runs in sandbox/ do not recurse into the candidates.
+    cand_dir = os.path.join("sandbox", ".candidates", f"cand_{i}")
+    shutil.rmtree(cand_dir, ignore_errors=True)
+    os.makedirs(cand_dir)
+    # Spread temperatures a little so the candidates explore different solutions.
+    client = make_pooled_client(model_name, make_client, temperature=min(1.0, 0.2 + 0.15 * i))
+    executor = make_executor(cand_dir)
+    coder = AssistantAgent(f"Coder{i}", model_client=client, tools=[PythonCodeExecutionTool(executor)])
+    term = TextMentionTermination(" passed in ") | MaxMessageTermination(MAX_TURNS)
+    team = RoundRobinGroupChat([coder], termination_condition=term)
+    t0 = time.time()
+    try:
+        result = await team.run(task=CANDIDATE_TASK)
+    finally:
+        await executor.stop()
+    verdict = await verify_candidate(cand_dir)
+    return {"candidate": i, "dir": cand_dir, "sec": round(time.time() - t0, 2), "messages": len(result.messages), **verdict}
+
+
+def _better(a: Optional[Dict[str, Any]], b: Dict[str, Any]) -> bool:
+    return a is None or (b["passed"], -b["sec"]) > (a["passed"], -a["sec"])
+
+
+async def run_parallel_coders(model: OpenAIChatCompletionClient) -> Optional[Dict[str, Any]]:
+    model_name = getattr(model, "_selected_model_name", None) or PREFERRED_MODELS[0]
+    t0 = time.time()
+    tasks = {asyncio.create_task(run_candidate(i, model_name)): i for i in range(NUM_CODERS)}
+    pending = set(tasks)
+    winner: Optional[Dict[str, Any]] = None
+    cancelled: List[int] = []
+    stuck: List[int] = []
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                try:
+                    res = task.result()
+                except Exception as e:
+                    print(f"[best-of-{NUM_CODERS}] candidate failed: {e}")
+                    continue
+                print(f"[best-of-{NUM_CODERS}] cand_{res['candidate']}: {res['tail'] or '(no output)'} ({res['sec']}s)")
+                if res["ok"] and _better(winner, res):
+                    winner = res
+            if winner is not None and BEST_OF != "best":
+                break
+    finally:
+        # First passing candidate wins: stop the others (their executors stop in run_candidate).
+        for task in pending:
+            task.cancel()
+        if pending:
+            done, still_running = await asyncio.wait(pending, timeout=CANCEL_GRACE_SEC)
+            for task in done:
+                if task.cancelled():
+                    cancelled.append(tasks[task])
+                else:
+                    task.exception()  # a loser that finished or failed while stopping; result unused
+            stuck = sorted(tasks[task] for task in still_running)
+            if stuck:
+                print(f"[best-of-{NUM_CODERS}] candidates still running after {CANCEL_GRACE_SEC:g}s: {stuck}")
+        cancelled.sort()
+
+    print("\n--- SUMMARY ---")
+    print(f"Elapsed seconds: {time.time() - t0:.2f}")
+    if winner is None:
+        print(f"No passing candidate out of {NUM_CODERS}.")
+        return None
+    shutil.copytree(
+        winner["dir"], "sandbox", dirs_exist_ok=True,
+        ignore=shutil.ignore_patterns("__pycache__", ".pytest_cache"),
+    )
+    print(f"Winner: cand_{winner['candidate']} -> {winner['tail']} (copied into sandbox/)")
+    if cancelled or stuck:
+        print(f"Cancelled losers: {cancelled}" + (f"; still running: {stuck}" if stuck else ""))
+    return {**winner, "cancelled": cancelled, "stuck": stuck}
+
+
 # ============================= MAIN =============================
 async def main():
     os.makedirs("sandbox", exist_ok=True)
 
     model = await pick_ready_model(PREFERRED_MODELS)
 
-    exec_tool = PythonCodeExecutionTool(LocalCommandLineCodeExecutor(work_dir="sandbox"))
+    if PARALLEL_CODERS:
+        await run_parallel_coders(model)
+        await try_print_stream_usage(model)
+        return
+
+    executors = []
+
+    def exec_tool() -> PythonCodeExecutionTool:
+        executor = make_executor("sandbox")
+        executors.append(executor)
+        return PythonCodeExecutionTool(executor)
 
     planner = AssistantAgent("Planner", model_client=model)
-    tester  = AssistantAgent("Tester",  model_client=model, tools=[exec_tool])
+    tester  = AssistantAgent("Tester",  model_client=model, tools=[exec_tool()])
 
     if MULTI_CODERS:
-        coders = [AssistantAgent(f"Coder{i}", model_client=model, tools=[exec_tool]) for i in range(NUM_CODERS)]
+        coders = [AssistantAgent(f"Coder{i}", model_client=model, tools=[exec_tool()]) for i in range(NUM_CODERS)]
         members = [planner, *coders, tester]
     else:
-        coder = AssistantAgent("Coder", model_client=model, tools=[exec_tool])
+        coder = AssistantAgent("Coder", model_client=model, tools=[exec_tool()])
         members = [planner, coder, tester]
 
     # Terminate only when pytest prints the success signature,
@@ -135,7 +278,11 @@ Tester: after each run, paste ONLY the last non-empty line of pytest stdout.
 Iterate until tests pass. Keep outputs concise."""
 
     t0 = time.time()
-    result = await Console(team.run_stream(task=task))
+    try:
+        result = await Console(team.run_stream(task=task))
+    finally:
+        for executor in executors:
+            await executor.stop()
     dt = time.time() - t0
 
     print("\n--- SUMMARY ---")
@@ -144,6 +291,9 @@ Iterate until tests pass. Keep outputs concise."""
         print(f"Messages exchanged: {len(result.messages)}")
     except Exception:
         pass
+    for executor in executors:
+        if isinstance(executor, PersistentPythonExecutor):
+            print(f"Executor stats: {executor.stats()}")
 
     await try_print_stream_usage(model)
 
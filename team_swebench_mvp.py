@@ -3,17 +3,23 @@
 # pip install -U autogen-agentchat autogen-ext[openai]
 # docker build -f Dockerfile.swe -t swebench-lite:py3.10 .
 
-import os, shlex, time, asyncio, subprocess, json, re
+import os, time, asyncio, json
 from datetime import datetime, timezone
 from typing import List, Optional
 from autogen_agentchat.agents import AssistantAgent
-from autogen_agentchat.teams import RoundRobinGroupChat
+from autogen_agentchat.teams import RoundRobinGroupChat, SelectorGroupChat
 from autogen_agentchat.conditions import TextMentionTermination, MaxMessageTermination
 from autogen_agentchat.ui import Console
 from autogen_core.models import UserMessage
 from autogen_ext.models.openai import OpenAIChatCompletionClient
 from chutes_config import load_chutes_key, get_chutes_base_url
+from client_pool import make_pooled_client, served_by
 from swe_instance import load_instance, SWEInstance
+from resource_sched import Allocation, maybe_acquire, release
+from prompts import TEAM_PREFIX, team_task, sorted_tools, track_cached_tokens, cache_record
+from team_fsm import OutcomeRouter, round_robin_turns, speaker_turns
+import swe_tools
+from swe_tools import BACKEND, PREFETCH, swe_clone, swe_install, swe_pytest, infer_status, start_prefetch, configure as configure_tools
 
 # ---------------- config ----------------
 CHUTES_API_KEY  = load_chutes_key()
@@ -25,8 +31,9 @@ MODEL_CANDIDATES: List[str] = [
     "openai/gpt-oss-20b",
 ]
 BASE_MODEL_INFO = {"vision": False, "function_calling": True, "json_output": False, "structured_output": False, "family": "unknown"}
-DOCKER_IMAGE    = os.environ.get("SWE_IMAGE", "swebench-lite:py3.10")
 MAX_TURNS       = 10  # tight cap to avoid ping-pong
+# roundrobin: Planner -> Coder -> Tester every cycle; selector: tool-outcome routing (team_fsm.py)
+TEAM_MODE       = os.environ.get("TEAM_MODE", "roundrobin").strip().lower() or "roundrobin"
 
 TARGET_REPO = os.environ.get("TARGET_REPO", "https://github.com/pytest-dev/pytest")
 TARGET_REF  = os.environ.get("TARGET_REF", "")
@@ -46,8 +53,9 @@ if INSTANCE_FILE:
         raise SystemExit(f"Failed to load SWE instance from {INSTANCE_FILE}: {e}")
 
 # ------------- model + preflight -------------
-def make_client(model_name: str) -> OpenAIChatCompletionClient:
-    return OpenAIChatCompletionClient(
+def make_client(model_name: str, **overrides) -> OpenAIChatCompletionClient:
+    # overrides: api_key/base_url/http_client/max_retries when built for a key pool slot
+    args = dict(
         model=model_name,
         api_key=CHUTES_API_KEY,
         base_url=CHUTES_BASE_URL,
@@ -55,6 +63,8 @@ def make_client(model_name: str) -> OpenAIChatCompletionClient:
         include_name_in_message=True,
         model_info=BASE_MODEL_INFO,
     )
+    args.update(overrides)
+    return OpenAIChatCompletionClient(**args)
 
 async def preflight(client: OpenAIChatCompletionClient) -> bool:
     try:
@@ -68,7 +78,8 @@ async def preflight(client: OpenAIChatCompletionClient) -> bool:
         return False
 
 def _instrument_client(client: OpenAIChatCompletionClient, model_name: str) -> OpenAIChatCompletionClient:
-    totals = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    totals = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "calls": 0}
+    orig_create = client.create
     orig_create_stream = client.create_stream
 
     def _merge(u):
@@ -94,6 +105,7 @@ def _instrument_client(client: OpenAIChatCompletionClient, model_name: str) -> O
         extra["stream_options"] = so
         kwargs["extra_create_args"] = extra
         stream = orig_create_stream(*args, **kwargs)
+        totals["calls"] += 1
         async def gen():
             async for chunk in stream:
                 u = getattr(chunk, "usage", None)
@@ -101,14 +113,24 @@ def _instrument_client(client: OpenAIChatCompletionClient, model_name: str) -> O
                 yield chunk
         return gen()
 
+    # AssistantAgent calls create() unless streaming is enabled; count those too.
+    async def wrapped_create(*args, **kwargs):
+        result = await orig_create(*args, **kwargs)
+        totals["calls"] += 1
+        u = getattr(result, "usage", None)
+        if u: _merge(u)
+        return result
+
+    client.create = wrapped_create  # type: ignore
     client.create_stream = wrapped_create_stream  # type: ignore
+    track_cached_tokens(client, totals)
     client._usage_totals = totals  # type: ignore
     client._selected_model_name = model_name  # type: ignore
     return client
 
 async def pick_ready_model() -> OpenAIChatCompletionClient:
     for m in MODEL_CANDIDATES:
-        c = make_client(m)
+        c = make_pooled_client(m, make_client)  # a key/endpoint pool when several are configured
         if await preflight(c):
             print(f"[preflight] Using model: {m}")
             return _instrument_client(c, m)
@@ -116,101 +138,69 @@ async def pick_ready_model() -> OpenAIChatCompletionClient:
             print(f"[preflight] Model not ready: {m} -> next")
     raise RuntimeError("No model available for now.")
 
-# ---------------- docker helpers ----------------
-def _docker(cmd: str) -> tuple[int, str, str]:
-    workdir = os.path.abspath("sandbox"); os.makedirs(workdir, exist_ok=True)
-    full = f"docker run --rm -v {workdir}:/workspace -w /workspace {DOCKER_IMAGE} bash -lc {shlex.quote(cmd)}"
-    p = subprocess.run(full, shell=True, text=True, capture_output=True)
-    return p.returncode, p.stdout, p.stderr
-
-# ---- tools (must be async functions with type hints) ----
-async def swe_clone(*, repo_url: str, ref: Optional[str] = None) -> str:
-    cmds = [f"rm -rf project && git clone --depth 1 {shlex.quote(repo_url)} project"]
-    if ref:
-        r = shlex.quote(ref)
-        cmds.append(
-            "cd project && "
-            f"(git fetch --depth 1 origin {r} && git checkout -q {r}) "
-            f"|| (git fetch --depth 50 origin {r} && git checkout -q {r}) "
-            f"|| ((git fetch --unshallow origin || git fetch --unshallow || true) && git checkout -q {r})"
-        )
-    code, out, err = _docker(" && ".join(cmds))
-    return "(cloned)" if code == 0 else f"(exit {code})\nSTDOUT:\n{out}\nSTDERR:\n{err}"
+# ---------------- tools ----------------
+# clone / install / pytest and their episode state live in swe_tools.py, shared by all runners.
+configure_tools(TARGET_REPO, PYTEST_K)
 
-async def swe_install(*, req_file: str = "requirements.txt") -> str:
-    cmd = f"cd project && if [ -f {shlex.quote(req_file)} ]; then python -m pip install -q -r {shlex.quote(req_file)}; else echo 'no requirements.txt'; fi"
-    code, out, err = _docker(cmd)
-    return (out or "ok").strip() if code == 0 else f"(exit {code})\nSTDOUT:\n{out}\nSTDERR:\n{err}"
+# Set by main() when SWE_SCHED is enabled; pins runs to a CPU set + memory cap.
+ALLOCATION: Optional[Allocation] = None
 
-async def swe_pytest(*, pytest_args: str = "-q") -> str:
-    cmd = f"""
-cd project
-python - <<'PY'
-import subprocess
-try:
-    import pytest  # noqa: F401
-except Exception:
-    subprocess.run('python -m pip install -q -U pytest', shell=True, check=False)
-PY
-python -m pytest {pytest_args}
-"""
-    code, out, err = _docker(cmd)
-    # Return ONLY the last non-empty line of stdout; fallback to stderr
-    def last_nonempty(s: str) -> str:
-        lines = [ln for ln in (s or "").splitlines() if ln.strip()]
-        return lines[-1] if lines else ""
-    tail = last_nonempty(out) or last_nonempty(err) or ""
-    # record tail for metrics only if non-empty
-    global LAST_PYTEST_TAIL
-    if tail:
-        LAST_PYTEST_TAIL = tail
-    # Always return the tail (success or not)
-    return tail if tail else "no tests ran"
 
 # ---------------- main ----------------
-async def main():
-    model = await pick_ready_model()
-
-    planner = AssistantAgent("Planner", model_client=model)
-    coder   = AssistantAgent("Coder",   model_client=model, tools=[swe_clone, swe_install, swe_pytest])
-    tester  = AssistantAgent("Tester",  model_client=model, tools=[swe_pytest])
+async def main(model: Optional[OpenAIChatCompletionClient] = None):
+    global ALLOCATION
+    try:
+        if model is None:
+            model = await pick_ready_model()
 
-    # Robust termination:
-    # - pytest typical success: "X passed in Ys"
-    # - some envs/plugins: "X passed" (no timing)
-    # - model summaries: "All tests passed"
-    # - hard cap
-    term = (
-        TextMentionTermination(" passed in ")
-        | TextMentionTermination(" passed")
-        | TextMentionTermination("All tests passed")
-        | MaxMessageTermination(MAX_TURNS)
-    )
-    team = RoundRobinGroupChat([planner, coder, tester], termination_condition=term)
+        # Only once a model is ready: a failed preflight should not hold a slot or pull the repo.
+        ALLOCATION = maybe_acquire(TARGET_REPO)
+        BACKEND.resources = ALLOCATION
+        # SWE_PREFETCH=1: clone and install start now, overlapping the first turns.
+        start_prefetch(TARGET_REPO, TARGET_REF)
 
-    kline = f'-k "{PYTEST_K}"' if PYTEST_K else ""
-    task = f"""You are a team validating a Python repo inside Docker.
+        planner = AssistantAgent("Planner", model_client=model)
+        # Tools in name order so their schemas serialize identically across runs (prefix caching).
+        coder   = AssistantAgent("Coder",   model_client=model, tools=sorted_tools([swe_clone, swe_install, swe_pytest]))
+        tester  = AssistantAgent("Tester",  model_client=model, tools=[swe_pytest])
 
-Tools (call them and paste ONLY tool output; do not paraphrase):
-- swe_clone(repo_url, ref) -> clones into /workspace/project
-- swe_install(req_file="requirements.txt") -> installs deps if file exists
-- swe_pytest(pytest_args="-q") -> runs pytest and returns ONLY the last non-empty stdout line
+        # Robust termination:
+        # - pytest typical success: "X passed in Ys"
+        # - some envs/plugins: "X passed" (no timing)
+        # - model summaries: "All tests passed"
+        # - hard cap
+        term = (
+            TextMentionTermination(" passed in ")
+            | TextMentionTermination(" passed")
+            | TextMentionTermination("All tests passed")
+            | MaxMessageTermination(MAX_TURNS)
+        )
+        if TEAM_MODE == "selector":
+            router = OutcomeRouter(planner.name, coder.name, tester.name, test_status=infer_status)
+            # selector_func always names a speaker, so the model client is never asked to select.
+            team = SelectorGroupChat(
+                [planner, coder, tester],
+                model_client=model,
+                termination_condition=term,
+                selector_func=router.select,
+                allow_repeated_speaker=True,
+            )
+        else:
+            team = RoundRobinGroupChat([planner, coder, tester], termination_condition=term)
 
-Goal:
-1) Clone:
-   repo_url = {TARGET_REPO}
-   ref      = {TARGET_REF or "(default)"}
-2) Install dependencies.
-3) Run tests with: -q {kline}
-4) If tests fail, re-run with a narrower -k or briefly suggest next steps (but do not edit code in this MVP).
-After each test run, paste ONLY the exact line returned by swe_pytest (no extra words).
-"""
+        kline = f'-k "{PYTEST_K}"' if PYTEST_K else ""
+        # Shared instructions first, per-run values last, so providers can reuse the prefix cache.
+        task = team_task(INSTANCE.id if INSTANCE else None, TARGET_REPO, TARGET_REF or "(default)", f"-q {kline}".strip())
 
-    t0 = time.time()
-    started = datetime.now(timezone.utc).isoformat()
-    res = await Console(team.run_stream(task=task))
-    elapsed = time.time()-t0
-    ended = datetime.now(timezone.utc).isoformat()
+        t0 = time.time()
+        started = datetime.now(timezone.utc).isoformat()
+        res = await Console(team.run_stream(task=task))
+        elapsed = time.time()-t0
+        ended = datetime.now(timezone.utc).isoformat()
+    finally:
+        # Also on errors, Ctrl-C or a failed preflight: never leak the slot or the prefetch thread.
+        PREFETCH.close()
+        release(ALLOCATION)
     print(f"\n--- SUMMARY ---\nElapsed seconds: {elapsed:.2f}")
     try:
         print(f"Messages: {len(res.messages)}")
@@ -218,21 +208,17 @@ After each test run, paste ONLY the exact line returned by swe_pytest (no extra
         pass
 
     # Metrics
-    def infer_status(tail: str) -> str:
-        s = (tail or "").lower()
-        if not s:
-            return "unknown"
-        if re.search(r"\b\d+\s+passed\b", s) and not ("failed" in s or "error" in s or "errors" in s):
-            return "pass"
-        if "failed" in s or "error" in s or "errors" in s:
-            return "fail"
-        return "unknown"
-
     try:
         msg_count = len(res.messages)
     except Exception:
         msg_count = None
 
+    try:
+        turns = speaker_turns(res.messages)
+    except Exception:
+        turns = []
+    rr_turns = round_robin_turns(turns, [planner.name, coder.name, tester.name])
+
     usage = getattr(model, "_usage_totals", None)
     model_name = getattr(model, "_selected_model_name", None) or getattr(model, "model", None) or getattr(model, "_model", None)
 
@@ -242,18 +228,30 @@ After each test run, paste ONLY the exact line returned by swe_pytest (no extra
         "ref": TARGET_REF,
         "pytest_k": PYTEST_K,
         "model": model_name,
+        "job_id": os.environ.get("SWE_JOB_ID") or None,
+        "api_keys": served_by(model, CHUTES_API_KEY),
         "team": "planner-coder-tester",
+        "team_mode": TEAM_MODE,
+        "llm_calls": usage.get("calls") if isinstance(usage, dict) else None,
+        "agent_turns": {n: turns.count(n) for n in (planner.name, coder.name, tester.name)},
+        # Agent turns a round-robin schedule would need for the same productive turns.
+        "round_robin_turns": rr_turns,
+        "llm_calls_saved_vs_round_robin": rr_turns - len(turns),
         "start_ts": started,
         "end_ts": ended,
         "elapsed_sec": round(elapsed, 3),
         "messages": msg_count,
-        "final_pytest_tail": globals().get("LAST_PYTEST_TAIL", None),
-        "status": infer_status(globals().get("LAST_PYTEST_TAIL", "") or ""),
+        "resources": ALLOCATION.as_record() if ALLOCATION else None,
+        **swe_tools.record(),
+        "prompt_cache": cache_record(usage, TEAM_PREFIX) if isinstance(usage, dict) else None,
+        "final_pytest_tail": swe_tools.LAST_PYTEST_TAIL,
+        "status": infer_status(swe_tools.LAST_PYTEST_TAIL or ""),
         "tokens": (
             {
                 "prompt": usage.get("prompt_tokens", 0),
                 "completion": usage.get("completion_tokens", 0),
                 "total": usage.get("total_tokens", 0),
+                "cached": usage.get("cached_tokens", 0),
             }
             if isinstance(usage, dict)
             else None
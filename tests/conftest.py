@@ -0,0 +1,53 @@
+import os
+import subprocess
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+# The harness modules are top-level scripts next to this directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class HostBackend:
+    """Runs commands on the host, like the local backend without its venv."""
+
+    name = "host"
+    image = "host"
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.resources = None
+        self.mounts = {}
+
+    def workspace_dir(self):
+        return self.ws
+
+    def run(self, cmd, env=None):
+        full = {**os.environ, **{k: v.replace("/workspace", self.ws) for k, v in (env or {}).items()}}
+        p = subprocess.run(["bash", "-c", cmd], cwd=self.ws, env=full, capture_output=True, text=True)
+        return p.returncode, p.stdout, p.stderr
+
+
+@pytest.fixture
+def host_backend():
+    return HostBackend
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """clock(module, tick=0) replaces `module.time` with a fake; returns the [now] list to move.
+
+    With a tick, every read advances the clock first, so call order is time order.
+    """
+    def patch(module, tick=0.0):
+        now = [1_000_000.0]
+
+        def read():
+            now[0] += tick
+            return now[0]
+
+        monkeypatch.setattr(module, "time", SimpleNamespace(time=read))
+        return now
+
+    return patch
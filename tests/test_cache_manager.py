@@ -0,0 +1,103 @@
+import os
+
+import pytest
+
+import cache_manager
+
+
+@pytest.fixture
+def now(clock):
+    # Ticks on every read, so last-access order is the call order.
+    return clock(cache_manager, tick=1)
+
+
+@pytest.fixture
+def ns(tmp_path, monkeypatch, now):
+    monkeypatch.setenv("SWE_CACHE_INDEX", str(tmp_path / "index.sqlite"))
+    monkeypatch.setenv("SWE_CACHE_QUOTA", "0")
+    monkeypatch.setattr(cache_manager, "_extra", {})
+    root = tmp_path / "entries"
+    root.mkdir()
+    return cache_manager.register("t", str(root), ["*.bin"])
+
+
+def _write(ns, name, size=64 << 10):
+    with open(os.path.join(ns.root, name), "wb") as f:
+        f.write(os.urandom(size))
+    return cache_manager.record("t", name)
+
+
+def _names():
+    return sorted(e["name"] for e in cache_manager.entries("t"))
+
+
+def test_record_evicts_least_recently_used(ns, monkeypatch):
+    size = _write(ns, "a.bin")
+    monkeypatch.setenv("SWE_CACHE_QUOTA_T", str(2 * size))
+    _write(ns, "b.bin")
+    cache_manager.touch("t", "a.bin")
+    _write(ns, "c.bin")
+    assert _names() == ["a.bin", "c.bin"]
+    assert sorted(os.listdir(ns.root)) == ["a.bin", "c.bin"]
+
+
+def test_pinned_entries_are_not_evicted(ns, monkeypatch):
+    size = _write(ns, "a.bin")
+    monkeypatch.setenv("SWE_CACHE_QUOTA_T", str(size))
+    with cache_manager.pinned("t", "a.bin"):
+        _write(ns, "b.bin")
+        assert _names() == ["a.bin", "b.bin"]
+    assert [e[1] for e in cache_manager.enforce()] == ["a.bin"]
+    assert _names() == ["b.bin"]
+
+
+def test_pins_of_dead_processes_are_ignored(ns, monkeypatch):
+    size = _write(ns, "a.bin")
+    monkeypatch.setenv("SWE_CACHE_QUOTA_T", str(size))
+    cache_manager.pin("t", "a.bin")
+    monkeypatch.setattr(cache_manager, "_pid_alive", lambda pid: False)
+    _write(ns, "b.bin")
+    assert _names() == ["b.bin"]
+
+
+def test_global_quota_and_dry_run(ns, monkeypatch):
+    size = _write(ns, "a.bin")
+    _write(ns, "b.bin")
+    monkeypatch.setenv("SWE_CACHE_QUOTA", str(size))
+    assert [e[1] for e in cache_manager.enforce(dry_run=True)] == ["a.bin"]
+    assert _names() == ["a.bin", "b.bin"]
+    assert [e[1] for e in cache_manager.enforce()] == ["a.bin"]
+    assert _names() == ["b.bin"]
+
+
+def test_max_age_evicts_regardless_of_quota(ns, now):
+    _write(ns, "old.bin")
+    now[0] += 3 * 86400
+    _write(ns, "new.bin")
+    assert [e[1] for e in cache_manager.enforce(max_age_days=2)] == ["old.bin"]
+    assert _names() == ["new.bin"]
+
+
+def test_scan_picks_up_unknown_entries(ns):
+    with open(os.path.join(ns.root, "stray.bin"), "wb") as f:
+        f.write(b"x" * 100)
+    with open(os.path.join(ns.root, "x.bin.tmp-1"), "wb") as f:
+        f.write(b"x")
+    cache_manager.scan(["t"])
+    assert _names() == ["stray.bin"]
+    os.remove(os.path.join(ns.root, "stray.bin"))
+    cache_manager.scan(["t"])
+    assert _names() == []
+
+
+def test_failed_eviction_is_not_reported_and_eviction_goes_on(ns, monkeypatch):
+    size = _write(ns, "a.bin")
+    _write(ns, "b.bin")
+    _write(ns, "c.bin")
+    # A file cannot replace a non-empty directory, so a.bin cannot be moved aside.
+    os.makedirs(os.path.join(ns.root, f"a.bin.evict-{os.getpid()}", "x"))
+    monkeypatch.setenv("SWE_CACHE_QUOTA_T", str(2 * size))
+    # a.bin cannot be moved aside, so b.bin goes too to get under the quota.
+    assert [e[1] for e in cache_manager.enforce()] == ["b.bin"]
+    assert _names() == ["a.bin", "c.bin"]
+    assert os.path.exists(os.path.join(ns.root, "a.bin"))
@@ -0,0 +1,63 @@
+import pytest
+
+import chutes_config
+
+
+@pytest.fixture
+def key_file(tmp_path, monkeypatch):
+    path = tmp_path / "chutes_key.txt"
+    path.write_text("cpk_aaa\ncpk_bbb\n", encoding="utf-8")
+    monkeypatch.setattr(chutes_config, "_default_key_path", lambda filename=None: path)
+    monkeypatch.setattr(chutes_config, "_EXPORTED_KEY", "")
+    monkeypatch.delenv(chutes_config.ENV_VAR, raising=False)
+    monkeypatch.delenv(chutes_config.KEYS_ENV_VAR, raising=False)
+    return path
+
+
+def test_keys_from_file(key_file):
+    assert chutes_config.load_chutes_keys() == ["cpk_aaa", "cpk_bbb"]
+
+
+def test_keys_after_single_key_export(key_file):
+    # The runners call load_chutes_key() at import time, before the pool is built.
+    assert chutes_config.load_chutes_key() == "cpk_aaa"
+    assert chutes_config.load_chutes_keys() == ["cpk_aaa", "cpk_bbb"]
+    assert chutes_config.load_chutes_key() == "cpk_aaa"
+
+
+def test_user_set_key_wins_over_file(key_file, monkeypatch):
+    monkeypatch.setenv(chutes_config.ENV_VAR, "cpk_env")
+    assert chutes_config.load_chutes_keys() == ["cpk_env"]
+
+
+def test_keys_env_pool(key_file, monkeypatch):
+    monkeypatch.setenv(chutes_config.KEYS_ENV_VAR, "cpk_x, cpk_y cpk_x")
+    assert chutes_config.load_chutes_keys() == ["cpk_x", "cpk_y"]
+
+
+def test_json_key_list(key_file):
+    key_file.write_text('{"api_keys": ["cpk_1", {"api_key": "cpk_2"}]}', encoding="utf-8")
+    assert chutes_config.load_chutes_keys() == ["cpk_1", "cpk_2"]
+
+
+@pytest.mark.parametrize(
+    "text, keys",
+    [
+        ("cpk_a\ncpk_b\n", ["cpk_a", "cpk_b"]),
+        ('"tok1"\n# comment\n\ntok2\n', ["tok1", "tok2"]),
+        ("api_key=cpk_a\nkey = 'cpk_b'\nTOKEN=cpk_c\n", ["cpk_a", "cpk_b", "cpk_c"]),
+        # Anything that is not a key makes it a single-key file, read as before pools existed.
+        ("api_key=cpk_abc\nbase_url=https://llm.chutes.ai/v1\n", ["cpk_abc"]),
+        ("cpk_abc\nmodel: foo\n", ["cpk_abc"]),
+        ("cpk_abc\nsome note about the key\n", ["cpk_abc"]),
+        ('{"api_key": "cpk_j"}', ["cpk_j"]),
+        ("", []),
+    ],
+)
+def test_parse_key_list(text, keys):
+    assert chutes_config._parse_key_list(text) == keys
+
+
+def test_single_key_file_with_settings(key_file):
+    key_file.write_text("api_key=cpk_abc\nbase_url=https://llm.chutes.ai/v1\n", encoding="utf-8")
+    assert chutes_config.load_chutes_keys() == ["cpk_abc"]
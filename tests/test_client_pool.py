@@ -0,0 +1,127 @@
+import asyncio
+import json
+import os
+
+import httpx
+import openai
+import pytest
+
+import client_pool
+from client_pool import PooledChatClient, Slot
+
+
+class StatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = httpx.Response(status_code, headers=headers or {})
+
+
+class FakeClient:
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def create(self, *args, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+    def create_stream(self, *args, **kwargs):
+        async def gen():
+            self.calls += 1
+            if self.errors:
+                raise self.errors.pop(0)
+            yield "chunk"
+
+        return gen()
+
+
+@pytest.fixture(autouse=True)
+def pool_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("SWE_KEYPOOL_DIR", str(tmp_path))
+    monkeypatch.setattr(client_pool, "_backoff", lambda attempt: 0.0)
+    return tmp_path
+
+
+def _pool(*clients):
+    slots = []
+    for i, c in enumerate(clients):
+        slot = Slot(f"cpk_key{i}", "https://example.invalid/v1")
+        slot.client = c
+        slots.append(slot)
+    # Idle slots tie-break by pid rotation; slightly less headroom per index fixes the order at 0, 1, ...
+    with client_pool._locked_state() as state:
+        for i, slot in enumerate(slots):
+            state["slots"][slot.id] = {"headroom_requests": 1.0 - i / 100}
+    return PooledChatClient(slots)
+
+
+def _state(pool_dir):
+    with open(os.path.join(pool_dir, "state.json"), encoding="utf-8") as f:
+        return json.load(f)["slots"]
+
+
+def test_least_outstanding_slot_first():
+    pool = _pool(FakeClient(), FakeClient(), FakeClient())
+    leased = [pool._try_acquire()[0] for _ in range(3)]
+    assert len({s.id for s in leased}) == 3
+    pool._release(leased[1])
+    assert pool._try_acquire()[0] is leased[1]
+
+
+def test_cooldown_skips_slot(pool_dir):
+    pool = _pool(FakeClient(), FakeClient())
+    with client_pool._locked_state() as state:
+        state["slots"][pool.slots[0].id] = {"cooldown_until": 1e12}
+    for _ in range(3):
+        slot, _ = pool._try_acquire()
+        assert slot is pool.slots[1]
+        pool._release(slot)
+
+
+def test_all_cooling_reports_wait():
+    pool = _pool(FakeClient())
+    with client_pool._locked_state() as state:
+        state["slots"][pool.slots[0].id] = {"cooldown_until": client_pool.time.time() + 30}
+    slot, wait = pool._try_acquire()
+    assert slot is None and 25 < wait <= 30
+
+
+def test_429_fails_over_and_cools_down(pool_dir):
+    a = FakeClient(StatusError(429, {"retry-after": "30"}))
+    b = FakeClient()
+    pool = _pool(a, b)
+    # Make slot a the first choice.
+    with client_pool._locked_state() as state:
+        state["slots"][pool.slots[1].id] = {"outstanding": {str(os.getpid()): 1}}
+    assert asyncio.run(pool.create([])) == "ok"
+    assert (a.calls, b.calls) == (1, 1)
+    assert pool.slots[0].rate_limited == 1
+    assert _state(pool_dir)[pool.slots[0].id]["cooldown_until"] > client_pool.time.time() + 20
+
+
+def test_transient_errors_retry_on_another_slot(pool_dir):
+    req = httpx.Request("POST", "https://example.invalid/v1/chat/completions")
+    a = FakeClient(StatusError(503), openai.APIConnectionError(request=req))
+    pool = _pool(a, FakeClient())
+    assert asyncio.run(pool.create([])) == "ok"
+    assert _state(pool_dir)[pool.slots[0].id]["cooldown_until"] > 0
+
+
+def test_stream_retries_before_first_chunk():
+    pool = _pool(FakeClient(StatusError(502)), FakeClient())
+
+    async def collect():
+        return [c async for c in pool.create_stream([])]
+
+    assert asyncio.run(collect()) == ["chunk"]
+
+
+def test_client_errors_are_not_retried():
+    a, b = FakeClient(StatusError(400)), FakeClient(StatusError(400))
+    pool = _pool(a, b)
+    with pytest.raises(StatusError):
+        asyncio.run(pool.create([]))
+    assert a.calls + b.calls == 1
@@ -0,0 +1,66 @@
+from clone_modes import k_keywords, select_paths, sparse_patterns
+
+PATHS = [
+    "pyproject.toml",
+    "README.md",
+    "pkg/__init__.py",
+    "pkg/core.py",
+    "pkg/sub/__init__.py",
+    "pkg/sub/impl.py",
+    "tests/conftest.py",
+    "tests/test_parser.py",
+    "tests/test_writer.py",
+    "tests/data/sample.txt",
+    "docs/index.rst",
+    "docs/conf.py",
+    "benchmarks/bench_a.py",
+    "vendored/lib.c",
+]
+
+
+def test_k_keywords():
+    assert k_keywords("parser and not slow") == ["parser"]
+    assert k_keywords("test_a or (Writer and not b)") == ["test_a", "writer"]
+    assert k_keywords("not x") == []
+    assert k_keywords("") == []
+
+
+def test_select_paths_keeps_packages_tests_and_root_files():
+    selected = select_paths(PATHS)
+    assert "pyproject.toml" in selected and "README.md" in selected
+    assert {"pkg/core.py", "pkg/sub/impl.py", "tests/test_writer.py", "tests/data/sample.txt"} <= selected
+    assert not any(p.startswith(("docs/", "benchmarks/", "vendored/")) for p in selected)
+
+
+def test_select_paths_build_files_and_extra_dirs():
+    selected = select_paths(PATHS, build_text="[tool.x]\nsources = ['vendored/lib.c']\n", extra=["docs"])
+    assert "vendored/lib.c" in selected
+    assert "docs/conf.py" in selected
+    assert "benchmarks/bench_a.py" not in selected
+
+
+def test_select_paths_narrowed_by_k():
+    selected = select_paths(PATHS, k_expr="parser and not writer", narrow_tests=True)
+    assert "tests/test_parser.py" in selected
+    assert "tests/test_writer.py" not in selected
+    # Support files stay.
+    assert {"tests/conftest.py", "tests/data/sample.txt"} <= selected
+    # Without SWE_SPARSE_K the expression does not narrow anything.
+    assert "tests/test_writer.py" in select_paths(PATHS, k_expr="parser")
+
+
+def test_sparse_patterns_collapse_full_dirs():
+    selected = select_paths(PATHS)
+    assert sparse_patterns(PATHS, selected) == ["/README.md", "/pkg/", "/pyproject.toml", "/tests/"]
+
+
+def test_sparse_patterns_list_partial_dirs():
+    selected = select_paths(PATHS, k_expr="parser", narrow_tests=True)
+    assert sparse_patterns(PATHS, selected) == [
+        "/README.md",
+        "/pkg/",
+        "/pyproject.toml",
+        "/tests/conftest.py",
+        "/tests/data/",
+        "/tests/test_parser.py",
+    ]
@@ -0,0 +1,24 @@
+import sys
+
+import eval_run
+from work_queue import WorkQueue
+
+
+def test_worker_discards_a_result_after_losing_the_lease(tmp_path, monkeypatch, capsys):
+    path = str(tmp_path / "queue.sqlite")
+    monkeypatch.setenv("SWE_QUEUE", path)
+    monkeypatch.delenv("SWE_SWEEP_TOKEN_BUDGET", raising=False)
+    monkeypatch.delenv("SWE_SWEEP_TPM", raising=False)
+    monkeypatch.setattr(eval_run, "RESULTS", str(tmp_path / "results.jsonl"))
+    WorkQueue(path).enqueue("one", "inst.json", "m")
+    # The "episode" outlives its lease: another worker takes the job over and finishes it first.
+    steal = (
+        "import sqlite3, sys; db = sqlite3.connect(sys.argv[1]); "
+        "db.execute(\"UPDATE jobs SET lease_owner='other', status='done'\"); db.commit()"
+    )
+    monkeypatch.setattr(eval_run, "build_run", lambda agent, inst, model: ([sys.executable, "-c", steal, path], {}))
+    assert eval_run.worker() == 0
+    out = capsys.readouterr().out
+    assert "lease lost, result discarded" in out
+    assert "finished" not in out
+    assert WorkQueue(path).jobs()[0]["lease_owner"] == "other"
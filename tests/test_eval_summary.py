@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from eval_summary import Aggregates, percentile, read_new
+
+
+def _line(**r):
+    return (json.dumps(r) + "\n").encode("utf-8")
+
+
+@pytest.mark.parametrize("q, expected", [(0, 1.0), (50, 10.0), (95, 19.0), (96, 20.0), (100, 20.0)])
+def test_percentile_is_nearest_rank(q, expected):
+    assert percentile([float(i) for i in range(1, 21)], q) == expected
+
+
+def test_percentile_of_nothing():
+    assert percentile([], 50) is None
+
+
+def test_aggregates_group_and_order_elapsed():
+    agg = Aggregates()
+    # Arrival order is not elapsed order; p50/p95 come from the sorted values.
+    for sec, status in [(9.0, "pass"), (1.0, "fail"), (5.0, "pass"), (3.0, "pass")]:
+        agg.add({"model": "m", "team": "t", "instance_id": "i", "status": status,
+                 "elapsed_sec": sec, "tokens": {"total": 300}, "messages": 4})
+    agg.add({"model": "m", "instance_id": "j", "status": "fail"})
+    g = agg.groups[("m", "t", "i")]
+    assert g["elapsed"] == [1.0, 3.0, 5.0, 9.0]
+    assert (g["runs"], g["passes"], g["tokens"]) == (4, 3, 1200)
+
+    rows = [line.split("\t") for line in agg.table().splitlines()]
+    assert rows[0][:7] == ["model", "team", "instance_id", "runs", "pass_rate", "p50_sec", "p95_sec"]
+    assert rows[1] == ["m", "one-agent", "j", "1", "0%", "-", "-", "-", "-"]
+    assert rows[2] == ["m", "t", "i", "4", "75%", "3.0", "9.0", "400", "4.0"]
+
+
+def test_read_new_consumes_only_complete_lines(tmp_path):
+    path = tmp_path / "results.jsonl"
+    assert read_new(str(path), 0) == ([], 0)
+
+    path.write_bytes(_line(run=1) + _line(run=2) + b'{"run": 3, "sta')
+    rows, offset = read_new(str(path), 0)
+    assert [r["run"] for r in rows] == [1, 2]
+    assert offset == len(_line(run=1) + _line(run=2))
+
+    # The partial record is left for the next call, which sees it once it is finished.
+    assert read_new(str(path), offset) == ([], offset)
+    with open(path, "ab") as f:
+        f.write(b'tus": "pass"}\n' + b"not json\n" + _line(run=4))
+    rows, offset = read_new(str(path), offset)
+    assert rows == [{"run": 3, "status": "pass"}, {"run": 4}]
+    assert offset == path.stat().st_size
+    assert read_new(str(path), offset) == ([], offset)
+
+
+def test_read_new_starts_over_after_truncation(tmp_path):
+    path = tmp_path / "results.jsonl"
+    path.write_bytes(_line(run=1) + _line(run=2))
+    _, offset = read_new(str(path), 0)
+    path.write_bytes(_line(run=9))
+    rows, new_offset = read_new(str(path), offset)
+    assert rows == [{"run": 9}]
+    assert new_offset == len(_line(run=9))
@@ -0,0 +1,91 @@
+import os
+import shlex
+import sys
+
+import pytest
+
+import exec_backend
+from exec_backend import DockerBackend, ExecBackend, LocalBackend, PodmanBackend, get_backend
+
+
+class FakeAllocation:
+    def docker_flags(self):
+        return "--cpuset-cpus 2,3 --memory 512m"
+
+
+def test_incomplete_backend_fails_on_construction():
+    class NoRun(ExecBackend):
+        name = "norun"
+
+    with pytest.raises(TypeError):
+        NoRun()
+
+
+def test_docker_command_flags(tmp_path):
+    b = DockerBackend(image="img:1", workspace=str(tmp_path))
+    b.resources = FakeAllocation()
+    b.mounts = {"/host/cache": "/cache"}
+    cmd = b.command("cd project && echo 'hi'", env={"A": "x y", "PYTHONUSERBASE": "/workspace/project/.swe_user"})
+    assert shlex.split(cmd) == [
+        "docker", "run", "--rm", "--cpuset-cpus", "2,3", "--memory", "512m",
+        "-e", "A=x y", "-e", "PYTHONUSERBASE=/workspace/project/.swe_user",
+        "-v", "/host/cache:/cache",
+        "-v", f"{tmp_path}:/workspace", "-w", "/workspace", "img:1",
+        "bash", "-lc", "cd project && echo 'hi'",
+    ]
+
+
+def test_podman_uses_its_binary(tmp_path):
+    cmd = PodmanBackend(image="img", workspace=str(tmp_path)).command("true")
+    assert cmd.startswith("podman run --rm -v ")
+
+
+def test_workspace_from_env(tmp_path, monkeypatch):
+    monkeypatch.setenv("SWE_WORKSPACE", str(tmp_path / "ws1"))
+    assert LocalBackend().workspace_dir() == str(tmp_path / "ws1")
+    assert os.path.isdir(tmp_path / "ws1")
+    # An explicit workspace wins over SWE_WORKSPACE.
+    assert LocalBackend(workspace=str(tmp_path / "ws2")).workspace_dir() == str(tmp_path / "ws2")
+
+
+@pytest.fixture
+def local(tmp_path, monkeypatch):
+    # A venv stand-in, so no real venv is created.
+    venv = tmp_path / "ws" / ".swe_venv" / "bin"
+    venv.mkdir(parents=True)
+    os.symlink(sys.executable, venv / "python")
+    monkeypatch.setenv("PYTHONPATH", "/somewhere")
+    b = LocalBackend(workspace=str(tmp_path / "ws"))
+    b.mounts = {str(tmp_path / "cache"): "/cache"}
+    return b
+
+
+def test_local_env(local, tmp_path):
+    env = local._env({
+        "PIP_USER": "1",
+        "PYTHONUSERBASE": "/workspace/project/.swe_user",
+        "OUT": "/workspace/out.json",
+        "CCACHE_DIR": "/cache/ccache",
+    })
+    ws = str(tmp_path / "ws")
+    assert "PIP_USER" not in env and "PYTHONUSERBASE" not in env
+    assert "PYTHONPATH" not in env
+    assert env["OUT"] == f"{ws}/out.json"
+    assert env["CCACHE_DIR"] == f"{tmp_path}/cache/ccache"
+    assert env["VIRTUAL_ENV"] == f"{ws}/.swe_venv"
+    assert env["PATH"].split(os.pathsep)[0] == f"{ws}/.swe_venv/bin"
+
+
+def test_local_run(local, tmp_path):
+    code, out, err = local.run('pwd; echo "$OUT"; exit 3', env={"OUT": "/workspace/x"})
+    ws = str(tmp_path / "ws")
+    assert code == 3
+    assert out.split() == [ws, f"{ws}/x"]
+
+
+def test_get_backend(monkeypatch, tmp_path):
+    monkeypatch.setenv("SWE_BACKEND", "local")
+    assert isinstance(get_backend(workspace=str(tmp_path)), LocalBackend)
+    with pytest.raises(ValueError):
+        get_backend("vm")
+    assert set(exec_backend.BACKENDS) == {"docker", "podman", "local"}
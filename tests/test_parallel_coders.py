@@ -0,0 +1,67 @@
+import asyncio
+import os
+import time
+
+import pytest
+from autogen_core import CancellationToken
+from autogen_core.code_executor import CodeBlock, CodeResult
+
+from persistent_executor import PersistentPythonExecutor
+
+
+@pytest.fixture
+def team(monkeypatch, tmp_path):
+    monkeypatch.setenv("CHUTES_API_KEY", "cpk_test")
+    monkeypatch.chdir(tmp_path)
+    import team_min_chutes_v2
+
+    monkeypatch.setattr(team_min_chutes_v2, "NUM_CODERS", 3)
+    monkeypatch.setattr(team_min_chutes_v2, "BEST_OF", "first")
+    monkeypatch.setattr(team_min_chutes_v2, "CANCEL_GRACE_SEC", 5.0)
+    return team_min_chutes_v2
+
+
+class FakeExecutor:
+    """Each block takes a while, like an LLM turn plus a code run."""
+
+    def __init__(self):
+        self.executions = 0
+
+    async def execute_code_blocks(self, code_blocks, cancellation_token):
+        await asyncio.sleep(0.05)
+        self.executions += 1
+        return CodeResult(exit_code=1, output="not yet\n")
+
+    async def stop(self):
+        pass
+
+
+def test_cancelled_losers_stop(team, tmp_path, monkeypatch):
+    executors = {1: FakeExecutor(), 2: PersistentPythonExecutor(work_dir=str(tmp_path / "k"), timeout=30)}
+
+    async def fake_candidate(i, model_name):
+        cand_dir = os.path.join("sandbox", ".candidates", f"cand_{i}")
+        os.makedirs(cand_dir, exist_ok=True)
+        if i == 0:
+            await asyncio.sleep(0.5)
+            return {"candidate": 0, "dir": cand_dir, "sec": 0.5, "messages": 1, "ok": True, "passed": 1, "tail": "1 passed in 0.01s"}
+        executor = executors[i]
+        block = [CodeBlock(code="import time; time.sleep(30)", language="python")]
+        try:
+            # Like an agent: a failed code block is just another turn.
+            while True:
+                await executor.execute_code_blocks(block, CancellationToken())
+        finally:
+            await executor.stop()
+
+    monkeypatch.setattr(team, "run_candidate", fake_candidate)
+    t0 = time.time()
+    winner = asyncio.run(team.run_parallel_coders(object()))
+    assert winner["candidate"] == 0
+    assert winner["cancelled"] == [1, 2]
+    assert winner["stuck"] == []
+    assert time.time() - t0 < 5
+    ran = executors[1].executions
+    time.sleep(0.3)
+    assert executors[1].executions == ran
+    assert executors[2].restarts == 1
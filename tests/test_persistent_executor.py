@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+from autogen_core import CancellationToken
+from autogen_core.code_executor import CodeBlock
+
+from persistent_executor import PersistentPythonExecutor
+
+
+def _block(code, language="python"):
+    return [CodeBlock(code=code, language=language)]
+
+
+def test_state_persists(tmp_path):
+    async def go():
+        ex = PersistentPythonExecutor(work_dir=str(tmp_path), timeout=10)
+        try:
+            await ex.execute_code_blocks(_block("x = 41"), CancellationToken())
+            return await ex.execute_code_blocks(_block("print(x + 1)"), CancellationToken())
+        finally:
+            await ex.stop()
+
+    result = asyncio.run(go())
+    assert result.exit_code == 0
+    assert result.output.strip() == "42"
+
+
+def test_timeout_restarts(tmp_path):
+    async def go():
+        ex = PersistentPythonExecutor(work_dir=str(tmp_path), timeout=0.5)
+        try:
+            return await ex.execute_code_blocks(_block("import time; time.sleep(30)"), CancellationToken()), ex.restarts
+        finally:
+            await ex.stop()
+
+    result, restarts = asyncio.run(go())
+    assert result.exit_code == 124
+    assert restarts == 1
+
+
+def test_token_cancel_is_a_result(tmp_path):
+    async def go():
+        ex = PersistentPythonExecutor(work_dir=str(tmp_path), timeout=30)
+        token = CancellationToken()
+        asyncio.get_running_loop().call_later(0.5, token.cancel)
+        try:
+            return await ex.execute_code_blocks(_block("import time; time.sleep(30)"), token)
+        finally:
+            await ex.stop()
+
+    result = asyncio.run(go())
+    assert result.exit_code == 1
+    assert "cancelled" in result.output
+
+
+def test_task_cancel_propagates(tmp_path):
+    async def go():
+        ex = PersistentPythonExecutor(work_dir=str(tmp_path), timeout=30)
+        task = asyncio.create_task(ex.execute_code_blocks(_block("import time; time.sleep(30)"), CancellationToken()))
+        await asyncio.sleep(0.5)
+        t0 = time.time()
+        task.cancel()
+        try:
+            await task
+            cancelled = False
+        except asyncio.CancelledError:
+            cancelled = True
+        await ex.stop()
+        return cancelled, time.time() - t0, ex.restarts
+
+    cancelled, sec, restarts = asyncio.run(go())
+    assert cancelled
+    assert sec < 10
+    assert restarts == 1
@@ -0,0 +1,113 @@
+import asyncio
+import threading
+
+from prefetch import Prefetcher
+
+
+def _step(tool, calls, result="ok", gate=None):
+    async def run(**args):
+        calls.append(tool)
+        if gate is not None:
+            gate.wait(5)
+        return result
+    return run
+
+
+def _start(steps):
+    p = Prefetcher()
+    p.start(steps)
+    return p
+
+
+def test_matching_claim_returns_the_prefetched_result():
+    calls = []
+    p = _start([
+        ("swe_clone", {"repo_url": "u", "ref": ""}, _step("clone", calls, "cloned")),
+        ("swe_install", {"req_file": "r.txt"}, _step("install", calls, "installed")),
+    ])
+
+    async def episode():
+        # An empty ref and "(default)" are the same call.
+        return (await p.claim("swe_clone", repo_url="u", ref="(default)"),
+                await p.claim("swe_install", req_file="r.txt"))
+
+    assert asyncio.run(episode()) == ("cloned", "installed")
+    p.close()
+    assert calls == ["clone", "install"]
+    rec = p.record()
+    assert [s["state"] for s in rec["steps"]] == ["claimed", "claimed"]
+    assert all(s["waited_sec"] is not None for s in rec["steps"])
+
+
+def test_mismatched_claim_drops_pending_and_waits_for_the_step_in_flight():
+    calls = []
+    gate = threading.Event()
+    p = _start([
+        ("swe_clone", {"repo_url": "u"}, _step("clone", calls, gate=gate)),
+        ("swe_install", {"req_file": "r.txt"}, _step("install", calls)),
+    ])
+
+    async def episode():
+        while calls != ["clone"]:
+            await asyncio.sleep(0.01)
+        threading.Timer(0.2, gate.set).start()
+        return await p.claim("swe_clone", repo_url="other")
+
+    assert asyncio.run(episode()) is None
+    # The clone was in flight: claim returned only after it finished, and it stays "done".
+    assert gate.is_set()
+    p.close()
+    assert calls == ["clone"]
+    rec = p.record()
+    assert [s["state"] for s in rec["steps"]] == ["done", "dropped"]
+    assert rec["steps"][0]["waited_sec"] >= 0.1
+    assert rec["steps"][1]["sec"] is None
+
+
+def test_step_that_ran_unclaimed_stays_done():
+    calls = []
+    gate = threading.Event()
+    p = _start([
+        ("swe_clone", {"repo_url": "u"}, _step("clone", calls)),
+        ("swe_install", {"req_file": "r.txt"}, _step("install", calls, gate=gate)),
+    ])
+
+    async def episode():
+        assert await p.claim("swe_clone", repo_url="u") == "ok"
+        while calls != ["clone", "install"]:
+            await asyncio.sleep(0.01)
+        gate.set()
+        # The model went straight to pytest: the install finished and its packages are there.
+        return await p.claim("swe_pytest")
+
+    assert asyncio.run(episode()) is None
+    p.close()
+    rec = p.record()
+    assert [s["state"] for s in rec["steps"]] == ["claimed", "done"]
+    assert rec["overlapped_sec"] >= 0.0
+
+
+def test_failed_step_stops_the_rest():
+    calls = []
+    p = _start([
+        ("swe_clone", {"repo_url": "u"}, _step("clone", calls, "(exit 128)\nfatal: not found")),
+        ("swe_install", {"req_file": "r.txt"}, _step("install", calls)),
+    ])
+
+    async def episode():
+        return (await p.claim("swe_clone", repo_url="u"),
+                await p.claim("swe_install", req_file="r.txt"))
+
+    clone, install = asyncio.run(episode())
+    p.close()
+    assert clone.startswith("(exit 128)")
+    # The install never ran: its claim falls through to the real tool.
+    assert install is None
+    assert calls == ["clone"]
+    assert [s["state"] for s in p.record()["steps"]] == ["claimed", "dropped"]
+
+
+def test_claim_without_start_is_a_no_op():
+    p = Prefetcher()
+    assert asyncio.run(p.claim("swe_clone", repo_url="u")) is None
+    assert p.record() is None
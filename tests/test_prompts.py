@@ -0,0 +1,129 @@
+import asyncio
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from prompts import (
+    ONE_AGENT_PREFIX,
+    TEAM_PREFIX,
+    cache_record,
+    one_agent_task,
+    prefix_id,
+    run_parameters,
+    sorted_tools,
+    team_task,
+    track_cached_tokens,
+)
+
+RUN_A = ("django__django-11099", "https://github.com/django/django", "abc123", '-q -k "test_validators"')
+RUN_B = (None, "https://github.com/psf/requests", "(default)", "-q")
+
+
+@pytest.mark.parametrize("task, prefix", [(one_agent_task, ONE_AGENT_PREFIX), (team_task, TEAM_PREFIX)])
+def test_prefix_is_byte_identical_across_runs(task, prefix):
+    a, b = task(*RUN_A).encode("utf-8"), task(*RUN_B).encode("utf-8")
+    p = prefix.encode("utf-8")
+    assert a.startswith(p) and b.startswith(p)
+    # The runs share the prefix and diverge only inside the run parameters.
+    common = os.path.commonprefix([a, b])
+    assert len(common) >= len(p)
+    assert a[len(p):].lstrip().startswith(b"Run parameters:")
+    for value in (RUN_A[0], RUN_A[1], RUN_A[2], RUN_B[1]):
+        assert value not in prefix
+
+
+def test_run_parameters_omit_an_empty_instance_id():
+    assert run_parameters(None, "u", "r", "-q").splitlines() == [
+        "Run parameters:",
+        'repo_url    = "u"',
+        'ref         = "r"',
+        'pytest_args = "-q"',
+    ]
+    assert "instance_id = x-1" in run_parameters("x-1", "u", "r", "-q")
+
+
+def test_prefix_id_and_sorted_tools():
+    assert prefix_id(ONE_AGENT_PREFIX) == prefix_id(ONE_AGENT_PREFIX)
+    assert prefix_id(ONE_AGENT_PREFIX) != prefix_id(TEAM_PREFIX)
+    assert len(prefix_id(TEAM_PREFIX)) == 12
+
+    def swe_pytest(): ...
+    def swe_clone(): ...
+    def swe_install(): ...
+    assert [t.__name__ for t in sorted_tools([swe_pytest, swe_clone, swe_install])] == [
+        "swe_clone", "swe_install", "swe_pytest",
+    ]
+
+
+class _Completions:
+    """Stands in for openai's chat.completions: one usage per create call."""
+
+    def __init__(self, usages):
+        self.usages = list(usages)
+
+    async def create(self, *args, stream=False, **kwargs):
+        usage = self.usages.pop(0)
+        if not stream:
+            return SimpleNamespace(usage=usage)
+
+        async def chunks():
+            yield SimpleNamespace(usage=None, delta="hel")
+            yield SimpleNamespace(usage=None, delta="lo")
+            # The usage-only chunk at the end (stream_options.include_usage).
+            yield SimpleNamespace(usage=usage, delta="")
+
+        return chunks()
+
+
+def _client(*usages):
+    return SimpleNamespace(_client=SimpleNamespace(chat=SimpleNamespace(completions=_Completions(usages))))
+
+
+def _usage(prompt, cached):
+    return SimpleNamespace(prompt_tokens=prompt, prompt_tokens_details=SimpleNamespace(cached_tokens=cached))
+
+
+def test_track_cached_tokens_counts_streamed_and_plain_calls():
+    client = _client(
+        _usage(1000, 768),
+        {"prompt_tokens": 1200, "prompt_cache_hit_tokens": 1024},  # DeepSeek style
+        _usage(900, None),
+    )
+    totals = {}
+    assert track_cached_tokens(client, totals)
+    create = client._client.chat.completions.create
+
+    async def calls():
+        stream = await create(messages=[], stream=True)
+        assert [c.delta async for c in stream] == ["hel", "lo", ""]
+        await create(messages=[])
+        await create(messages=[])
+
+    asyncio.run(calls())
+    assert totals["cached_tokens"] == 768 + 1024
+    assert totals["cache_calls"] == [
+        {"prompt": 1000, "cached": 768},
+        {"prompt": 1200, "cached": 1024},
+        {"prompt": 900, "cached": None},
+    ]
+    rec = cache_record(totals, ONE_AGENT_PREFIX)
+    assert rec["prefix_id"] == prefix_id(ONE_AGENT_PREFIX)
+    assert rec["hit_rate"] == round(1792 / 3100, 4)
+    assert rec["calls"] == [[1000, 768], [1200, 1024], [900, None]]
+
+
+def test_track_cached_tokens_hooks_every_pool_slot():
+    a, b = _client(_usage(10, 5)), _client(_usage(10, 0))
+    totals = {}
+    assert track_cached_tokens(SimpleNamespace(slots=[SimpleNamespace(client=a), SimpleNamespace(client=b)]), totals)
+    asyncio.run(a._client.chat.completions.create())
+    asyncio.run(b._client.chat.completions.create())
+    assert totals["cached_tokens"] == 5 and len(totals["cache_calls"]) == 2
+
+
+def test_unsupported_client_and_empty_record():
+    assert track_cached_tokens(SimpleNamespace(), {}) is False
+    assert cache_record(None, TEAM_PREFIX) == {
+        "prefix_id": prefix_id(TEAM_PREFIX), "cached_tokens": 0, "hit_rate": None, "calls": [],
+    }
@@ -0,0 +1,101 @@
+import os
+import subprocess
+
+import pytest
+
+import pytest_manifest
+from pytest_manifest import command, fingerprints, finish, lookup, selection_args, stale
+
+
+def test_selection_args():
+    assert selection_args("-q -k 'foo and not bar' -x") == ["-k", "foo and not bar", "-x"]
+    assert selection_args("-vv -rA --tb=short") == ["-rA", "--tb=short"]
+    assert selection_args("-m slow --maxfail 2") == ["-m", "slow", "--maxfail", "2"]
+
+
+@pytest.mark.parametrize("args", ["tests/test_a.py", "-q --lf", "--ff -k x", "--last-failed=all", "--collect-only", "-k 'unclosed"])
+def test_selection_args_uncacheable(args):
+    assert selection_args(args) is None
+
+
+def test_fingerprints(tmp_path):
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "tests").mkdir()
+    (tmp_path / "pkg" / "mod.py").write_text("x = 1\n")
+    (tmp_path / "tests" / "test_a.py").write_text("def test_a(): pass\n")
+    (tmp_path / "setup.cfg").write_text("[metadata]\n")
+    tests_fp, deps_fp = fingerprints(str(tmp_path), "img:1")
+
+    (tmp_path / "pkg" / "mod.py").write_text("x = 2\n")
+    assert fingerprints(str(tmp_path), "img:1") == (tests_fp, deps_fp)
+
+    assert fingerprints(str(tmp_path), "img:2") == (tests_fp, fingerprints(str(tmp_path), "img:2")[1])
+    assert fingerprints(str(tmp_path), "img:2")[1] != deps_fp
+
+    (tmp_path / "tests" / "test_b.py").write_text("def test_b(): pass\n")
+    assert fingerprints(str(tmp_path), "img:1")[0] != tests_fp
+
+    (tmp_path / "setup.cfg").write_text("[metadata]\nname = x\n")
+    assert fingerprints(str(tmp_path), "img:1")[1] != deps_fp
+
+
+@pytest.fixture
+def ws(tmp_path, monkeypatch):
+    monkeypatch.setenv("SWE_MANIFEST_DIR", str(tmp_path / "manifests"))
+    monkeypatch.setenv("SWE_CACHE_INDEX", str(tmp_path / "index.sqlite"))
+    proj = tmp_path / "ws" / "project"
+    (proj / "tests").mkdir(parents=True)
+    (proj / "pytest.ini").write_text("[pytest]\n")
+    for i in range(3):
+        (proj / "tests" / f"test_m{i}.py").write_text("def test_keep(): pass\ndef test_drop(): pass\n")
+    return str(tmp_path / "ws")
+
+
+def _pytest(ws, cmd, env):
+    # The runners' swe_pytest: run from project/, /workspace in env is the workspace.
+    full = {**os.environ, **{k: v.replace("/workspace", ws) for k, v in env.items()}}
+    return subprocess.run(["bash", "-c", f"cd project && {cmd} -p no:cacheprovider"], cwd=ws, env=full, capture_output=True, text=True).returncode
+
+
+def test_miss_saves_then_hit_narrows_files(ws):
+    m = lookup(ws, "-q -k m1", "repo", "main", "img")
+    assert m is not None and m.nodeids is None
+    cmd, env = command(m, "-q -k m1", ws)
+    assert "-p swe_manifest_plugin" in cmd
+    assert finish(m, _pytest(ws, cmd, env), ws) is False
+
+    hit = lookup(ws, "-q -k m1", "repo", "main", "img")
+    assert sorted(hit.nodeids) == ["tests/test_m1.py::test_drop", "tests/test_m1.py::test_keep"]
+    assert hit.deselected == 4
+    assert hit.record()["files"] == 1
+    cmd, env = command(hit, "-v -k m1", ws)
+    assert cmd.endswith(" tests/test_m1.py") and env == {}
+    assert finish(hit, _pytest(ws, cmd, env), ws) is False
+
+    # Another image is another dependency key.
+    assert lookup(ws, "-q -k m1", "repo", "main", "other").nodeids is None
+
+
+def test_stale_hit_is_dropped(ws):
+    m = lookup(ws, "-q -k m1", "repo", "main")
+    pytest_manifest.save(m, ["tests/test_m1.py::test_keep"])
+    hit = lookup(ws, "-q -k m1", "repo", "main")
+    assert hit.nodeids is not None
+    os.rename(os.path.join(ws, "project", "tests", "test_m1.py"), os.path.join(ws, "project", "tests", "test_m9.py"))
+    # The rename changes the test fingerprint, so a fresh lookup already misses ...
+    assert lookup(ws, "-q -k m1", "repo", "main").nodeids is None
+    # ... and a run that started from the old selection is repeated, on any shard's 4 or 5.
+    cmd, env = command(hit, "-q -k m1", ws)
+    code = _pytest(ws, cmd, env)
+    assert code == 4
+    assert stale(hit, [0, code]) is True
+    assert hit.nodeids is None and not os.path.exists(hit.path)
+    assert stale(hit, [5]) is False
+
+
+def test_stale_ignores_passing_and_failing_runs(ws):
+    m = lookup(ws, "-q -k m1", "repo", "main")
+    pytest_manifest.save(m, ["tests/test_m1.py::test_keep"])
+    hit = lookup(ws, "-q -k m1", "repo", "main")
+    assert stale(hit, [0, 1, 2]) is False
+    assert os.path.exists(hit.path)
@@ -0,0 +1,103 @@
+import os
+
+import pytest
+
+from pytest_profile import parse_importtime, prepare, pytest_command, summarize, target_modules
+
+IMPORTTIME = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:       300 |        300 |     mypkg.util
+import time:      1500 |       1800 |   mypkg.core
+import time:       200 |       2000 | mypkg
+import time:      5000 |       5000 | numpy
+some other stderr line
+"""
+
+
+def test_parse_importtime():
+    assert parse_importtime(IMPORTTIME) == [
+        (1, "_io", 0.00012, 0.00012),
+        (2, "mypkg.util", 0.0003, 0.0003),
+        (1, "mypkg.core", 0.0015, 0.0018),
+        (0, "mypkg", 0.0002, 0.002),
+        (0, "numpy", 0.005, 0.005),
+    ]
+    assert parse_importtime("") == []
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://github.com/pytest-dev/pytest", ("pytest", "_pytest")),
+    ("https://github.com/scikit-learn/scikit-learn.git", ("scikit_learn", "_scikit_learn")),
+    ("https://github.com/psf/requests/", ("requests", "_requests")),
+    ("", ()),
+])
+def test_target_modules(url, expected):
+    assert target_modules(url) == expected
+
+
+def test_summarize_artifacts(tmp_path, monkeypatch):
+    monkeypatch.setenv("SWE_PROFILE_TOP", "1")
+    d = tmp_path / ".swe_profile"
+    d.mkdir()
+    (d / "phases.json").write_text(
+        '{"t0": 100.0, "plugin_loaded": 100.5, "sessionstart": 100.75, "collect_start": 100.75,'
+        ' "collect_end": 101.0, "finish": 103.0, "collected": 5, "selected": 2, "exitstatus": 1}'
+    )
+    (d / "importtime.log").write_text(IMPORTTIME)
+    (d / "stderr.log").write_text("")
+    out = "===== slowest 2 durations =====\n2.00s call     tests/test_a.py::test_slow\n0.50s call     tests/test_a.py::test_fast\n"
+    s = summarize(str(d), out, "https://github.com/me/mypkg", None)
+    assert s["phases"] == {"startup_sec": 0.5, "configure_sec": 0.25, "collect_sec": 0.25, "run_sec": 2.0, "wall_sec": 3.0}
+    assert (s["collected"], s["selected"], s["exitstatus"]) == (5, 2, 1)
+    assert s["imports"] == {"modules": 5, "total_sec": 0.007, "target_sec": 0.002, "top": [["numpy", 0.005]]}
+    assert s["slowest"] == [["tests/test_a.py::test_slow", 2.0]]
+    assert s["sampler"] is None
+    assert s["artifacts"] == ["importtime.log", "phases.json"]
+    assert (d / "summary.json").exists()
+
+
+def test_summarize_without_artifacts(tmp_path):
+    s = summarize(str(tmp_path / "missing"), "", "", "cprofile")
+    assert "phases" not in s
+    assert s["imports"]["modules"] == 0 and s["artifacts"] == [] and s["sampler"] == "cprofile"
+
+
+@pytest.fixture
+def project(tmp_path):
+    proj = tmp_path / "project"
+    (proj / "mypkg").mkdir(parents=True)
+    (proj / "mypkg" / "__init__.py").write_text("import json\nVALUE = 1\n")
+    (proj / "tests").mkdir()
+    (proj / "pytest.ini").write_text("[pytest]\n")
+    (proj / "tests" / "test_pkg.py").write_text(
+        "import mypkg\n\n"
+        "def test_value(): assert mypkg.VALUE == 1\n"
+        "def test_broken(): assert mypkg.VALUE == 2\n"
+        "def test_skipped_by_k(): pass\n"
+    )
+    return tmp_path
+
+
+def test_pytest_command_runs_and_splits_stderr(project, host_backend):
+    backend = host_backend(str(project))
+    d = prepare(str(project))
+    code, out, err = backend.run("cd project && " + pytest_command('-q -p no:cacheprovider -k "not skipped_by_k"'))
+    assert code == 1, out + err
+    assert out.strip().splitlines()[-1].startswith("1 failed, 1 passed, 1 deselected")
+    # importtime lines go to their own log; the rest of stderr passes through.
+    assert "import time:" not in err
+    log = open(os.path.join(d, "importtime.log"), encoding="utf-8").read()
+    assert log and all(ln.startswith("import time:") for ln in log.splitlines())
+
+    s = summarize(d, out, "https://github.com/me/mypkg", None)
+    assert set(s["phases"]) == {"startup_sec", "configure_sec", "collect_sec", "run_sec", "wall_sec"}
+    assert all(v >= 0 for v in s["phases"].values())
+    assert (s["collected"], s["selected"], s["exitstatus"]) == (3, 2, 1)
+    # The target package is imported while the test module is collected.
+    assert "mypkg" in [mod for _, mod, _, _ in parse_importtime(log)]
+    assert {"phases.json", "importtime.log"} <= set(s["artifacts"])
+
+
+@pytest.mark.parametrize("args, capture", [("-q", True), ("-q -s", False), ("--capture=no -q", False), ("-q -k sanity", True)])
+def test_pytest_command_capture(args, capture):
+    assert ("--capture=sys" in pytest_command(args)) is capture
@@ -0,0 +1,70 @@
+import pytest
+
+from pytest_shards import balance, merge_tail, parse_collected, parse_summary, run_sharded
+
+
+def test_balance_longest_first():
+    durations = {"a": 8.0, "b": 4.0, "c": 4.0, "d": 1.0}
+    shards = balance(["a", "b", "c", "d"], durations, 2)
+    loads = sorted(sum(durations[t] for t in s) for s in shards)
+    assert loads == [8.0, 9.0]
+    assert sorted(t for s in shards for t in s) == ["a", "b", "c", "d"]
+
+
+def test_balance_unknown_tests_get_median():
+    shards = balance(["x", "y", "z", "w"], {"x": 2.0, "y": 2.0}, 2)
+    assert sorted(len(s) for s in shards) == [2, 2]
+
+
+def test_balance_drops_empty_shards():
+    assert balance(["only"], {}, 3) == [["only"]]
+
+
+def test_parse_summary():
+    tail = "2 failed, 310 passed, 1 error, 3 warnings in 4.1s"
+    assert parse_summary(tail) == {"failed": 2, "passed": 310, "error": 1, "warning": 3}
+    assert parse_summary("3/3390 tests collected (3387 deselected) in 2.97s") == {"deselected": 3387}
+
+
+def test_merge_tail():
+    assert merge_tail({"passed": 3, "failed": 1, "error": 2}, 1.234, 4) == "1 failed, 3 passed, 2 errors in 1.23s (4 shards)"
+    assert merge_tail({}, 1.0, 2) == "no tests ran"
+
+
+def test_parse_collected():
+    out = "tests/test_a.py::test_x\ntests/test_a.py::test_y[1]\n\n3/5 tests collected (2 deselected) in 0.01s\n"
+    assert parse_collected(out) == ["tests/test_a.py::test_x", "tests/test_a.py::test_y[1]"]
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.setenv("SWE_DURATIONS_DIR", str(tmp_path / "durations"))
+    monkeypatch.setenv("SWE_CACHE_INDEX", str(tmp_path / "index.sqlite"))
+    proj = tmp_path / "project"
+    (proj / "tests").mkdir(parents=True)
+    (proj / "pytest.ini").write_text("[pytest]\n")
+    for i in range(3):
+        (proj / "tests" / f"test_m{i}.py").write_text("def test_keep(): pass\ndef test_drop(): pass\n")
+    (proj / "tests" / "test_other.py").write_text("def test_drop_too(): pass\n")
+    return tmp_path
+
+
+def test_sharded_tail_keeps_user_deselections(project, host_backend):
+    backend = host_backend(str(project))
+    single = backend.run('cd project && python -m pytest -q -p no:cacheprovider -k keep')[1].strip().splitlines()[-1]
+    res = run_sharded(backend, {}, "-q -k keep", "repo", None, n=2)
+    assert res is not None and res["code"] == 0
+    assert parse_summary(res["tail"]) == parse_summary(single) == {"passed": 3, "deselected": 4}
+    assert res["nodeids"] == [f"tests/test_m{i}.py::test_keep" for i in range(3)]
+
+
+def test_sharded_known_selection_skips_collection(project, host_backend, monkeypatch):
+    backend = host_backend(str(project))
+    calls = []
+    run = backend.run
+    monkeypatch.setattr(backend, "run", lambda cmd, env=None: calls.append(cmd) or run(cmd, env))
+    ids = [f"tests/test_m{i}.py::test_keep" for i in range(3)]
+    res = run_sharded(backend, {}, "-q -k keep", "repo", None, n=2, nodeids=ids, deselected=4)
+    assert not any("--collect-only" in c for c in calls)
+    assert res["record"]["collected_from"] == "manifest"
+    assert parse_summary(res["tail"]) == {"passed": 3, "deselected": 4}
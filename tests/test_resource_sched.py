@@ -0,0 +1,98 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import resource_sched
+from resource_sched import Allocation, acquire, classify, host_cpus, release
+
+
+@pytest.fixture
+def sched_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("SWE_SCHED_DIR", str(tmp_path))
+    monkeypatch.delenv("SWE_JOB_CLASS", raising=False)
+    monkeypatch.setenv("SWE_SCHED_LIGHT", "1,256")
+    return tmp_path
+
+
+@pytest.fixture
+def dead_pid():
+    p = subprocess.Popen([sys.executable, "-c", "pass"])
+    p.wait()
+    return p.pid
+
+
+def _state(d):
+    return json.loads((d / "state.json").read_text())
+
+
+def _seed(d, allocs=None, waiting=None):
+    (d / "state.json").write_text(json.dumps({"allocs": allocs or {}, "waiting": waiting or []}))
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://github.com/pandas-dev/pandas", "heavy"),
+    ("https://github.com/numpy/numpy.git", "heavy"),
+    ("https://github.com/scikit-learn/scikit-learn/", "heavy"),
+    ("https://github.com/psf/requests", "light"),
+    ("", "light"),
+])
+def test_classify(url, expected, monkeypatch):
+    monkeypatch.delenv("SWE_JOB_CLASS", raising=False)
+    assert classify(url) == expected
+
+
+def test_classify_forced(monkeypatch):
+    monkeypatch.setenv("SWE_JOB_CLASS", "heavy")
+    assert classify("https://github.com/psf/requests") == "heavy"
+
+
+def test_docker_flags_and_record():
+    a = Allocation("1:2", "heavy", [2, 3, 4, 5], 8192, wait_sec=1.23456)
+    assert a.docker_flags() == "--cpuset-cpus=2,3,4,5 --cpus=4 --memory=8192m --memory-swap=8192m"
+    assert a.as_record() == {"job_class": "heavy", "cpuset": [2, 3, 4, 5], "mem_mb": 8192, "wait_sec": 1.235}
+
+
+def test_acquire_and_release(sched_dir):
+    a = acquire("light", poll_sec=0.01, timeout=1)
+    assert a.cpuset == host_cpus()[:1] and a.mem_mb == 256
+    assert list(_state(sched_dir)["allocs"]) == [a.token]
+    release(a)
+    assert _state(sched_dir) == {"allocs": {}, "waiting": []}
+
+
+def test_dead_holders_and_waiters_are_pruned(sched_dir, dead_pid):
+    # A crashed runner holds every CPU and is first in line; neither blocks us.
+    _seed(
+        sched_dir,
+        allocs={f"{dead_pid}:1": {"pid": dead_pid, "cpuset": host_cpus(), "mem_mb": 256, "class": "light"}},
+        waiting=[f"{dead_pid}:2"],
+    )
+    a = acquire("light", poll_sec=0.01, timeout=1)
+    assert list(_state(sched_dir)["allocs"]) == [a.token]
+    release(a)
+
+
+def test_fifo_waits_behind_a_live_waiter(sched_dir):
+    # An older, live waiter (this process, another token) goes first even though there is room.
+    head = f"{os.getpid()}:0"
+    _seed(sched_dir, waiting=[head])
+    with pytest.raises(TimeoutError):
+        acquire("light", poll_sec=0.01, timeout=0.05)
+    state = _state(sched_dir)
+    assert state["waiting"] == [head] and state["allocs"] == {}
+
+
+def test_waits_while_the_host_is_full(sched_dir):
+    _seed(sched_dir, allocs={f"{os.getpid()}:0": {
+        "pid": os.getpid(), "cpuset": host_cpus(), "mem_mb": 256, "class": "light"}})
+    with pytest.raises(TimeoutError):
+        acquire("light", poll_sec=0.01, timeout=0.05)
+    assert _state(sched_dir)["waiting"] == []
+
+
+def test_maybe_acquire_is_off_by_default(monkeypatch):
+    monkeypatch.delenv("SWE_SCHED", raising=False)
+    assert resource_sched.maybe_acquire("https://github.com/psf/requests") is None
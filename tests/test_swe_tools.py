@@ -0,0 +1,50 @@
+import asyncio
+import subprocess
+
+import pytest
+
+import swe_tools
+
+
+@pytest.fixture
+def tools(tmp_path, monkeypatch, host_backend):
+    for var in ("SWE_SNAPSHOT", "SWE_PREFETCH", "SWE_PYTEST_SHARDS", "SWE_COLLECT_CACHE", "SWE_PROFILE", "SWE_CLONE_MODE", "SWE_BUILD_CACHE"):
+        monkeypatch.delenv(var, raising=False)
+    repo = tmp_path / "repo"
+    (repo / "tests").mkdir(parents=True)
+    (repo / "requirements.txt").write_text("# none\n")
+    (repo / "tests" / "test_a.py").write_text("def test_one(): pass\ndef test_two(): assert False\n")
+    for args in (["init", "-q"], ["add", "-A"], ["-c", "user.name=t", "-c", "user.email=t@localhost", "commit", "-q", "-m", "x"]):
+        subprocess.run(["git", *args], cwd=repo, check=True, capture_output=True)
+    ws = tmp_path / "ws"
+    ws.mkdir()
+    monkeypatch.setattr(swe_tools, "BACKEND", host_backend(str(ws)))
+    monkeypatch.setattr(swe_tools, "WORKSPACE_ENV", dict(swe_tools.WORKSPACE_ENV))
+    for name in ("LAST_CLONE", "SNAPSHOT", "LAST_CLONE_INFO", "LAST_SHARDS", "LAST_PROFILE", "LAST_MANIFEST", "LAST_PYTEST_TAIL"):
+        monkeypatch.setattr(swe_tools, name, None)
+    monkeypatch.setattr(swe_tools, "PREFETCH", swe_tools.Prefetcher())
+    swe_tools.configure(f"file://{repo}", "")
+    return f"file://{repo}"
+
+
+def test_clone_install_pytest(tools):
+    assert asyncio.run(swe_tools.swe_clone(repo_url=tools)) == "(cloned)"
+    assert swe_tools.LAST_CLONE == (tools, None)
+    assert not asyncio.run(swe_tools.swe_install()).startswith("(exit")
+    tail = asyncio.run(swe_tools.swe_pytest(pytest_args="-q -p no:cacheprovider"))
+    assert tail.startswith("1 failed, 1 passed")
+    assert swe_tools.LAST_PYTEST_TAIL == tail
+    assert swe_tools.infer_status(tail) == "fail"
+    rec = swe_tools.record()
+    assert rec["snapshot"] is None and rec["shards"] is None and rec["prefetch"] is None
+
+
+def test_failed_clone_reports_exit(tools):
+    out = asyncio.run(swe_tools.swe_clone(repo_url=tools + "-missing"))
+    assert out.startswith("(exit ") and swe_tools.LAST_CLONE is None
+
+
+def test_helpers():
+    assert swe_tools.last_nonempty("a\n\nb\n\n") == "b"
+    assert swe_tools.infer_status("3 passed in 0.1s") == "pass"
+    assert swe_tools.infer_status("") == "unknown"
@@ -0,0 +1,58 @@
+import json
+
+from sweep_plan import Forecast, admit, cheap_first, fits_budget, queue_admission, window_tokens
+
+
+def _f(model, tokens, sec=60.0, inst="i"):
+    return Forecast("one", f"{inst}.json", inst, model, tokens, sec, "history")
+
+
+def test_cheap_first_keeps_models_together():
+    jobs = [_f("big", 900, inst="a"), _f("small", 50, inst="a"), _f("big", 100, inst="b"), _f("small", 150, inst="b")]
+    assert [(f.model, f.tokens) for f in cheap_first(jobs)] == [("small", 50), ("small", 150), ("big", 100), ("big", 900)]
+
+
+def test_fits_budget():
+    jobs = [_f("m", 40), _f("m", 50), _f("m", 20)]
+    planned, deferred = fits_budget(jobs, 70)
+    assert [f.tokens for f in planned] == [40, 20]
+    assert [f.tokens for f in deferred] == [50]
+    assert fits_budget(jobs, None) == (jobs, [])
+
+
+def test_window_tokens_spreads_finished_jobs():
+    # Half of a 120s job falls into the last minute.
+    assert window_tokens([(0.0, 120.0, 100.0), (0.0, 10.0, 50.0)], now=120.0) == 50.0
+
+
+def test_admit_budget_and_tpm():
+    job = _f("m", 100, sec=60)
+    assert admit(job, 0, [], [], budget=1000, tpm=None) == "run"
+    assert admit(job, 850, [], [_f("m", 100)], budget=1000, tpm=None) == "defer"
+    assert admit(job, 0, [(0, 60, 950)], [], budget=None, tpm=1000, now=60) == "wait"
+    # Nothing in flight: waiting cannot help, so even an over-limit job runs.
+    assert admit(_f("m", 5000), 0, [], [], budget=None, tpm=1000, now=60) == "run"
+
+
+def _row(status, sweep, est=100, tokens=None):
+    result = json.dumps({"records": [{"tokens": {"total": tokens}}]}) if tokens else None
+    return {"agent": "one", "instance_file": "/x/i.json", "model": "m", "status": status,
+            "est_tokens": est, "est_sec": 60, "sweep": sweep, "result": result}
+
+
+def test_queue_admission_budget_is_per_sweep():
+    check = queue_admission(budget=500, tpm=None)
+    old = [_row("done", "s1", tokens=1000), _row("deferred", "s1")]
+    job = _row("queued", "s2")
+    assert check(job, old + [job]) == "run"
+    assert check(_row("queued", "s1"), old) == "defer"
+    # Jobs of the same sweep that are still running count against it.
+    running = [_row("leased", "s2", est=450)]
+    assert check(job, old + running + [job]) == "defer"
+
+
+def test_queue_admission_tpm_spans_all_sweeps():
+    check = queue_admission(budget=None, tpm=150)
+    job = _row("queued", "s2")
+    assert check(job, [_row("leased", "s1", est=100), job]) == "wait"
+    assert check(job, [job]) == "run"
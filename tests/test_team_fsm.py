@@ -0,0 +1,116 @@
+import asyncio
+
+from autogen_agentchat.conditions import TextMentionTermination
+from autogen_agentchat.messages import TextMessage, ToolCallExecutionEvent, ToolCallSummaryMessage
+from autogen_core.models import FunctionExecutionResult
+
+from team_fsm import OutcomeRouter, round_robin_turns, speaker_turns
+
+PASS = "3 passed in 0.12s"
+FAIL = "FAILED tests/test_x.py::test_a - assert 1 == 2\n1 failed, 2 passed in 0.15s"
+
+
+def _status(tail):
+    if "failed" in tail:
+        return "fail"
+    return "pass" if "passed" in tail else "unknown"
+
+
+def _router(**kw):
+    return OutcomeRouter("Planner", "Coder", "Tester", test_status=_status, **kw)
+
+
+def _task():
+    return [TextMessage(source="user", content="fix the repo")]
+
+
+def _said(source, text="ok"):
+    return [TextMessage(source=source, content=text)]
+
+
+def _tools(source, *calls):
+    """One tool-using turn: the execution event, then the turn's chat message."""
+    results = [
+        FunctionExecutionResult(content=text, name=name, call_id=str(i), is_error=False)
+        for i, (name, text) in enumerate(calls)
+    ]
+    return [
+        ToolCallExecutionEvent(source=source, content=results),
+        ToolCallSummaryMessage(source=source, content="\n".join(t for _, t in calls), tool_calls=[], results=results),
+    ]
+
+
+def test_clone_install_pytest_pass():
+    r = _router()
+    msgs = _task()
+    assert r.select(msgs) == "Coder"
+    msgs += _tools("Coder", ("swe_clone", "cloned"), ("swe_install", "installed"))
+    assert r.select(msgs) == "Coder"
+    assert r.cloned and r.installed and r.test_runs == 0
+    # Set up, but the Coder stopped without running pytest: the Tester runs it.
+    msgs += _said("Coder", "the repo is ready")
+    assert r.select(msgs) == "Tester"
+    msgs += _tools("Tester", ("swe_pytest", PASS))
+    assert r.select(msgs) == "Coder"
+    assert r.last_test == "pass" and r.test_runs == 1
+    assert r.selections == {"Coder": 3, "Tester": 1}
+
+
+def test_failed_install_retries_then_replans():
+    r = _router(retries=1)
+    msgs = _task()
+    r.select(msgs)
+    msgs += _tools("Coder", ("swe_clone", "cloned"), ("swe_install", "(exit 1)\nERROR: no such file"))
+    assert r.select(msgs) == "Coder"
+    assert r.cloned and not r.installed
+    msgs += _tools("Coder", ("swe_install", "(exit 1)\nERROR: no such file"))
+    assert r.select(msgs) == "Planner"
+    msgs += _said("Planner", "use requirements-dev.txt")
+    assert r.select(msgs) == "Coder"
+    msgs += _tools("Coder", ("swe_install", "installed"))
+    assert r.select(msgs) == "Coder"
+    assert r.installed
+
+
+def test_failed_tests_go_to_planner_once():
+    r = _router()
+    msgs = _task()
+    r.select(msgs)
+    msgs += _tools("Coder", ("swe_clone", "cloned"), ("swe_install", "installed"), ("swe_pytest", FAIL))
+    assert r.select(msgs) == "Planner"
+    msgs += _said("Planner", "look at test_a")
+    assert r.select(msgs) == "Coder"
+    # Another failing run: the Planner has not seen this one yet.
+    msgs += _tools("Coder", ("swe_pytest", FAIL))
+    assert r.select(msgs) == "Planner"
+    msgs += _said("Planner")
+    assert r.select(msgs) == "Coder"
+    # Nothing new since the Planner's turn: the Coder keeps going.
+    msgs += _said("Coder", "editing")
+    assert r.select(msgs) == "Coder"
+
+
+def test_passing_tail_ends_the_run():
+    term = TextMentionTermination(" passed in ")
+    r = _router()
+    msgs = _task()
+    r.select(msgs)
+    turn = _tools("Coder", ("swe_clone", "cloned"), ("swe_install", "installed"), ("swe_pytest", PASS))
+    msgs += turn
+    assert r.select(msgs) != "Planner"
+    assert asyncio.run(term(turn)) is not None
+
+
+def test_speaker_turns_skips_the_task_and_events():
+    msgs = _task() + _said("Planner") + _tools("Coder", ("swe_pytest", PASS)) + _said("Tester")
+    assert speaker_turns(msgs) == ["Planner", "Coder", "Tester"]
+
+
+def test_round_robin_turns():
+    order = ["Planner", "Coder", "Tester"]
+    assert round_robin_turns(["Planner", "Coder", "Tester"], order) == 3
+    # Coder twice: Tester and Planner idle in between.
+    assert round_robin_turns(["Coder", "Coder"], order) == 5
+    assert round_robin_turns(["Tester"], order) == 3
+    assert round_robin_turns(["Coder", "Someone"], order) == 2
+    assert round_robin_turns(["Coder", "Coder"], []) == 2
@@ -0,0 +1,119 @@
+import os
+import threading
+
+import pytest
+
+import work_queue
+from sweep_plan import queue_admission
+from work_queue import WorkQueue
+
+
+@pytest.fixture
+def now(clock):
+    return clock(work_queue)
+
+
+@pytest.fixture
+def queue(tmp_path, now):
+    return WorkQueue(str(tmp_path / "queue.sqlite"))
+
+
+def test_lease_is_exclusive_until_it_expires(queue, now):
+    job_id = queue.enqueue("agent", "inst.json", "m")
+    job = queue.lease("w1", lease_sec=60)
+    assert job.id == job_id and job.attempts == 1
+    assert queue.lease("w2", lease_sec=60) is None
+
+    now[0] += 61
+    again = queue.lease("w2", lease_sec=60)
+    assert again.id == job_id and again.attempts == 2 and again.lease_owner == "w2"
+    # The first worker lost the job: its heartbeat and result are refused.
+    assert queue.heartbeat(job_id, "w1") is False
+    assert queue.complete(job_id, "w1", 0) is False
+    assert queue.complete(job_id, "w2", 0, {"ok": True}) is True
+    assert queue.counts() == {"done": 1}
+
+
+def test_heartbeat_keeps_the_lease(queue, now):
+    job_id = queue.enqueue("agent", "inst.json", "m")
+    queue.lease("w1", lease_sec=60)
+    now[0] += 50
+    assert queue.heartbeat(job_id, "w1", lease_sec=60) is True
+    now[0] += 50
+    assert queue.lease("w2", lease_sec=60) is None
+    assert queue.requeue_expired() == 0
+
+
+def test_expired_leases_fail_after_max_attempts(queue, now, monkeypatch):
+    monkeypatch.setattr(work_queue, "MAX_ATTEMPTS", 2)
+    queue.enqueue("agent", "inst.json", "m")
+    for owner in ("w1", "w2"):
+        assert queue.lease(owner, lease_sec=10) is not None
+        now[0] += 11
+    assert queue.requeue_expired() == 0
+    assert queue.counts() == {"failed": 1}
+    assert queue.lease("w3") is None
+
+
+def test_admit_wait_leaves_the_job_queued(queue):
+    queue.enqueue("agent", "a.json", "m")
+    assert queue.lease("w1", admit=lambda job, rows: "wait") is None
+    assert queue.counts() == {"queued": 1}
+
+
+def test_admit_defer_skips_to_the_next_job(queue):
+    first = queue.enqueue("agent", "a.json", "m", est_tokens=900)
+    second = queue.enqueue("agent", "b.json", "m", est_tokens=10)
+    job = queue.lease("w1", admit=lambda job, rows: "defer" if job["est_tokens"] > 100 else "run")
+    assert job.id == second
+    assert {j["id"]: j["status"] for j in queue.jobs()} == {first: "deferred", second: "leased"}
+
+
+def test_requeue_deferred_by_sweep(queue):
+    queue.enqueue("agent", "a.json", "m", sweep="s1")
+    queue.enqueue("agent", "b.json", "m", sweep="s2")
+    while queue.lease("w1", admit=lambda job, rows: "defer"):
+        pass
+    assert queue.counts() == {"deferred": 2}
+    assert queue.requeue_deferred("s1") == 1
+    assert queue.lease("w1").instance_file == "a.json"
+    assert queue.requeue_deferred() == 1
+    assert queue.counts() == {"leased": 1, "queued": 1}
+
+
+def test_admission_sees_other_workers_leases(tmp_path):
+    # Two handles on one file, as two workers would have; the budget fits one job.
+    path = str(tmp_path / "queue.sqlite")
+    a, b = WorkQueue(path), WorkQueue(path)
+    a.enqueue("agent", "a.json", "m", est_tokens=60, sweep="s")
+    a.enqueue("agent", "b.json", "m", est_tokens=60, sweep="s")
+    inside, release = threading.Event(), threading.Event()
+    check = queue_admission(budget=100, tpm=None)
+
+    def slow_check(job, rows):
+        verdict = check(job, rows)
+        inside.set()
+        release.wait(5)  # hold the lease transaction open
+        return verdict
+
+    got = {}
+    t = threading.Thread(target=lambda: got.update(a=a.lease("w1", admit=slow_check)))
+    t.start()
+    assert inside.wait(5)
+    # b blocks on a's transaction, then sees a's lease and defers the second job.
+    tb = threading.Thread(target=lambda: got.update(b=b.lease("w2", admit=check)))
+    tb.start()
+    tb.join(0.3)
+    assert tb.is_alive()
+    release.set()
+    t.join(5)
+    tb.join(5)
+    assert got["a"].instance_file == "a.json"
+    assert got["b"] is None
+    assert {j["instance_file"]: j["status"] for j in a.jobs()} == {"a.json": "leased", "b.json": "deferred"}
+
+
+def test_default_queue_path_does_not_depend_on_cwd(tmp_path, monkeypatch):
+    monkeypatch.delenv("SWE_QUEUE", raising=False)
+    monkeypatch.chdir(tmp_path)
+    assert work_queue.default_queue_path() == os.path.join(os.path.dirname(os.path.abspath(work_queue.__file__)), "sandbox", "queue.sqlite")
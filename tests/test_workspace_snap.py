@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+import workspace_snap
+
+
+@pytest.fixture(autouse=True)
+def roots(tmp_path, monkeypatch):
+    monkeypatch.setenv("SWE_SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+    monkeypatch.setenv("SWE_CACHE_INDEX", str(tmp_path / "index.sqlite"))
+    monkeypatch.setenv("SWE_SNAPSHOT_MODE", "copy")
+    monkeypatch.setenv("SWE_SNAPSHOT", "1")
+
+
+class Backend:
+    def __init__(self, name, image):
+        self.name, self.image = name, image
+
+
+def test_key_depends_on_env():
+    assert workspace_snap.snapshot_key("u", "r") == workspace_snap.snapshot_key("u", "r", "")
+    a = workspace_snap.backend_env(Backend("docker", "img:py3.10"))
+    b = workspace_snap.backend_env(Backend("docker", "img:py3.12"))
+    assert workspace_snap.snapshot_key("u", "r", a) != workspace_snap.snapshot_key("u", "r", b)
+
+
+def test_restore_only_in_the_capturing_env(tmp_path):
+    src = tmp_path / "project"
+    src.mkdir()
+    (src / "f.py").write_text("x = 1\n")
+    env = workspace_snap.backend_env(Backend("docker", "img:py3.10"))
+    assert workspace_snap.capture("u", "r", str(src), {"req_file": "r.txt", "output": "ok"}, env=env)
+    other = workspace_snap.backend_env(Backend("docker", "img:py3.12"))
+    assert workspace_snap.restore("u", "r", str(tmp_path / "dest"), env=other) is None
+    meta = workspace_snap.restore("u", "r", str(tmp_path / "dest"), env=env)
+    assert meta["install"]["output"] == "ok"
+    assert os.path.exists(tmp_path / "dest" / "f.py")
+
+
+def test_local_backend_disables_snapshots():
+    assert workspace_snap.snapshots_enabled(Backend("docker", "img"))
+    assert not workspace_snap.snapshots_enabled(Backend("local", "img"))
@@ -0,0 +1,228 @@
+"""
+Durable work queue for distributing eval sweeps across hosts.
+
+A coordinator enqueues (instance, model, agent) jobs; any number of workers on
+any number of hosts lease a job, heartbeat while running it and publish the
+result. Leases that are not renewed in time expire and the job is requeued.
+Jobs can carry token/time forecasts (sweep_plan.py), which workers use to hold
+jobs back under a tokens-per-minute limit or defer them past a token budget.
+
+The queue is a single SQLite file. Put it on a shared filesystem (set
+SWE_QUEUE to its path) to use it as a local stand-in for a real broker. The
+default rollback journal is used instead of WAL because WAL does not work over
+network filesystems.
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import socket
+import sqlite3
+from contextlib import closing
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+
+# Next to this file, like eval_run.RESULTS, so workers started from any directory share it.
+DEFAULT_QUEUE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sandbox", "queue.sqlite")
+LEASE_SEC = float(os.environ.get("SWE_QUEUE_LEASE_SEC", "300"))
+MAX_ATTEMPTS = int(os.environ.get("SWE_QUEUE_MAX_ATTEMPTS", "3"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    agent         TEXT NOT NULL,
+    instance_file TEXT NOT NULL,
+    model         TEXT,
+    status        TEXT NOT NULL DEFAULT 'queued',
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    lease_owner   TEXT,
+    lease_until   REAL,
+    enqueued_ts   REAL NOT NULL,
+    finished_ts   REAL,
+    exit_code     INTEGER,
+    result        TEXT,
+    est_tokens    REAL,
+    est_sec       REAL,
+    sweep         TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, id);
+"""
+# Columns added after the first release; older queue files get them on open.
+_ADDED_COLUMNS = {"est_tokens": "REAL", "est_sec": "REAL", "sweep": "TEXT"}
+
+
+@dataclass
+class Job:
+    id: int
+    agent: str
+    instance_file: str
+    model: Optional[str]
+    attempts: int
+    lease_owner: str
+
+
+def default_queue_path() -> str:
+    return os.environ.get("SWE_QUEUE", "").strip() or DEFAULT_QUEUE_PATH
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class WorkQueue:
+    def __init__(self, path: Optional[str] = None):
+        self.path = os.path.abspath(path or default_queue_path())
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with closing(self._connect()) as db:
+            db.executescript(_SCHEMA)
+            have = {r["name"] for r in db.execute("PRAGMA table_info(jobs)").fetchall()}
+            for col, typ in _ADDED_COLUMNS.items():
+                if col not in have:
+                    db.execute(f"ALTER TABLE jobs ADD COLUMN {col} {typ}")
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit mode; multi-statement updates use explicit BEGIN IMMEDIATE
+        # so that two workers can never lease the same job.
+        db = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def enqueue(
+        self,
+        agent: str,
+        instance_file: str,
+        model: Optional[str],
+        est_tokens: Optional[float] = None,
+        est_sec: Optional[float] = None,
+        sweep: Optional[str] = None,
+    ) -> int:
+        """Add a job; `sweep` groups the jobs of one enqueue, whose token budget they share."""
+        with closing(self._connect()) as db:
+            cur = db.execute(
+                "INSERT INTO jobs (agent, instance_file, model, enqueued_ts, est_tokens, est_sec, sweep) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (agent, instance_file, model, time.time(), est_tokens, est_sec, sweep),
+            )
+            return int(cur.lastrowid)
+
+    def _requeue_expired(self, db: sqlite3.Connection, now: float) -> int:
+        # Jobs that ran out of attempts fail instead of looping forever.
+        db.execute(
+            "UPDATE jobs SET status='failed', lease_owner=NULL, lease_until=NULL, finished_ts=? "
+            "WHERE status='leased' AND lease_until < ? AND attempts >= ?",
+            (now, now, MAX_ATTEMPTS),
+        )
+        cur = db.execute(
+            "UPDATE jobs SET status='queued', lease_owner=NULL, lease_until=NULL "
+            "WHERE status='leased' AND lease_until < ?",
+            (now,),
+        )
+        return cur.rowcount
+
+    def requeue_expired(self) -> int:
+        db = self._connect()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            n = self._requeue_expired(db, time.time())
+            db.execute("COMMIT")
+            return n
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        finally:
+            db.close()
+
+    def lease(
+        self,
+        owner: str,
+        lease_sec: float = LEASE_SEC,
+        admit: Optional[Callable[[Dict[str, Any], List[Dict[str, Any]]], str]] = None,
+    ) -> Optional[Job]:
+        """Lease the oldest queued job.
+
+        `admit(job, all_jobs)` may hold the job back: "wait" leaves it queued and
+        returns None, "defer" marks it deferred and tries the next one. It runs
+        inside the lease transaction, so concurrent workers see each other's leases.
+        """
+        db = self._connect()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            self._requeue_expired(db, now)
+            while True:
+                row = db.execute("SELECT * FROM jobs WHERE status='queued' ORDER BY id LIMIT 1").fetchone()
+                if row is None or admit is None:
+                    break
+                verdict = admit(dict(row), [dict(r) for r in db.execute("SELECT * FROM jobs").fetchall()])
+                if verdict == "defer":
+                    db.execute("UPDATE jobs SET status='deferred', finished_ts=? WHERE id=?", (now, row["id"]))
+                    continue
+                if verdict == "wait":
+                    row = None
+                break
+            if row is None:
+                db.execute("COMMIT")
+                return None
+            db.execute(
+                "UPDATE jobs SET status='leased', lease_owner=?, lease_until=?, attempts=attempts+1 WHERE id=?",
+                (owner, now + lease_sec, row["id"]),
+            )
+            db.execute("COMMIT")
+            return Job(
+                id=row["id"],
+                agent=row["agent"],
+                instance_file=row["instance_file"],
+                model=row["model"],
+                attempts=row["attempts"] + 1,
+                lease_owner=owner,
+            )
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        finally:
+            db.close()
+
+    def requeue_deferred(self, sweep: Optional[str] = None) -> int:
+        """Queue deferred jobs again (of one sweep, or all), e.g. after raising the budget."""
+        q, args = "UPDATE jobs SET status='queued', finished_ts=NULL WHERE status='deferred'", ()
+        if sweep is not None:
+            q, args = q + " AND sweep=?", (sweep,)
+        with closing(self._connect()) as db:
+            return db.execute(q, args).rowcount
+
+    def heartbeat(self, job_id: int, owner: str, lease_sec: float = LEASE_SEC) -> bool:
+        """Extend the lease. Returns False if the lease was lost (expired and requeued)."""
+        with closing(self._connect()) as db:
+            cur = db.execute(
+                "UPDATE jobs SET lease_until=? WHERE id=? AND lease_owner=? AND status='leased'",
+                (time.time() + lease_sec, job_id, owner),
+            )
+            return cur.rowcount == 1
+
+    def complete(self, job_id: int, owner: str, exit_code: int, result: Any = None) -> bool:
+        with closing(self._connect()) as db:
+            cur = db.execute(
+                "UPDATE jobs SET status=?, exit_code=?, result=?, finished_ts=?, lease_until=NULL "
+                "WHERE id=? AND lease_owner=? AND status='leased'",
+                (
+                    "done" if exit_code == 0 else "failed",
+                    exit_code,
+                    json.dumps(result, ensure_ascii=False) if result is not None else None,
+                    time.time(),
+                    job_id,
+                    owner,
+                ),
+            )
+            return cur.rowcount == 1
+
+    def counts(self) -> Dict[str, int]:
+        with closing(self._connect()) as db:
+            rows = db.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {r["status"]: r["n"] for r in rows}
+
+    def jobs(self) -> List[Dict[str, Any]]:
+        with closing(self._connect()) as db:
+            rows = db.execute("SELECT * FROM jobs ORDER BY id").fetchall()
+        return [dict(r) for r in rows]
@@ -0,0 +1,228 @@
+"""
+Copy-on-write workspace snapshots for near-instant sandbox resets.
+
+The first episode for a (repo, ref) clones and installs as usual; its pristine
+"checked out + installed" project directory is then captured once under
+SWE_SNAPSHOT_DIR (default sandbox/snapshots). Later episodes and retries get a
+copy-on-write clone of that snapshot instead of re-cloning and re-installing.
+
+Materialization methods, picked automatically unless SWE_SNAPSHOT_MODE is set:
+- overlay:  overlayfs mount with the snapshot as lower dir (needs root on the host)
+- reflink:  `cp --reflink=always` (btrfs, xfs, APFS-like filesystems)
+- copy:     plain `cp -a` fallback, always works
+- hardlink: `cp -al` hardlink farm; only used when requested explicitly, because
+            a tool that rewrites a file in place would also change the snapshot
+
+Installs only survive in the snapshot if they land inside the project, which is
+why the runners point PYTHONUSERBASE at /workspace/project/.swe_user.
+
+Snapshots are keyed by (repo, ref) plus the backend and image they were
+installed in; the local backend, whose venv lives outside the project, does
+not use them. They are the "snapshots" namespace of cache_manager.py: a
+restore pins the snapshot for the rest of the process (an overlay keeps
+reading it), and quota eviction drops the least recently restored ones.
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import uuid
+import fcntl
+import shutil
+import hashlib
+import subprocess
+from typing import Any, Callable, Dict, Optional
+
+import cache_manager
+
+METHODS = ("overlay", "reflink", "copy", "hardlink")
+_detected: Optional[str] = None
+
+
+def snapshots_enabled(backend: Any = None) -> bool:
+    # The local backend installs into <workspace>/.swe_venv, outside the captured project.
+    if getattr(backend, "name", None) == "local":
+        return False
+    return os.environ.get("SWE_SNAPSHOT", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def snapshot_root() -> str:
+    return os.path.abspath(os.environ.get("SWE_SNAPSHOT_DIR", "").strip() or os.path.join("sandbox", "snapshots"))
+
+
+def snapshot_key(repo_url: str, ref: Optional[str], env: str = "") -> str:
+    """Key of (repo, ref); `env` names the environment the tree was installed in (see backend_env)."""
+    s = f"{repo_url}@{ref or ''}" + (f"#{env}" if env else "")
+    return hashlib.sha1(s.encode("utf-8")).hexdigest()[:16]
+
+
+def backend_env(backend: Any) -> str:
+    """The backend and image an install ran in; a snapshot is only valid in the same one."""
+    return f"{getattr(backend, 'name', '')}:{getattr(backend, 'image', '')}"
+
+
+def _snap_dir(repo_url: str, ref: Optional[str], env: str = "") -> str:
+    return os.path.join(snapshot_root(), snapshot_key(repo_url, ref, env))
+
+
+def load_meta(repo_url: str, ref: Optional[str], env: str = "") -> Optional[Dict[str, Any]]:
+    d = _snap_dir(repo_url, ref, env)
+    try:
+        with open(os.path.join(d, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if os.path.isdir(os.path.join(d, "project")) else None
+
+
+# ---------------- method detection ----------------
+def _overlay_supported() -> bool:
+    if os.geteuid() != 0:
+        return False
+    try:
+        with open("/proc/filesystems", "r", encoding="utf-8") as f:
+            return any(line.split()[-1] == "overlay" for line in f if line.strip())
+    except OSError:
+        return False
+
+
+def _reflink_supported(where: str) -> bool:
+    os.makedirs(where, exist_ok=True)
+    src = os.path.join(where, f".reflink-probe-{uuid.uuid4().hex}")
+    dst = src + ".copy"
+    try:
+        with open(src, "w", encoding="utf-8") as f:
+            f.write("probe")
+        p = subprocess.run(["cp", "--reflink=always", src, dst], capture_output=True)
+        return p.returncode == 0
+    finally:
+        for path in (src, dst):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def detect_method() -> str:
+    global _detected
+    forced = os.environ.get("SWE_SNAPSHOT_MODE", "").strip().lower()
+    if forced in METHODS:
+        return forced
+    if _detected is None:
+        if _overlay_supported():
+            _detected = "overlay"
+        elif _reflink_supported(snapshot_root()):
+            _detected = "reflink"
+        else:
+            _detected = "copy"
+    return _detected
+
+
+# ---------------- reset / restore / capture ----------------
+def _overlay_dirs(dest: str) -> str:
+    return os.path.join(os.path.dirname(dest), ".overlay", os.path.basename(dest))
+
+
+def _is_mount(path: str) -> bool:
+    return os.path.ismount(path)
+
+
+def unmount(dest: str) -> None:
+    """Drop an overlay left on `dest` by an earlier restore, keeping plain directories."""
+    if _is_mount(dest):
+        subprocess.run(["umount", dest], capture_output=True)
+        shutil.rmtree(_overlay_dirs(dest), ignore_errors=True)
+
+
+def reset(dest: str, remove: Optional[Callable[[], Any]] = None) -> None:
+    """Tear down `dest`: unmount an overlay if present, then delete it.
+
+    `remove` is a fallback for trees the host user cannot delete (e.g. files the
+    container created as root); the runners pass a docker `rm -rf`.
+    """
+    unmount(dest)
+    shutil.rmtree(_overlay_dirs(dest), ignore_errors=True)
+    if os.path.lexists(dest):
+        try:
+            shutil.rmtree(dest)
+        except OSError:
+            if remove is None:
+                raise
+            remove()
+
+
+def _materialize(snap_project: str, dest: str, method: str) -> bool:
+    if method == "overlay":
+        ov = _overlay_dirs(dest)
+        upper, work = os.path.join(ov, "upper"), os.path.join(ov, "work")
+        for d in (upper, work, dest):
+            os.makedirs(d, exist_ok=True)
+        opts = f"lowerdir={snap_project},upperdir={upper},workdir={work}"
+        p = subprocess.run(["mount", "-t", "overlay", "overlay", "-o", opts, dest], capture_output=True)
+        return p.returncode == 0
+    flags = {"reflink": ["-a", "--reflink=always"], "hardlink": ["-al"], "copy": ["-a"]}[method]
+    p = subprocess.run(["cp", *flags, snap_project, dest], capture_output=True)
+    return p.returncode == 0
+
+
+def restore(
+    repo_url: str,
+    ref: Optional[str],
+    dest: str,
+    remove: Optional[Callable[[], Any]] = None,
+    env: str = "",
+) -> Optional[Dict[str, Any]]:
+    """Replace `dest` with a CoW clone of the (repo, ref) snapshot.
+
+    Returns the snapshot metadata (including the recorded install output), or
+    None when no snapshot exists yet. Falls back to a plain copy if the
+    preferred method fails on this filesystem.
+    """
+    meta = load_meta(repo_url, ref, env)
+    if meta is None:
+        return None
+    cache_manager.pin("snapshots", snapshot_key(repo_url, ref, env))
+    snap_project = os.path.join(_snap_dir(repo_url, ref, env), "project")
+    t0 = time.time()
+    reset(dest, remove)
+    method = detect_method()
+    if not _materialize(snap_project, dest, method):
+        reset(dest, remove)
+        method = "copy"
+        if not _materialize(snap_project, dest, method):
+            return None
+    return {**meta, "restore_method": method, "restore_sec": round(time.time() - t0, 3)}
+
+
+def capture(repo_url: str, ref: Optional[str], src: str, install: Dict[str, Any], env: str = "") -> bool:
+    """Store `src` as the pristine snapshot for (repo, ref), once.
+
+    `install` records how the tree was installed (req_file, output) so a restored
+    episode can answer swe_install without re-running it. Concurrent captures of
+    the same key are serialized; the loser keeps the existing snapshot.
+    """
+    d = _snap_dir(repo_url, ref, env)
+    os.makedirs(snapshot_root(), exist_ok=True)
+    with open(d + ".lock", "a+") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if load_meta(repo_url, ref, env) is not None:
+                return False
+            tmp = f"{d}.tmp-{uuid.uuid4().hex}"
+            os.makedirs(tmp)
+            # A full copy: the snapshot must not share blocks with a tree that keeps changing.
+            p = subprocess.run(["cp", "-a", src, os.path.join(tmp, "project")], capture_output=True)
+            if p.returncode != 0:
+                shutil.rmtree(tmp, ignore_errors=True)
+                return False
+            meta = {"repo_url": repo_url, "ref": ref or "", "env": env, "created": time.time(), "install": install}
+            with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            shutil.rmtree(d, ignore_errors=True)
+            os.replace(tmp, d)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    cache_manager.record("snapshots", snapshot_key(repo_url, ref, env))
+    return True